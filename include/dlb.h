@@ -77,6 +77,7 @@ typedef struct dlb_handle {
 
 boolean NDECL(dlb_init);
 void NDECL(dlb_cleanup);
+void NDECL(dlb_forget_marks);
 
 dlb *FDECL(dlb_fopen, (const char *, const char *));
 int FDECL(dlb_fclose, (DLB_P));
@@ -105,6 +106,7 @@ long rsrc_dlb_ftell(dlb *dp);
 
 #define dlb_init()
 #define dlb_cleanup()
+#define dlb_forget_marks()
 
 #define dlb_fopen fopen
 #define dlb_fclose fclose
@@ -1,13 +1,13 @@
 #ifndef NLE_H
 #define NLE_H
 
-#define NLE_BZ2_TTYRECS
-
 #include <stdio.h>
 
 #include <fcontext/fcontext.h>
 
 #include "nleobs.h"
+#include "nletty.h"
+#include "nlettyrec.h"
 
 /* TODO: Fix this. */
 #undef SIG_RET_TYPE
@@ -21,29 +21,44 @@ typedef struct nle_globals {
     fcontext_t generatorcontext;
 
     FILE *ttyrec;
-    TMT *vterminal;
+    nle_ttyrec_writer *ttyrec_writer; /* Writes to ttyrec. */
+    TMT *vterminal;                   /* Only with a ttyrec. */
+    nle_tty tty;                      /* Only without one. */
     char outbuf[BUFSIZ];
     char *outbuf_write_ptr;
     char *outbuf_write_end;
 
-#ifdef NLE_BZ2_TTYRECS
-    void *ttyrec_bz2;
-#endif
-
     boolean done;
     nle_obs *observation;
+
+    nle_settings settings;
+    nle_seeds_init_t *seeds_init; /* Only set while starting a game. */
 } nle_ctx_t;
 
 /*
- * Would like to annotate this with __thread, but that causes
- * the MacOS dynamic linker to not unload the library on dlclose().
+ * The game of this copy of the library. Not thread-local: Each NLE instance
+ * loads its own copy (see nledl.c), and may be stepped from different
+ * threads over its lifetime. (Annotating this with __thread also causes
+ * the MacOS dynamic linker to not unload the library on dlclose().)
  */
-nle_ctx_t *current_nle_ctx;
+extern nle_ctx_t *current_nle_ctx;
 
 nle_ctx_t *nle_start(nle_obs *, FILE *, nle_seeds_init_t *, nle_settings *);
 nle_ctx_t *nle_step(nle_ctx_t *, nle_obs *);
+void nle_fill_obs(nle_ctx_t *, nle_obs *);
+int nle_describe(nle_ctx_t *, int, const int *, unsigned char *);
+int nle_level_map(nle_ctx_t *, int, int, short *);
 void nle_end(nle_ctx_t *);
 
+void nle_finish(nle_ctx_t *);
+nle_ctx_t *nle_restart(nle_ctx_t *, nle_obs *, FILE *, nle_seeds_init_t *,
+                       nle_settings *);
+
+typedef struct nle_state nle_state_t;
+
+nle_state_t *nle_save_state(nle_ctx_t *);
+void nle_restore_state(nle_ctx_t *, nle_state_t *);
+
 void nle_set_seed(nle_ctx_t *, unsigned long, unsigned long, boolean);
 void nle_get_seed(nle_ctx_t *, unsigned long *, unsigned long *, boolean *);
 
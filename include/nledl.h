@@ -15,16 +15,35 @@ typedef struct nledl_ctx {
     void *nle_ctx;
     void *(*step)(void *, nle_obs *);
     FILE *ttyrec;
+
+    /* State of the library right after loading. If present, nle_reset
+     * re-initializes the library in place instead of reloading it. */
+    void *snapshot;
 } nledl_ctx;
 
 nledl_ctx *nle_start(const char *, nle_obs *, FILE *, nle_seeds_init_t *,
-                     nle_settings *);
+                     nle_settings *, char);
 nledl_ctx *nle_step(nledl_ctx *, nle_obs *);
 
+/* Makes obs the game's observation and fills it with the current state,
+ * like nle_step does before returning. Does not advance the game. */
+void nle_fill_obs(nledl_ctx *, nle_obs *);
+
+/* Looks up screen descriptions of n cells, like in the screen_descriptions
+ * observation. Returns 0 if the map isn't shown. */
+int nle_describe(nledl_ctx *, int, const int *, unsigned char *);
+int nle_level_map(nledl_ctx *, int, int, short *);
+
 void nle_reset(nledl_ctx *, nle_obs *, FILE *, nle_seeds_init_t *,
                nle_settings *);
 void nle_end(nledl_ctx *);
 
+/* Game states are single blocks from malloc, release them with free().
+ * nle_save_state returns NULL if not supported on this platform. A state
+ * can only be restored into the game it was saved from. */
+void *nle_save_state(nledl_ctx *);
+void nle_restore_state(nledl_ctx *, void *);
+
 void nle_set_seed(nledl_ctx *, unsigned long, unsigned long, char);
 void nle_get_seed(nledl_ctx *, unsigned long *, unsigned long *, char *);
 
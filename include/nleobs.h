@@ -12,6 +12,8 @@
 #define NLE_SCREEN_DESCRIPTION_LENGTH 80
 #define NLE_TERM_CO 80
 #define NLE_TERM_LI 24
+#define NLE_EGOCENTRIC_RADIUS 4 /* Default, see egocentric_radius below. */
+#define NLE_LEVEL_MAPS 32       /* Levels in the level_maps observation. */
 
 /* blstats indices, see also botl.c and statusfields in botl.h. */
 #define NLE_BL_X 0
@@ -69,6 +71,24 @@ typedef struct nle_observation {
     signed char *tty_colors;            /* Size NLE_TERM_LI * NLE_TERM_CO */
     unsigned char *tty_cursor;          /* Size 2 */
     int *misc;                          /* Size NLE_MISC_SIZE */
+    unsigned char *glyphs_changed;      /* Size ROWNO * (COLNO - 1) */
+    int *explored_cells;                /* Size MAXDUNGEON * MAXLEVEL */
+    /* The map around the hero, each of size (2 * egocentric_radius + 1)^2.
+       Cells outside of the map are egocentric_pad_glyph, ' ' and 0. */
+    short *egocentric_glyphs;
+    unsigned char *egocentric_chars;
+    unsigned char *egocentric_colors;
+    int egocentric_radius;
+    short egocentric_pad_glyph;
+    /* The glyphs of the first NLE_LEVEL_MAPS levels shown, as of when they
+       were last shown, and their dnum and dlevel (0 for unused maps). */
+    short *level_maps;     /* Size NLE_LEVEL_MAPS * ROWNO * (COLNO - 1) */
+    int *level_map_levels; /* Size NLE_LEVEL_MAPS * 2 */
+    /* Whether each of the num_actions keys in actions may do anything at
+       the current prompt. */
+    unsigned char *action_mask; /* Size num_actions */
+    const int *actions;
+    int num_actions;
 } nle_obs;
 
 typedef struct {
@@ -80,6 +100,27 @@ typedef struct {
 #endif
 } nle_seeds_init_t;
 
+/* Phases timed if nle_settings.stats is set. Nested phases are also
+ * counted in the enclosing ones. */
+#define NLE_STATS_START 0    /* Starting a game, until the first input */
+#define NLE_STATS_STEP 1     /* nle_step */
+#define NLE_STATS_FILL_OBS 2 /* Window port filling observations */
+#define NLE_STATS_TTY 3      /* Terminal emulation for tty_* observations */
+#define NLE_STATS_TTYREC 4   /* Writing ttyrecs */
+#define NLE_STATS_CALL 5     /* Calls into pynethack, e.g. Nethack.step */
+#define NLE_STATS_SIZE 6
+
+typedef struct nle_stats {
+    unsigned long long calls[NLE_STATS_SIZE];
+    unsigned long long nanoseconds[NLE_STATS_SIZE];
+} nle_stats;
+
+/* Compression of ttyrecs. */
+#define NLE_TTYREC_BZ2 0 /* The default */
+#define NLE_TTYREC_RAW 1
+#define NLE_TTYREC_GZIP 2
+#define NLE_TTYREC_ZSTD 3 /* If NLE_ZSTD_TTYRECS is set in CMakeLists.txt. */
+
 typedef struct nle_settings {
     /*
      *  Path to NetHack's game files.
@@ -98,6 +139,20 @@ typedef struct nle_settings {
      * Filename for nle's ttyrec*.bz2.
      */
     char ttyrecname[4096];
+    /*
+     * One of NLE_TTYREC_*.
+     */
+    int ttyrec_codec;
+    /*
+     * If not NULL, time spent in the NLE_STATS_* phases is added here.
+     */
+    nle_stats *stats;
+    /*
+     * Bool indicating whether to skip drawing the terminal: The tty window
+     * port doesn't draw the map and status lines, and nothing is printed.
+     * Only for games without ttyrec and tty_* observations.
+     */
+    int headless;
 } nle_settings;
 
 #endif /* NLEOBS_H */
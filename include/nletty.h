@@ -0,0 +1,25 @@
+#ifndef NLETTY_H
+#define NLETTY_H
+
+#include "nleobs.h"
+
+/*
+ * The terminal behind the tty_* observations when no ttyrec is written.
+ * It's drawn directly by win/tty's output functions, see nletty.c.
+ */
+typedef struct nle_tty {
+    unsigned char chars[NLE_TERM_LI][NLE_TERM_CO];
+    signed char colors[NLE_TERM_LI][NLE_TERM_CO];
+    unsigned char dirty[NLE_TERM_LI]; /* Changed since the last fill. */
+    int row;
+    int col;
+    int fg; /* 0..7, or -1 for the default. */
+    int bold;
+    int reverse;
+} nle_tty;
+
+void nle_tty_init(nle_tty *);
+void nle_tty_putc(nle_tty *, int);
+void nle_tty_fill_obs(nle_tty *, nle_obs *);
+
+#endif /* NLETTY_H */
@@ -0,0 +1,17 @@
+#ifndef NLETTYREC_H
+#define NLETTYREC_H
+
+#include <stddef.h>
+#include <stdio.h>
+
+/*
+ * Writes a game's ttyrec, compressed with one of NLE_TTYREC_*, from a
+ * background thread, see nlettyrec.c.
+ */
+typedef struct nle_ttyrec_writer nle_ttyrec_writer;
+
+nle_ttyrec_writer *nle_ttyrec_writer_open(FILE *, int);
+void nle_ttyrec_writer_write(nle_ttyrec_writer *, const void *, size_t);
+void nle_ttyrec_writer_close(nle_ttyrec_writer *);
+
+#endif /* NLETTYREC_H */
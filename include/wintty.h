@@ -275,6 +275,19 @@ E int FDECL(nle_puts, (const char *) );
 E int FDECL(nle_xputs, (const char *) );
 E int FDECL(nle_fflush, (FILE *) );
 
+/* The effects of control sequences on tty_* observations, see nletty.c. */
+E void FDECL(nle_tty_move, (int, int));
+E void NDECL(nle_tty_up);
+E void NDECL(nle_tty_down);
+E void NDECL(nle_tty_right);
+E void NDECL(nle_tty_left);
+E void NDECL(nle_tty_clear_eol);
+E void NDECL(nle_tty_clear_screen);
+E void NDECL(nle_tty_bold);
+E void NDECL(nle_tty_reverse);
+E void NDECL(nle_tty_reset);
+E void FDECL(nle_tty_color, (int, int));
+
 #define putchar nle_putchar
 #define puts nle_puts
 #define fflush nle_fflush
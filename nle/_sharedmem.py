@@ -0,0 +1,13 @@
+import numpy as np
+
+
+def shared_array(ctx, shape, dtype):
+    """Returns a RawArray big enough for an array of shape and dtype."""
+    size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    return ctx.RawArray("b", size), shape, dtype
+
+
+def as_array(shared):
+    """Returns a numpy view of a shared_array, e.g. in a worker process."""
+    raw, shape, dtype = shared
+    return np.frombuffer(raw, dtype=dtype).reshape(shape)
@@ -1,4 +1,9 @@
 from nle._pyconverter import Converter
 import nle.dataset.db
-from nle.dataset.populate_db import add_altorg_directory, add_nledata_directory
+from nle.dataset.populate_db import (
+    add_altorg_directory,
+    add_nledata_directory,
+    index_ttyrecs,
+)
 from nle.dataset.dataset import TtyrecDataset
+from nle.dataset.framestore import FrameStoreDataset, materialize
@@ -1,4 +1,6 @@
+import multiprocessing as mp
 import os
+import queue
 import sqlite3
 import threading
 from collections import defaultdict
@@ -7,6 +9,7 @@ from functools import partial
 import numpy as np
 
 from nle import _pyconverter as converter
+from nle import _sharedmem
 from nle import dataset as nld
 
 
@@ -36,6 +39,7 @@ def convert_frames(
     :param gameids: Array of the gameid of each frame - np.array(np.int32) [ SEQ ]
     :param load_fn: A callback that loads the next file into a converter:
         sig: load_fn(converter) -> bool is_success
+    :returns: False if load_fn ran out of ttyrecs, so the rest is padding.
 
     """
 
@@ -47,7 +51,7 @@ def convert_frames(
         resets[1:end] = 0
         gameids[:end] = converter.gameid
         if remaining == 0:
-            return
+            return True
 
         # There still space in the buffers; load a new ttyrec and carry on.
         chars = chars[-remaining:]
@@ -70,11 +74,88 @@ def convert_frames(
             scores.fill(0)
             resets.fill(0)
             gameids.fill(0)
-            return
+            return False
+
+
+def _convert_or_pad(converter, finished, *arrays, load_fn):
+    """Calls convert_frames, or pads once the converter has run out of ttyrecs.
+
+    This matters when minibatches are converted ahead, past the end of data.
+    Returns whether the converter has run out.
+    """
+    if finished:
+        for array in arrays:
+            array.fill(0)
+        return True
+    return not convert_frames(converter, *arrays, load_fn=load_fn)
+
+
+def _buffer_shapes(batch_size, seq_length, rows, cols):
+    """Returns the shape and dtype of each array of a minibatch."""
+    return {
+        "chars": ((batch_size, seq_length, rows, cols), np.uint8),
+        "colors": ((batch_size, seq_length, rows, cols), np.int8),
+        "cursors": ((batch_size, seq_length, 2), np.int16),
+        "timestamps": ((batch_size, seq_length), np.int64),
+        "actions": ((batch_size, seq_length), np.uint8),
+        "resets": ((batch_size, seq_length), np.uint8),
+        "gameids": ((batch_size, seq_length), np.int32),
+        "scores": ((batch_size, seq_length), np.int32),
+    }
+
+
+def _minibatch(buffers, ttyrec_version):
+    """Returns the (key, array) pairs of a minibatch from one buffer set."""
+    key_vals = [
+        ("tty_chars", buffers["chars"]),
+        ("tty_colors", buffers["colors"]),
+        ("tty_cursor", buffers["cursors"]),
+        ("timestamps", buffers["timestamps"]),
+        ("done", buffers["resets"]),
+        ("gameids", buffers["gameids"]),
+    ]
+    if ttyrec_version >= 2:
+        key_vals.append(("actions", buffers["actions"]))
+    if ttyrec_version >= 3:
+        key_vals.append(("scores", buffers["scores"]))
+    return key_vals
+
+
+def _rotate(minibatches, submit, receive):
+    """Yields minibatches converted into rotating buffer sets.
+
+    Conversions into all but the consumer's buffer set run ahead: When the
+    next minibatch is requested, the buffer set of the last one is released
+    and the conversion into it submitted.
+
+    :param minibatches: the (key, array) pairs of each buffer set.
+    :param submit: submit(i) starts converting the next minibatch into set i.
+    :param receive: receive() waits for the oldest submitted conversion.
+    """
+    for i in range(len(minibatches)):
+        submit(i)
+    pending = len(minibatches)
+
+    i = 0
+    while True:
+        receive()
+        pending -= 1
+        mb = dict(minibatches[i])
+        # Loop until only padding is found, i.e. end of data.
+        end = not np.any(mb["gameids"][:, -1] != 0)
+        yield mb
+        if end:
+            break
+        submit(i)
+        pending += 1
+        i = (i + 1) % len(minibatches)
+
+    for _ in range(pending):
+        receive()
 
 
 def _ttyrec_generator(
-    batch_size, seq_length, rows, cols, load_fn, map_fn, ttyrec_version
+    batch_size, seq_length, rows, cols, load_fn, map_fn, ttyrec_version, prefetch=0
 ):
     """A generator to fill minibatches with ttyrecs.
 
@@ -82,29 +163,16 @@ def _ttyrec_generator(
        load_fn(ttyrecs.Converter conv) -> bool is_success
     :param map_fn: a function that maps a series of iterables through a fn.
        map_fn(fn, *iterables) -> <generator> (can use built-in map)
+    :param prefetch: number of minibatches to convert ahead in a background
+       thread, each into its own buffer set, see _rotate.
 
     """
-    chars = np.zeros((batch_size, seq_length, rows, cols), dtype=np.uint8)
-    colors = np.zeros((batch_size, seq_length, rows, cols), dtype=np.int8)
-    cursors = np.zeros((batch_size, seq_length, 2), dtype=np.int16)
-    timestamps = np.zeros((batch_size, seq_length), dtype=np.int64)
-    actions = np.zeros((batch_size, seq_length), dtype=np.uint8)
-    resets = np.zeros((batch_size, seq_length), dtype=np.uint8)
-    gameids = np.zeros((batch_size, seq_length), dtype=np.int32)
-    scores = np.zeros((batch_size, seq_length), dtype=np.int32)
-
-    key_vals = [
-        ("tty_chars", chars),
-        ("tty_colors", colors),
-        ("tty_cursor", cursors),
-        ("timestamps", timestamps),
-        ("done", resets),
-        ("gameids", gameids),
+    shapes = _buffer_shapes(batch_size, seq_length, rows, cols)
+    buffers = [
+        {key: np.zeros(shape, dtype=dtype) for key, (shape, dtype) in shapes.items()}
+        for _ in range(prefetch + 1)
     ]
-    if ttyrec_version >= 2:
-        key_vals.append(("actions", actions))
-    if ttyrec_version >= 3:
-        key_vals.append(("scores", scores))
+    minibatches = [_minibatch(b, ttyrec_version) for b in buffers]
 
     # Load initial gameids.
     converters = [
@@ -112,28 +180,260 @@ def _ttyrec_generator(
     ]
     assert all(load_fn(c) for c in converters), "Not enough ttyrecs to fill a batch!"
 
-    # Convert (at least one minibatch)
-    _convert_frames = partial(convert_frames, load_fn=load_fn)
-    gameids[0, -1] = 1  # basically creating a "do-while" loop by setting an indicator
-    while np.any(
-        gameids[:, -1] != 0
-    ):  # loop until only padding is found, i.e. end of data
-        list(
+    _convert_frames = partial(_convert_or_pad, load_fn=load_fn)
+    finished = [False] * batch_size
+
+    def convert(i):
+        b = buffers[i]
+        finished[:] = list(
             map_fn(
                 _convert_frames,
                 converters,
-                chars,
-                colors,
-                cursors,
-                timestamps,
-                actions,
-                scores,
-                resets,
-                gameids,
+                finished,
+                b["chars"],
+                b["colors"],
+                b["cursors"],
+                b["timestamps"],
+                b["actions"],
+                b["scores"],
+                b["resets"],
+                b["gameids"],
             )
         )
 
-        yield dict(key_vals)
+    if not prefetch:
+        yield from _rotate(minibatches, convert, lambda: None)
+        return
+
+    todo = queue.Queue()
+    results = queue.Queue()
+
+    def run():
+        while True:
+            i = todo.get()
+            if i is None:
+                return
+            try:
+                convert(i)
+                results.put(None)
+            except Exception as e:
+                results.put(e)
+
+    def receive():
+        error = results.get()
+        if error is not None:
+            raise error
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        yield from _rotate(minibatches, todo.put, receive)
+    finally:
+        # Drop conversions not started yet if the consumer stopped early.
+        while True:
+            try:
+                todo.get_nowait()
+            except queue.Empty:
+                break
+        todo.put(None)
+        thread.join()
+
+
+def _make_ttyrec_load_fn(get_paths, rootpath, gameids, loop_forever, next_index):
+    """Make a closure to load the next gameid into the converter.
+
+    :param get_paths: a function returning the paths of a gameid's parts.
+    :param next_index: a function returning the index into gameids of the next
+       new game, called concurrently by all converters.
+    """
+
+    def _load_fn(converter):
+        """Take the next part of the current game if available, else new game.
+        Return True if load successful, else False."""
+        gameid = converter.gameid
+        part = converter.part + 1
+
+        files = get_paths(gameid)
+        if gameid == 0 or part >= len(files):
+            i = next_index()
+
+            if (not loop_forever) and i >= len(gameids):
+                return False
+
+            gameid = gameids[i % len(gameids)]
+            files = get_paths(gameid)
+            part = 0
+
+        filename = files[part]
+        filepath = os.path.join(rootpath, filename)
+        converter.load_ttyrec(filepath, gameid=gameid, part=part)
+        return True
+
+    return _load_fn
+
+
+def _worker(pipe, parent_pipe, rows, cols, ttyrec_version, start, stop, shared, load):
+    """Converts the batch entries start..stop-1 for _process_ttyrec_generator.
+
+    Each command, like ("convert", buffer set), is answered with (True, None)
+    or, if it failed, (False, exception).
+    """
+    parent_pipe.close()
+    arrays = {key: _sharedmem.as_array(s) for key, s in shared.items()}
+    paths, rootpath, gameids, loop_forever, counter = load
+
+    # Entries load their first game in order, as in _ttyrec_generator. Later
+    # games go to whichever entry needs one first, across all workers.
+    initial = iter(range(start, stop))
+
+    def next_index():
+        i = next(initial, None)
+        if i is None:
+            with counter.get_lock():
+                i = counter.value
+                counter.value += 1
+        return i
+
+    def get_paths(gameid):
+        return paths.get(gameid, [])
+
+    load_fn = _make_ttyrec_load_fn(
+        get_paths, rootpath, gameids, loop_forever, next_index
+    )
+    try:
+        try:
+            converters = [
+                converter.Converter(rows, cols, ttyrec_version)
+                for _ in range(start, stop)
+            ]
+            assert all(
+                load_fn(c) for c in converters
+            ), "Not enough ttyrecs to fill a batch!"
+            finished = [False] * len(converters)
+            pipe.send((True, None))
+        except Exception as e:
+            pipe.send((False, e))
+            return
+
+        while True:
+            command, arg = pipe.recv()
+            try:
+                if command == "convert":
+                    b = {key: array[arg] for key, array in arrays.items()}
+                    for i, c in enumerate(converters, start):
+                        finished[i - start] = _convert_or_pad(
+                            c,
+                            finished[i - start],
+                            b["chars"][i],
+                            b["colors"][i],
+                            b["cursors"][i],
+                            b["timestamps"][i],
+                            b["actions"][i],
+                            b["scores"][i],
+                            b["resets"][i],
+                            b["gameids"][i],
+                            load_fn=load_fn,
+                        )
+                    pipe.send((True, None))
+                elif command == "close":
+                    pipe.send((True, None))
+                    return
+                else:
+                    raise ValueError("Unknown command '%s'" % command)
+            except Exception as e:
+                pipe.send((False, e))
+    except KeyboardInterrupt:
+        pass  # Return silently, the parent gets interrupted too.
+    finally:
+        pipe.close()
+
+
+def _process_ttyrec_generator(
+    batch_size, seq_length, rows, cols, load, ttyrec_version, num_workers, prefetch=0
+):
+    """Like _ttyrec_generator, but with the converters in worker processes.
+
+    Each worker owns a contiguous share of the batch entries and writes their
+    frames directly into shared memory holding the whole minibatch, so only
+    short commands pass between processes. The yielded arrays are views of
+    that memory.
+
+    :param load: (paths, rootpath, gameids, loop_forever) where paths maps
+       each gameid to the paths of its parts.
+    :param num_workers: number of worker processes, at most batch_size.
+    :param prefetch: number of minibatches for the workers to convert ahead,
+       each into its own buffer set, see _rotate.
+    """
+    num_workers = max(1, min(num_workers, batch_size))
+    ctx = mp.get_context()
+
+    shapes = _buffer_shapes(batch_size, seq_length, rows, cols)
+    shared = {
+        key: _sharedmem.shared_array(ctx, (prefetch + 1,) + shape, dtype)
+        for key, (shape, dtype) in shapes.items()
+    }
+    arrays = {key: _sharedmem.as_array(s) for key, s in shared.items()}
+    minibatches = [
+        _minibatch({key: a[i] for key, a in arrays.items()}, ttyrec_version)
+        for i in range(prefetch + 1)
+    ]
+
+    # New games after the initial ones are counted across workers.
+    load = tuple(load) + (ctx.Value("l", batch_size),)
+
+    bounds = np.linspace(0, batch_size, num_workers + 1).astype(int)
+    pipes = []
+    processes = []
+    try:
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            pipe, worker_pipe = ctx.Pipe()
+            process = ctx.Process(
+                target=_worker,
+                args=(
+                    worker_pipe,
+                    pipe,
+                    rows,
+                    cols,
+                    ttyrec_version,
+                    int(start),
+                    int(stop),
+                    shared,
+                    load,
+                ),
+                daemon=True,
+            )
+            process.start()
+            worker_pipe.close()
+            pipes.append(pipe)
+            processes.append(process)
+
+        def send(command, arg=None):
+            for pipe in pipes:
+                pipe.send((command, arg))
+
+        def receive():
+            """Waits for all workers, raising the first error."""
+            error = None
+            for pipe in pipes:
+                ok, result = pipe.recv()
+                if not ok and error is None:
+                    error = result
+            if error is not None:
+                raise error
+
+        receive()  # Initial gameids loaded.
+
+        yield from _rotate(minibatches, partial(send, "convert"), receive)
+
+        send("close")
+        receive()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        for pipe in pipes:
+            pipe.close()
 
 
 class TtyrecDataset:
@@ -155,6 +455,8 @@ class TtyrecDataset:
         loop_forever=False,
         subselect_sql=None,
         subselect_sql_args=None,
+        num_workers=0,
+        prefetch=0,
     ):
         """
         An iterable dataset to load minibatches of NetHack games from compressed
@@ -195,6 +497,15 @@ class TtyrecDataset:
         :param subselect_sql: SQL Query to subselect games (gameids) using metadata
         :param subselect_sql_args: SQL Query Args to subselect games (gameids)
             using metadata.
+        :param num_workers: If positive, convert ttyrecs in this many worker
+            processes, each owning a share of the batch, instead of in this
+            process (and threadpool). Minibatches are then views of shared
+            memory, overwritten by the next minibatch.
+        :param prefetch: Number of minibatches to convert ahead, in the
+            background, while the current one is in use. Each goes into its own
+            set of arrays. A minibatch is owned by the consumer until it
+            requests the next one, which releases its arrays to be overwritten;
+            copy what's needed for longer.
         """
         self.batch_size = batch_size
         self.seq_length = seq_length
@@ -204,6 +515,8 @@ class TtyrecDataset:
         self.shuffle = shuffle
         self.subselect_sql = subselect_sql
         self.loop_forever = loop_forever
+        self.num_workers = num_workers
+        self.prefetch = prefetch
 
         sql_args = (dataset_name,)
         core_sql = """
@@ -292,37 +605,34 @@ class TtyrecDataset:
         lock = threading.Lock()
         count = [0]
 
-        def _load_fn(converter):
-            """Take the next part of the current game if available, else new game.
-            Return True if load successful, else False."""
-            gameid = converter.gameid
-            part = converter.part + 1
+        def next_index():
+            with lock:
+                i = count[0]
+                count[0] += 1
+            return i
 
-            files = self.get_paths(gameid)
-            if gameid == 0 or part >= len(files):
-                with lock:
-                    i = count[0]
-                    count[0] += 1
-
-                if (not self.loop_forever) and i >= len(gameids):
-                    return False
-
-                gameid = gameids[i % len(gameids)]
-                files = self.get_paths(gameid)
-                part = 0
-
-            filename = files[part]
-            filepath = os.path.join(self._rootpath, filename)
-            converter.load_ttyrec(filepath, gameid=gameid, part=part)
-            return True
-
-        return _load_fn
+        return _make_ttyrec_load_fn(
+            self.get_paths, self._rootpath, gameids, self.loop_forever, next_index
+        )
 
     def __iter__(self):
         gameids = list(self._gameids)
         if self.shuffle:
             np.random.shuffle(gameids)
 
+        if self.num_workers > 0:
+            paths = {gameid: self.get_paths(gameid) for gameid in set(gameids)}
+            return _process_ttyrec_generator(
+                self.batch_size,
+                self.seq_length,
+                self.rows,
+                self.cols,
+                (paths, self._rootpath, gameids, self.loop_forever),
+                self._ttyrec_version,
+                self.num_workers,
+                self.prefetch,
+            )
+
         return _ttyrec_generator(
             self.batch_size,
             self.seq_length,
@@ -331,6 +641,7 @@ class TtyrecDataset:
             self._make_load_fn(gameids),
             self._map,
             self._ttyrec_version,
+            self.prefetch,
         )
 
     def get_ttyrecs(self, gameids, chunk_size=None):
@@ -351,3 +662,71 @@ class TtyrecDataset:
 
     def get_ttyrec(self, gameid, chunk_size=None):
         return self.get_ttyrecs([gameid], chunk_size)
+
+    def _seek(self, conv, gameid, frame, load_fn):
+        """Loads a game into the converter at one of its frames, starting at
+        the checkpoint before it if indexed. Returns False if the game ends
+        before the frame."""
+        paths = self.get_paths(gameid)
+        frame = int(frame)  # sqlite binds numpy ints as blobs.
+        with nld.db.db(filename=self.dbfilename) as conn:
+            part, offset = 0, frame
+            while part < len(paths) - 1:
+                length = nld.db.count_frames(gameid, part, conn)
+                if length is None or offset < length:
+                    break
+                part, offset = part + 1, offset - length
+            checkpoint = nld.db.get_checkpoint(gameid, part, offset, conn)
+
+        if checkpoint is None:  # Convert from the start of the game.
+            part, offset, checkpoint = 0, frame, (0, None)
+        conv.load_ttyrec(
+            os.path.join(self._rootpath, paths[part]),
+            gameid=gameid,
+            part=part,
+            checkpoint=checkpoint[1],
+            seekable=True,
+        )
+        offset -= checkpoint[0]
+        while True:
+            offset -= conv.skip(offset)
+            if offset == 0:
+                return True
+            if not load_fn(conv):
+                return False
+
+    def get_ttyrec_window(self, gameid, start, seq_length=None):
+        """Fetch seq_length frames of a game from frame `start` on, as one
+        minibatch (shape: [1, seq_length, ...]) padded with 0's past the end
+        of the game.
+
+        The frames are those of `get_ttyrec`. With checkpoints of the game in
+        the db (see `populate_db.index_ttyrecs`), conversion starts at the
+        checkpoint before start, instead of at the start of the game.
+        """
+        seq_length = seq_length or self.seq_length
+        conv = converter.Converter(self.rows, self.cols, self._ttyrec_version)
+        # Loads the next part of the game only.
+        load_fn = _make_ttyrec_load_fn(
+            self.get_paths, self._rootpath, [gameid], False, lambda: 1
+        )
+        finished = not self._seek(conv, gameid, start, load_fn)
+
+        shapes = _buffer_shapes(1, seq_length, self.rows, self.cols)
+        b = {
+            key: np.zeros(shape, dtype=dtype) for key, (shape, dtype) in shapes.items()
+        }
+        _convert_or_pad(
+            conv,
+            finished,
+            b["chars"][0],
+            b["colors"][0],
+            b["cursors"][0],
+            b["timestamps"][0],
+            b["actions"][0],
+            b["scores"][0],
+            b["resets"][0],
+            b["gameids"][0],
+            load_fn=load_fn,
+        )
+        return dict(_minibatch(b, self._ttyrec_version))
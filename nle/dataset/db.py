@@ -3,6 +3,7 @@ import logging
 import os
 import sqlite3
 import time
+import zlib
 
 DB = "ttyrecs.db"
 logger = logging.getLogger("db")
@@ -165,6 +166,65 @@ def delete_dataset(dataset_name, conn=None, commit=True):
             conn.commit()
 
 
+# Created on demand, as older dbs don't have it.
+CHECKPOINTS_TABLE = """CREATE TABLE IF NOT EXISTS checkpoints
+            (
+                gameid      INTEGER,
+                part        INTEGER,
+                frame       INTEGER,
+                data        BLOB,
+                PRIMARY KEY (gameid, part, frame)
+            )"""
+
+
+def add_checkpoints(gameid, part, checkpoints, conn=None, commit=True):
+    """Adds the (frame, data) checkpoints of a game's ttyrec part, compressed."""
+    with db(conn, rw=True) as conn:
+        conn.execute(CHECKPOINTS_TABLE)
+        conn.executemany(
+            "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?)",
+            ((gameid, part, frame, zlib.compress(data)) for frame, data in checkpoints),
+        )
+        conn.execute("UPDATE meta SET mtime = ?", (time.time(),))
+        if commit:
+            conn.commit()
+
+
+def _has_checkpoints(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='checkpoints'"
+    ).fetchone()
+
+
+def get_checkpoint(gameid, part, frame, conn=None):
+    """Returns the (frame, data) of the last checkpoint of a game's ttyrec part
+    at or before frame, or None."""
+    with db(conn) as conn:
+        if not _has_checkpoints(conn):
+            return None
+        row = conn.execute(
+            "SELECT frame, data FROM checkpoints "
+            "WHERE gameid=? AND part=? AND frame<=? "
+            "ORDER BY frame DESC LIMIT 1",
+            (gameid, part, frame),
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], zlib.decompress(row[1])
+
+
+def count_frames(gameid, part, conn=None):
+    """Returns the number of frames of a game's ttyrec part, if indexed, else
+    None. The last checkpoint of a part is at its end."""
+    with db(conn) as conn:
+        if not _has_checkpoints(conn):
+            return None
+        return conn.execute(
+            "SELECT MAX(frame) FROM checkpoints WHERE gameid=? AND part=?",
+            (gameid, part),
+        ).fetchone()[0]
+
+
 def create(filename=DB):
     ctime = time.time()
 
@@ -246,6 +306,8 @@ def create(filename=DB):
             )"""
         )
 
+        c.execute(CHECKPOINTS_TABLE)
+
         conn.commit()
     logger.info(
         "Created Empty '%s'. Size: %.2f MB",
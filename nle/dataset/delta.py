@@ -0,0 +1,126 @@
+"""Delta encoding of terminal frames.
+
+Consecutive frames of a game differ in few cells. A frame is encoded as
+the runs of cells that changed since the previous frame, as (start,
+length) with cells counted row by row, and the new values of these cells.
+Keyframes are encoded as one run of all cells, so decoding can start from
+them. Several arrays of the same frames, e.g. `tty_chars` and `tty_colors`,
+share their runs: A cell is in a run if it changed in any of them.
+"""
+
+import numpy as np
+
+
+def encode(frames, keyframes, previous=None):
+    """Encodes a sequence of frames relative to their previous frames.
+
+    :param frames: dict of arrays of the same shape [T x ROWS x COLS].
+    :param keyframes: bool array [T] of the frames to encode as keyframes.
+    :param previous: dict of the frames [ROWS x COLS] before the first one.
+        If None, the first frame is a keyframe.
+    :returns: (run_counts, value_counts, starts, lengths, values): The number
+        of runs and values of each frame (np.uint32 [T]), the start and length
+        of each run (np.uint16), and dict of the values of each array.
+    """
+    flat = {
+        key: a.reshape(len(a), int(np.prod(a.shape[1:]))) for key, a in frames.items()
+    }
+    num_frames, num_cells = next(iter(flat.values())).shape
+    if num_cells > np.iinfo(np.uint16).max:
+        raise ValueError("Frames of %i cells are too large" % num_cells)
+
+    # A cell past each frame that never changes, so runs end within frames.
+    changed = np.zeros((num_frames, num_cells + 1), dtype=bool)
+    for key, a in flat.items():
+        changed[1:, :num_cells] |= a[1:] != a[:-1]
+        if previous is not None and num_frames:
+            changed[0, :num_cells] |= a[0] != previous[key].ravel()
+    keyframes = np.array(keyframes, dtype=bool)
+    if previous is None and num_frames:
+        keyframes[0] = True
+    changed[keyframes, :num_cells] = True
+
+    edges = np.diff(changed.ravel().view(np.int8), prepend=np.int8(0))
+    begins = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    mask = changed[:, :num_cells]
+    return (
+        np.bincount(begins // (num_cells + 1), minlength=num_frames).astype(np.uint32),
+        np.count_nonzero(mask, axis=1).astype(np.uint32),
+        (begins % (num_cells + 1)).astype(np.uint16),
+        (ends - begins).astype(np.uint16),
+        {key: a[mask] for key, a in flat.items()},
+    )
+
+
+class DeltaFrames:
+    """Frames encoded by `encode`, possibly from several calls in a row."""
+
+    def __init__(self, shape, run_counts, value_counts, starts, lengths, values):
+        """
+        :param shape: (ROWS, COLS) of a frame.
+        :param run_counts: number of runs of each frame.
+        :param value_counts: number of values of each frame.
+        :param starts: start cell of each run.
+        :param lengths: length of each run.
+        :param values: dict of the values of each array.
+        """
+        self.shape = tuple(shape)
+        self._run_offsets = np.zeros(len(run_counts) + 1, dtype=np.int64)
+        np.cumsum(run_counts, out=self._run_offsets[1:])
+        self._value_offsets = np.zeros(len(value_counts) + 1, dtype=np.int64)
+        np.cumsum(value_counts, out=self._value_offsets[1:])
+        self._starts = starts
+        self._lengths = lengths
+        self._values = values
+
+    def __len__(self):
+        return len(self._run_offsets) - 1
+
+    def is_keyframe(self, frame):
+        return self._value_offsets[frame + 1] - self._value_offsets[frame] == (
+            self.shape[0] * self.shape[1]
+        )
+
+    def decode(self, start, stop, previous=None):
+        """Decodes the frames start..stop-1.
+
+        :param previous: dict of the frames [ROWS x COLS] before start, as
+            returned by an earlier call. Needed unless start is a keyframe.
+        :returns: dict of arrays [stop - start x ROWS x COLS].
+        """
+        num_frames = stop - start
+        num_cells = self.shape[0] * self.shape[1]
+        if previous is None and num_frames > 0 and not self.is_keyframe(start):
+            raise ValueError("Frame %i isn't a keyframe" % start)
+
+        r0, r1 = self._run_offsets[start], self._run_offsets[stop]
+        v0, v1 = self._value_offsets[start], self._value_offsets[stop]
+        run_frames = np.repeat(
+            np.arange(num_frames), np.diff(self._run_offsets[start : stop + 1])
+        )
+        lengths = self._lengths[r0:r1].astype(np.intp)
+        value_starts = np.cumsum(lengths) - lengths
+        cells = np.arange(v1 - v0) - np.repeat(
+            value_starts - self._starts[r0:r1], lengths
+        )
+
+        # For each frame and cell, the index of its latest value. The values
+        # of previous, if any, come first.
+        offset = 0 if previous is None else num_cells
+        latest = np.zeros((num_frames, num_cells), dtype=np.intp)
+        if previous is not None:
+            latest[0] = np.arange(num_cells)
+        latest[np.repeat(run_frames, lengths), cells] = np.arange(
+            offset, offset + v1 - v0
+        )
+        np.maximum.accumulate(latest, axis=0, out=latest)
+
+        result = {}
+        for key, values in self._values.items():
+            values = values[v0:v1]
+            if previous is not None:
+                values = np.concatenate([previous[key].ravel(), values])
+            result[key] = values[latest].reshape((num_frames,) + self.shape)
+        return result
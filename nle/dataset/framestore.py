@@ -0,0 +1,360 @@
+import json
+import os
+
+import numpy as np
+
+from nle import dataset as nld
+from nle.dataset import dataset
+from nle.dataset import delta
+
+META = "meta.json"
+INDEX = "index.npy"
+
+# Delta encoded keys, with their runs in the files below.
+DELTA_KEYS = ("tty_chars", "tty_colors")
+DELTA_FILES = {
+    "run_counts": ("screen.run_counts", np.uint32),
+    "value_counts": ("screen.value_counts", np.uint32),
+    "starts": ("screen.starts", np.uint16),
+    "lengths": ("screen.lengths", np.uint16),
+}
+
+
+def _frame_fields(rows, cols, ttyrec_version):
+    """Returns the (dtype, shape) of one frame of each stored key."""
+    fields = {
+        "tty_chars": (np.uint8, (rows, cols)),
+        "tty_colors": (np.int8, (rows, cols)),
+        "tty_cursor": (np.int16, (2,)),
+        "timestamps": (np.int64, ()),
+    }
+    if ttyrec_version >= 2:
+        fields["actions"] = (np.uint8, ())
+    if ttyrec_version >= 3:
+        fields["scores"] = (np.int32, ())
+    return fields
+
+
+def _map(filename, dtype, shape=None):
+    """Memory-maps a raw file read-only, or returns an empty array."""
+    if os.path.getsize(filename) == 0:  # Can't map empty files.
+        return np.zeros((0,) + (shape or (0,))[1:], dtype=dtype)
+    return np.memmap(filename, dtype=dtype, mode="r", shape=shape)
+
+
+def materialize(
+    dataset_name,
+    path,
+    dbfilename=nld.db.DB,
+    rows=24,
+    cols=80,
+    gameids=None,
+    chunk_size=4096,
+    keyframe_interval=None,
+):
+    """Converts the ttyrecs of a dataset once into a frame store at `path`.
+
+    Each game is converted chunk_size frames at a time and appended to one
+    raw file per key (`tty_chars`, `tty_colors`, `tty_cursor`, `timestamps`
+    and, depending on the ttyrec version, `actions` and `scores`). The
+    frames of all parts of a game are stored contiguously, in order of
+    gameid, and `index.npy` holds the (gameid, offset, length) of each game.
+    `meta.json`, written last, describes the store. Read it with
+    `FrameStoreDataset`.
+
+    With a keyframe_interval, `tty_chars` and `tty_colors` are delta encoded
+    (see `nle.dataset.delta`): Frames hold only the cells changed since the
+    previous frame, except every keyframe_interval-th frame of a game, which
+    random access decodes from.
+
+    :param dataset_name: Name of the dataset in the db.
+    :param path: Directory of the store. Must not hold a store yet.
+    :param dbfilename: Path to the database file.
+    :param rows: Row size of the terminal screen.
+    :param cols: Column size of the terminal screen.
+    :param gameids: Store a subselection of games (gameids) only.
+    :param chunk_size: Number of frames to convert at a time.
+    :param keyframe_interval: If set, delta encode the screen with a keyframe
+        every this many frames.
+    :returns: The number of frames stored.
+    """
+    data = nld.TtyrecDataset(
+        dataset_name,
+        rows=rows,
+        cols=cols,
+        dbfilename=dbfilename,
+        gameids=gameids,
+        shuffle=False,
+    )
+    ttyrec_version = data._ttyrec_version
+    fields = _frame_fields(rows, cols, ttyrec_version)
+
+    os.makedirs(path, exist_ok=True)
+    if os.path.exists(os.path.join(path, META)):
+        raise FileExistsError("Frame store exists at '%s'" % path)
+
+    index = []
+    offset = 0
+    filenames = {key: key for key in fields}
+    if keyframe_interval:
+        filenames.update({key: f for key, (f, _) in DELTA_FILES.items()})
+    files = {key: open(os.path.join(path, f), "wb") for key, f in filenames.items()}
+    try:
+        for gameid in sorted(data._gameids):
+            length = 0
+            previous = None
+            for mb in dataset._ttyrec_generator(
+                1,
+                chunk_size,
+                rows,
+                cols,
+                data._make_load_fn([gameid]),
+                map,
+                ttyrec_version,
+            ):
+                valid = mb["gameids"][0] != 0
+                n = int(np.count_nonzero(valid))
+                chunk = {key: mb[key][0][valid] for key in fields}
+                if keyframe_interval and n:
+                    screen = {key: chunk.pop(key) for key in DELTA_KEYS}
+                    keyframes = np.arange(length, length + n) % keyframe_interval == 0
+                    *runs, values = delta.encode(screen, keyframes, previous)
+                    chunk.update(zip(DELTA_FILES, runs), **values)
+                    previous = {key: a[-1] for key, a in screen.items()}
+                for key, array in chunk.items():
+                    files[key].write(np.ascontiguousarray(array))
+                length += n
+            index.append((gameid, offset, length))
+            offset += length
+    finally:
+        for f in files.values():
+            f.close()
+
+    np.save(os.path.join(path, INDEX), np.array(index, dtype=np.int64).reshape(-1, 3))
+    with open(os.path.join(path, META), "w") as f:
+        json.dump(
+            dict(
+                dataset_name=dataset_name,
+                rows=rows,
+                cols=cols,
+                ttyrec_version=ttyrec_version,
+                num_frames=offset,
+                keys=list(fields),
+                keyframe_interval=keyframe_interval,
+            ),
+            f,
+        )
+    return offset
+
+
+class FrameStoreDataset:
+    """Dataset object to allow iteration through the games of a frame store."""
+
+    def __init__(
+        self,
+        path,
+        batch_size=128,
+        seq_length=32,
+        gameids=None,
+        shuffle=True,
+        loop_forever=False,
+    ):
+        """
+        An iterable dataset to load minibatches of NetHack games from a frame
+        store made by `materialize`. (shape: [batch_size, seq_length, ...])
+
+        Minibatches are the same as those of a `TtyrecDataset` of the same
+        games, but are copied from memory-mapped files instead of converted on
+        the fly. As there, the generators reuse their numpy arrays. Single
+        frames or ranges of a game can be read directly with `get_frames`, or
+        by indexing with (gameid, frame).
+
+        Example
+        -------
+            ```
+            import nle.dataset as nld
+
+            nld.materialize("data1", "path/to/data1_store")
+            dataset = nld.FrameStoreDataset("path/to/data1_store")
+
+            for mb in dataset:
+                # NB: dataset reuses np arrays, for performance reasons
+                print(mb)
+
+            frame = dataset[gameid, 100]
+            ```
+
+        :param path: Directory of the store.
+        :param batch_size: Number of parallel games to load.
+        :param seq_length: Number of frames to load per game.
+        :param gameids: Use a subselection of games (gameids) only.
+        :param shuffle: Shuffle the order of gameids before iterating through them.
+        :param loop_forever: If true, cycle through gameids forever,
+            insted of padding empty batch dims with 0's.
+        """
+        self.batch_size = batch_size
+        self.seq_length = seq_length
+        self.shuffle = shuffle
+        self.loop_forever = loop_forever
+        self.path = path
+
+        with open(os.path.join(path, META)) as f:
+            self._meta = json.load(f)
+        self.rows = self._meta["rows"]
+        self.cols = self._meta["cols"]
+        self._ttyrec_version = self._meta["ttyrec_version"]
+
+        num_frames = self._meta["num_frames"]
+        fields = _frame_fields(self.rows, self.cols, self._ttyrec_version)
+        self._fields = fields
+        self._keyframe_interval = self._meta.get("keyframe_interval")
+        self._frames = {}
+        self._delta = None
+        for key, (dtype, shape) in fields.items():
+            if self._keyframe_interval and key in DELTA_KEYS:
+                continue
+            self._frames[key] = _map(
+                os.path.join(path, key), dtype, (num_frames,) + shape
+            )
+        if self._keyframe_interval:
+            self._delta = delta.DeltaFrames(
+                (self.rows, self.cols),
+                *(
+                    _map(os.path.join(path, f), dtype)
+                    for f, dtype in DELTA_FILES.values()
+                ),
+                {
+                    key: _map(os.path.join(path, key), fields[key][0])
+                    for key in DELTA_KEYS
+                },
+            )
+
+        self._games = {
+            gameid: (offset, length)
+            for gameid, offset, length in np.load(os.path.join(path, INDEX)).tolist()
+        }
+        if gameids is None:
+            gameids = self._games.keys()
+        self._gameids = list(gameids)
+
+    def get_length(self, gameid):
+        """Returns the number of frames of a game."""
+        return self._games[gameid][1]
+
+    def _read(self, offset, start, stop, previous=None):
+        """Returns the frames start..stop-1 of the game at offset, decoding
+        delta encoded keys from the keyframe before start unless previous
+        has the frame before start."""
+        result = {
+            key: frames[offset + start : offset + stop]
+            for key, frames in self._frames.items()
+        }
+        if self._delta is not None:
+            begin = start
+            if previous is None:
+                begin -= start % self._keyframe_interval
+            decoded = self._delta.decode(offset + begin, offset + stop, previous)
+            result.update((k, v[start - begin :]) for k, v in decoded.items())
+        return {key: result[key] for key in self._fields}
+
+    def get_frames(self, gameid, start=0, stop=None):
+        """Returns the frames start..stop-1 of a game, keyed like minibatches
+        but without a batch dimension. These are read-only views of the store,
+        except for delta encoded keys, which are decoded."""
+        offset, length = self._games[gameid]
+        start, stop, _ = slice(start, stop).indices(length)
+        return self._read(offset, start, max(start, stop))
+
+    def __getitem__(self, key):
+        """Returns the frame at (gameid, frame) as read-only views."""
+        gameid, frame = key
+        length = self.get_length(gameid)
+        if not -length <= frame < length:
+            raise IndexError("Frame %i out of range for gameid %i" % (frame, gameid))
+        frame %= length
+        return {k: v[0] for k, v in self.get_frames(gameid, frame, frame + 1).items()}
+
+    def _generator(self, gameids):
+        batch_size, seq_length = self.batch_size, self.seq_length
+        arrays = {
+            key: np.zeros((batch_size, seq_length) + shape, dtype=dtype)
+            for key, (dtype, shape) in self._fields.items()
+        }
+        resets = np.zeros((batch_size, seq_length), dtype=np.uint8)
+        batch_gameids = np.zeros((batch_size, seq_length), dtype=np.int32)
+
+        key_vals = [
+            ("tty_chars", arrays["tty_chars"]),
+            ("tty_colors", arrays["tty_colors"]),
+            ("tty_cursor", arrays["tty_cursor"]),
+            ("timestamps", arrays["timestamps"]),
+            ("done", resets),
+            ("gameids", batch_gameids),
+        ]
+        key_vals.extend(
+            (key, arrays[key]) for key in ("actions", "scores") if key in arrays
+        )
+
+        count = [0]
+
+        def next_game():
+            """Returns [gameid, frame, is_new_game] or None if out of games."""
+            i = count[0]
+            count[0] += 1
+            if (not self.loop_forever) and i >= len(gameids):
+                return None
+            return [gameids[i % len(gameids)], 0, True]
+
+        # Load initial gameids; as with ttyrecs, their starts aren't resets.
+        games = [next_game() for _ in range(batch_size)]
+        assert all(games), "Not enough games to fill a batch!"
+        for game in games:
+            game[2] = False
+
+        batch_gameids[0, -1] = 1  # "do-while", as in _ttyrec_generator.
+        while np.any(batch_gameids[:, -1] != 0):
+            resets.fill(0)
+            for b in range(batch_size):
+                t = 0
+                previous = None
+                game = games[b]
+                if (
+                    self._delta is not None
+                    and game
+                    and 0 < game[1] < self.get_length(game[0])
+                ):
+                    # Continue decoding from the last frame of this entry.
+                    previous = {k: arrays[k][b, -1].copy() for k in DELTA_KEYS}
+                while t < seq_length:
+                    game = games[b]
+                    if game and game[1] == self.get_length(game[0]):
+                        # Like the converters, load the next game only when
+                        # there's space for it.
+                        game = games[b] = next_game()
+                    if game is None:
+                        for array in arrays.values():
+                            array[b, t:] = 0
+                        batch_gameids[b, t:] = 0
+                        break
+                    gameid, frame, is_new_game = game
+                    offset, length = self._games[gameid]
+                    n = min(seq_length - t, length - frame)
+                    if n == 0:
+                        continue
+                    frames = self._read(offset, frame, frame + n, previous)
+                    for key, array in arrays.items():
+                        array[b, t : t + n] = frames[key]
+                    previous = None
+                    batch_gameids[b, t : t + n] = gameid
+                    resets[b, t] = is_new_game
+                    game[1] += n
+                    game[2] = False
+                    t += n
+
+            yield dict(key_vals)
+
+    def __iter__(self):
+        gameids = list(self._gameids)
+        if self.shuffle:
+            np.random.shuffle(gameids)
+        return self._generator(gameids)
@@ -2,9 +2,11 @@ import collections
 import datetime
 import glob
 import os
+import re
 import time
 
 from nle import dataset as nld
+from nle import nethack
 
 XLOGFILE_COLUMNS = [
     ("version", str),
@@ -38,8 +40,23 @@ XLOGFILE_COLUMNS = [
 FIVE_MINS = 5 * 60
 
 
+_TTYREC_NAME = re.compile(
+    r"\.ttyrec(\d*)(?:%s)$"
+    % "|".join(re.escape(ext) for ext in nethack.TTYREC_EXTENSIONS.values())
+)
+
+
+def _glob_ttyrecs(pattern):
+    """Yields (path, version) of the files matching `pattern` + "*" that end
+    in ".ttyrec<version>" and one of `nethack.TTYREC_EXTENSIONS`."""
+    for path in glob.iglob(pattern + "*"):
+        match = _TTYREC_NAME.search(path)
+        if match:
+            yield path, match.group(1)
+
+
 def altorg_filename_to_timestamp(filename):
-    ts = filename.split("/")[-1][:-11]
+    ts = filename.split("/")[-1].split(".ttyrec")[0]
     try:
         ts = datetime.datetime.fromisoformat(ts)
     except AttributeError:
@@ -160,8 +177,8 @@ def add_altorg_directory(path, name, filename=nld.db.DB):
             blacklisted_ttyrecs = set(str(os.path.join(path, p)) for p in f.readlines())
 
         ttyrecs_dict = collections.defaultdict(list)
-        for ttyrec in glob.iglob(path + "/*/*.ttyrec.bz2"):
-            if ttyrec in blacklisted_ttyrecs:
+        for ttyrec, version in _glob_ttyrecs(path + "/*/*.ttyrec"):
+            if version or ttyrec in blacklisted_ttyrecs:
                 continue
             ttyrecs_dict[ttyrec.split("/")[-2].lower()].append(ttyrec)
 
@@ -256,11 +273,11 @@ def add_nledata_directory(path, name, filename=nld.db.DB):
         # 2. For each xlogfile, read the games and take only the games that
         #   correspond to the ttyrecs that exist in the enclosing directory.
         for xlogfile in sorted(glob.iglob(path + "/*/*.xlogfile")):
-            stem = xlogfile.replace(".xlogfile", ".*.ttyrec*.bz2")
+            stem = xlogfile.replace(".xlogfile", ".*.ttyrec")
 
-            files = set(glob.iglob(stem))
+            files = dict(_glob_ttyrecs(stem))
             ttyrecnames = set(f.split("/")[-1] for f in files)
-            versions = set(f.split("ttyrec")[-1].replace(".bz2", "") for f in files)
+            versions = set(files.values())
             assert len(versions) == 1, "Cannot add ttyrecs with different versions"
             version = versions.pop()
 
@@ -315,6 +332,55 @@ def add_nledata_directory(path, name, filename=nld.db.DB):
     )
 
 
+def index_ttyrecs(name, interval=1000, rows=24, cols=80, filename=nld.db.DB):
+    """Adds checkpoints to the ttyrecs of a dataset, for random access.
+
+    Each game is converted once, saving a checkpoint (the position in the
+    ttyrec and the state of the terminal) at the start of each part, every
+    `interval` frames and at its end. `TtyrecDataset.get_ttyrec_window` then
+    starts converting at the checkpoint before a window, instead of at the
+    start of the game. bz2 ttyrecs are entered at the compressed block (of
+    up to 900 kB) of the checkpoint, uncompressed ones right at it; other
+    codecs still decompress, but don't convert, from the start.
+
+    Checkpoints are only valid for the terminal size (rows and cols) of the
+    dataset, and the build of NLE, that made them.
+    """
+    data = nld.TtyrecDataset(name, rows=rows, cols=cols, dbfilename=filename)
+    with nld.db.db(filename=filename, rw=True) as conn:
+        print("Indexing dataset '%s' in '%s' " % (name, filename))
+        stime = time.time()
+        count = 0
+        for gameid in sorted(data._gameids):
+            converter = nld.Converter(rows, cols, data._ttyrec_version)
+            for part, path in enumerate(data.get_paths(gameid)):
+                converter.load_ttyrec(
+                    os.path.join(data._rootpath, path),
+                    gameid=gameid,
+                    part=part,
+                    seekable=True,
+                )
+                checkpoints = [(0, converter.checkpoint())]
+                while True:
+                    skipped = converter.skip(interval)
+                    if skipped:
+                        checkpoints.append((converter.frame, converter.checkpoint()))
+                    if skipped < interval:
+                        break
+                nld.db.add_checkpoints(
+                    gameid, part, checkpoints, conn=conn, commit=False
+                )
+                count += len(checkpoints)
+
+        mtime = time.time()
+        conn.commit()
+
+    print(
+        "Updated '%s' in %.2f sec. Size: %.2f MB, Checkpoints: %i"
+        % (filename, mtime - stime, os.path.getsize(filename) / 1024**2, count)
+    )
+
+
 def ttyrec_data_generator(ttyrecs, gameids, root):
     last_gameid = None
     for path, gameid in zip(ttyrecs, gameids):
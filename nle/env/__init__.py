@@ -3,6 +3,7 @@ import gym
 from gym.envs import registration
 
 from nle.env.base import NLE, DUNGEON_SHAPE
+from nle.env.vector import NLEVectorEnv, SharedMemoryVectorEnv
 
 _version = "v0"
 
@@ -31,4 +32,4 @@ for name in (
     )
 
 
-__all__ = ["NLE", "DUNGEON_SHAPE"]
+__all__ = ["NLE", "NLEVectorEnv", "SharedMemoryVectorEnv", "DUNGEON_SHAPE"]
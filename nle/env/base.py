@@ -131,9 +131,68 @@ NLE_SPACE_ITEMS = (
             **nethack.OBSERVATION_DESC["misc"],
         ),
     ),
+    (
+        "glyphs_changed",
+        gym.spaces.Box(low=0, high=1, **nethack.OBSERVATION_DESC["glyphs_changed"]),
+    ),
+    (
+        "explored_cells",
+        gym.spaces.Box(
+            low=0,
+            high=np.prod(nethack.DUNGEON_SHAPE),
+            **nethack.OBSERVATION_DESC["explored_cells"],
+        ),
+    ),
+    (
+        "egocentric_glyphs",
+        gym.spaces.Box(
+            low=0,
+            high=nethack.MAX_GLYPH,
+            **nethack.OBSERVATION_DESC["egocentric_glyphs"],
+        ),
+    ),
+    (
+        "egocentric_chars",
+        gym.spaces.Box(low=0, high=255, **nethack.OBSERVATION_DESC["egocentric_chars"]),
+    ),
+    (
+        "egocentric_colors",
+        gym.spaces.Box(low=0, high=15, **nethack.OBSERVATION_DESC["egocentric_colors"]),
+    ),
+    (
+        "level_maps",
+        gym.spaces.Box(
+            low=0, high=nethack.MAX_GLYPH, **nethack.OBSERVATION_DESC["level_maps"]
+        ),
+    ),
+    (
+        "level_map_levels",
+        gym.spaces.Box(
+            low=0,
+            high=max(nethack.MAXDUNGEON, nethack.MAXLEVEL),
+            **nethack.OBSERVATION_DESC["level_map_levels"],
+        ),
+    ),
+    (
+        "action_mask",
+        gym.spaces.Box(low=0, high=1, **nethack.OBSERVATION_DESC["action_mask"]),
+    ),
 )
 
 
+def _observation_space(observation_keys, egocentric_radius, actions):
+    """The spaces of NLE_SPACE_ITEMS for the given keys, radius and actions."""
+    space_dict = dict(NLE_SPACE_ITEMS)
+    spaces = {}
+    for key in observation_keys:
+        space = space_dict[key]
+        desc = nethack.observation_desc(key, egocentric_radius, actions)
+        if space.shape != desc["shape"]:
+            space = gym.spaces.Box(low=space.low.min(), high=space.high.max(), **desc)
+        spaces[key] = space
+    return gym.spaces.Dict(spaces)
+
+
 class NLE(gym.Env):
     """Standard NetHack Learning Environment.
 
@@ -165,6 +224,18 @@ class NLE(gym.Env):
         RUNNING = 0
         DEATH = 1
 
+    # Observations we always need, whether requested or not.
+    _required_observation_keys = (
+        "glyphs",
+        "blstats",
+        "message",
+        "program_state",
+        "internal",
+    )
+    # The observations `_reward_fn` reads from last_observation. Only these
+    # are kept from one step to the next, the others are None there.
+    _last_observation_keys = ("blstats",)
+
     def __init__(
         self,
         save_ttyrec_every=0,
@@ -193,6 +264,12 @@ class NLE(gym.Env):
         allow_all_yn_questions=False,
         allow_all_modes=False,
         spawn_monsters=True,
+        fast_reset=False,
+        collect_stats=False,
+        ttyrec_codec="bz2",
+        headless=False,
+        egocentric_radius=nethack.EGOCENTRIC_RADIUS,
+        egocentric_pad_glyph=nethack.GLYPH_CMAP_OFF,
     ):
         """Constructs a new NLE environment.
 
@@ -211,6 +288,8 @@ class NLE(gym.Env):
                 Defaults to all.
             actions (list): list of actions. If None, the full action space will
                 be used, i.e. ``nle.nethack.ACTIONS``. Defaults to None.
+                The action_mask observation tells which of these may do
+                anything in the current state.
             options (list): list of game options to initialize Nethack. If None,
                 Nethack will be initialized with the options found in
                 ``nle.nethack.NETHACKOPTIONS`. Defaults to None.
@@ -224,12 +303,34 @@ class NLE(gym.Env):
                 If set to False, only skip click through 'MORE' on death.
             spawn_monsters: If False, disables normal NetHack behavior to randomly
                 create monsters.
+            fast_reset (bool): If True, reset() restores NetHack's initial
+                memory in place instead of reloading its shared library.
+                Only supported on Linux. Defaults to False.
+            collect_stats (bool): If True, time the phases of each step and
+                report the totals in ``info["stats"]``, see
+                `nethack.Nethack.get_stats`. ``env_step_ns`` there is the
+                time spent in this class' step(). Defaults to False.
+            ttyrec_codec (str): compression of saved ttyrecs, one of the keys
+                of ``nethack.TTYREC_EXTENSIONS``. "zstd" needs NLE to be
+                built with zstd. Defaults to "bz2".
+            headless (bool): If True, NetHack's terminal isn't drawn, which
+                makes steps faster. Needs observation_keys without tty_*
+                observations and save_ttyrec_every=0, so render("human")
+                isn't available. Defaults to False.
+            egocentric_radius (int): the egocentric_* observations show the
+                cells within this distance of the hero. Defaults to 4,
+                i.e., 9x9 cells.
+            egocentric_pad_glyph (int): the egocentric_glyphs of cells
+                outside of the map. Defaults to ``nethack.GLYPH_CMAP_OFF``
+                (stone, like unexplored cells).
         """
         self.character = character
         self._max_episode_steps = max_episode_steps
         self._allow_all_yn_questions = allow_all_yn_questions
         self._allow_all_modes = allow_all_modes
         self._save_ttyrec_every = save_ttyrec_every
+        if ttyrec_codec not in nethack.TTYREC_EXTENSIONS:
+            raise ValueError("Unknown ttyrec codec '%s'" % ttyrec_codec)
 
         if actions is None:
             actions = FULL_ACTIONS
@@ -266,13 +367,7 @@ class NLE(gym.Env):
             )
 
         # Observations we always need.
-        for key in (
-            "glyphs",
-            "blstats",
-            "message",
-            "program_state",
-            "internal",
-        ):
+        for key in self._required_observation_keys:
             if key not in self._observation_keys:
                 self._observation_keys.append(key)
 
@@ -282,13 +377,33 @@ class NLE(gym.Env):
         self._program_state_index = self._observation_keys.index("program_state")
         self._internal_index = self._observation_keys.index("internal")
 
+        # Copied to before each step, as NetHack refills its buffers.
+        self._last_observation = tuple(
+            (
+                np.zeros(
+                    **nethack.observation_desc(key, egocentric_radius, self.actions)
+                )
+                if key in self._last_observation_keys
+                else None
+            )
+            for key in self._observation_keys
+        )
+        self._last_pairs = tuple(
+            (last, i)
+            for i, last in enumerate(self._last_observation)
+            if last is not None
+        )
+
         self._original_observation_keys = observation_keys
         self._original_indices = tuple(
             self._observation_keys.index(key) for key in observation_keys
         )
 
         if self.savedir:
-            ttyrec_version = ".ttyrec%i.bz2" % nethack.TTYREC_VERSION
+            ttyrec_version = ".ttyrec%i%s" % (
+                nethack.TTYREC_VERSION,
+                nethack.TTYREC_EXTENSIONS[ttyrec_codec],
+            )
             ttyrec_prefix = "nle.%i.%%i" % os.getpid()
             self._ttyrec_pattern = os.path.join(
                 self.savedir, ttyrec_prefix + ttyrec_version
@@ -308,17 +423,32 @@ class NLE(gym.Env):
             wizard=wizard,
             spawn_monsters=spawn_monsters,
             scoreprefix=scoreprefix,
+            fast_reset=fast_reset,
+            collect_stats=collect_stats,
+            headless=headless,
+            egocentric_radius=egocentric_radius,
+            egocentric_pad_glyph=egocentric_pad_glyph,
+            actions=self.actions,
         )
+        self._collect_stats = collect_stats
+        self._stats = {"env_step_calls": 0, "env_step_ns": 0}
         self._close_nethack = weakref.finalize(self, self.nethack.close)
+        # Prompts get skipped in NetHack's step loop, see _perform_known_steps.
+        self.nethack.set_skip_policy(
+            every_step=not allow_all_modes,
+            on_game_over=True,
+            decline_yn=not allow_all_yn_questions,
+            yn_exceptions=SKIP_EXCEPTIONS,
+            reset_to_moveloop=True,
+        )
 
         self._random = random.SystemRandom()
 
         # -1 so that it's 0-based on first reset
         self._episode = -1
 
-        space_dict = dict(NLE_SPACE_ITEMS)
-        self.observation_space = gym.spaces.Dict(
-            {key: space_dict[key] for key in observation_keys}
+        self.observation_space = _observation_space(
+            observation_keys, egocentric_radius, self.actions
         )
 
         self.action_space = gym.spaces.Discrete(len(self.actions))
@@ -353,15 +483,16 @@ class NLE(gym.Env):
                   `end_status`, i.e. a status info -- death, task win, etc. --
                   for the terminal state).
         """
+        start = time.perf_counter_ns() if self._collect_stats else 0
+
         # Careful: By default we re-use Numpy arrays, so copy before!
-        last_observation = tuple(a.copy() for a in self.last_observation)
+        if self.last_observation:
+            for last, i in self._last_pairs:
+                np.copyto(last, self.last_observation[i])
+        last_observation = self._last_observation
 
-        observation, done = self.nethack.step(self.actions[action])
-        is_game_over = observation[self._program_state_index][0] == 1
-        if is_game_over or not self._allow_all_modes:
-            observation, done = self._perform_known_steps(
-                observation, done, exceptions=True
-            )
+        # Skips prompts as set in __init__.
+        observation, done = self.nethack.step(self.actions[action], skip_prompts=True)
 
         self._steps += 1
 
@@ -386,8 +517,18 @@ class NLE(gym.Env):
         info["end_status"] = end_status
         info["is_ascended"] = self.nethack.how_done() == nethack.ASCENDED
 
+        if self._collect_stats:
+            self._stats["env_step_calls"] += 1
+            self._stats["env_step_ns"] += time.perf_counter_ns() - start
+            info["stats"] = dict(self.nethack.get_stats(), **self._stats)
+
         return self._get_observation(observation), reward, done, info
 
+    def reset_stats(self):
+        """Sets the totals in ``info["stats"]`` to zero."""
+        self.nethack.reset_stats()
+        self._stats = dict.fromkeys(self._stats, 0)
+
     def _in_moveloop(self, observation):
         program_state = observation[self._program_state_index]
         return program_state[3]  # in_moveloop
@@ -409,24 +550,18 @@ class NLE(gym.Env):
             new_ttyrec = self._ttyrec_pattern % self._episode
         else:
             new_ttyrec = None
+        # Steps past the initial phase of the game, see __init__. This should
+        # make sure all the observations are present.
         self.last_observation = self.nethack.reset(
             new_ttyrec, wizkit_items=wizkit_items
         )
 
         self._steps = 0
 
-        for _ in range(1000):
-            # Get past initial phase of game. This should make sure
-            # all the observations are present.
-            if self._in_moveloop(self.last_observation):
-                break
+        if not self._in_moveloop(self.last_observation):
             # This fails if the agent picks up a scroll of scare
             # monster at the 0th turn and gets asked to name it.
-            # Hence the defensive iteration above.
             # TODO: Detect this 'in_getlin' situation and handle it.
-            self.last_observation, done = self.nethack.step(ASCII_SPACE)
-            assert not done, "Game ended unexpectedly"
-        else:
             warnings.warn(
                 "Not in moveloop after 1000 tries, aborting (ttyrec: %s)." % new_ttyrec
             )
@@ -532,7 +667,11 @@ class NLE(gym.Env):
         return self.StepStatus.RUNNING
 
     def _reward_fn(self, last_observation, action, observation, end_status):
-        """Reward function. Difference between previous score and new score."""
+        """Reward function. Difference between previous score and new score.
+
+        Tasks overriding this method must list the observations they read
+        from last_observation in ``_last_observation_keys``.
+        """
         if not self.nethack.in_normal_game():
             # Before game started and after it ended blstats are zero.
             return 0.0
@@ -543,6 +682,7 @@ class NLE(gym.Env):
         return score - old_score
 
     def _perform_known_steps(self, observation, done, exceptions=True):
+        # Like the skip policy of self.nethack, for stepping from Python.
         while not done:
             if observation[self._internal_index][3]:  # xwaitforspace
                 observation, done = self.nethack.step(ASCII_SPACE)
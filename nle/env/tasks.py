@@ -225,6 +225,8 @@ class NetHackEat(NetHackScore):
     comestibles or monster corpses), rather than the score.
     """
 
+    _last_observation_keys = ("blstats", "internal")
+
     def _reward_fn(self, last_observation, action, observation, end_status):
         """Difference between previous hunger and new hunger."""
         del end_status  # Unused
@@ -254,8 +256,17 @@ class NetHackScout(NetHackScore):
     defined by the changes in glyphs discovered by the agent.
     """
 
+    _required_observation_keys = base.NLE._required_observation_keys + (
+        "explored_cells",
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._explored_cells_index = self._observation_keys.index("explored_cells")
+
     def reset(self, *args, **kwargs):
-        self.dungeon_explored = {}
+        # Explored cells per level as of the last reward.
+        self.dungeon_explored = np.zeros(**nethack.OBSERVATION_DESC["explored_cells"])
         return super().reset(*args, **kwargs)
 
     def _reward_fn(self, last_observation, action, observation, end_status):
@@ -266,20 +277,15 @@ class NetHackScout(NetHackScore):
             # Before game started and after it ended blstats are zero.
             return 0.0
 
-        reward = 0
-        glyphs = observation[self._glyph_index]
         blstats = observation[self._blstats_index]
-
         dungeon_num = blstats[nethack.NLE_BL_DNUM]
         dungeon_level = blstats[nethack.NLE_BL_DLEVEL]
 
-        key = (dungeon_num, dungeon_level)
-        explored = np.sum(glyphs != nethack.GLYPH_CMAP_OFF)
-        explored_old = 0
-        if key in self.dungeon_explored:
-            explored_old = self.dungeon_explored[key]
-        reward = explored - explored_old
-        self.dungeon_explored[key] = explored
+        # Counted by NetHack as the map changes, per level.
+        index = (dungeon_num, dungeon_level - 1)
+        explored = observation[self._explored_cells_index][index]
+        reward = explored - self.dungeon_explored[index]
+        self.dungeon_explored[index] = explored
         time_penalty = self._get_time_penalty(last_observation, observation)
         return reward + time_penalty
 
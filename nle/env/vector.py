@@ -0,0 +1,385 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+import multiprocessing as mp
+import os
+
+import gym
+import numpy as np
+
+from nle import _sharedmem
+from nle import nethack
+from nle.env import base
+
+
+class NLEVectorEnv(gym.vector.VectorEnv):
+    """Several NetHack games as a gym vector environment.
+
+    All games run in one `nethack.BatchNethack`, stepped with a single call.
+    Finished games are reset automatically, their observation being the
+    first one of the next episode. Prompts are skipped like in `NLE`, but
+    no ttyrecs are recorded.
+
+    Examples:
+        >>> env = NLEVectorEnv(8)
+        >>> obs = env.reset()
+        >>> obs, rewards, dones, infos = env.step(env.action_space.sample())
+    """
+
+    def __init__(
+        self,
+        num_envs,
+        character="mon-hum-neu-mal",
+        max_episode_steps=5000,
+        observation_keys=(
+            "glyphs",
+            "chars",
+            "colors",
+            "specials",
+            "blstats",
+            "message",
+            "inv_glyphs",
+            "inv_strs",
+            "inv_letters",
+            "inv_oclasses",
+            "screen_descriptions",
+            "tty_chars",
+            "tty_colors",
+            "tty_cursor",
+        ),
+        actions=None,
+        options=None,
+        wizard=False,
+        allow_all_yn_questions=False,
+        allow_all_modes=False,
+        spawn_monsters=True,
+        fast_reset=False,
+        egocentric_radius=nethack.EGOCENTRIC_RADIUS,
+        egocentric_pad_glyph=nethack.GLYPH_CMAP_OFF,
+    ):
+        """Constructs a new vectorized NLE environment.
+
+        Args:
+            num_envs (int): number of games.
+            max_episode_steps (int): maximum amount of steps allowed before a
+                game is reset. In such cases, its ``info["end_status"]``
+                will be equal to ``NLE.StepStatus.ABORTED``.
+                Defaults to 5000.
+
+        See `NLE` for the other arguments.
+        """
+        self.character = character
+        self._max_episode_steps = max_episode_steps
+
+        if actions is None:
+            actions = base.FULL_ACTIONS
+        self.actions = actions
+        self._action_array = np.array(actions, dtype=np.int32)
+
+        self._observation_keys = tuple(observation_keys)
+        self.nethack = nethack.BatchNethack(
+            num_envs,
+            observation_keys=self._observation_keys,
+            playername="Agent-" + self.character,
+            options=options,
+            wizard=wizard,
+            spawn_monsters=spawn_monsters,
+            fast_reset=fast_reset,
+            egocentric_radius=egocentric_radius,
+            egocentric_pad_glyph=egocentric_pad_glyph,
+            actions=self.actions,
+        )
+        self.nethack.set_skip_policy(
+            every_step=not allow_all_modes,
+            on_game_over=True,
+            decline_yn=not allow_all_yn_questions,
+            yn_exceptions=base.SKIP_EXCEPTIONS,
+        )
+        self._steps = np.zeros(num_envs, dtype=np.int64)
+
+        super().__init__(
+            num_envs,
+            base._observation_space(observation_keys, egocentric_radius, self.actions),
+            gym.spaces.Discrete(len(self.actions)),
+        )
+        self._actions = None
+
+    def _get_observation(self, observation):
+        return dict(zip(self._observation_keys, observation))
+
+    def reset_wait(self, **kwargs):
+        self._steps[:] = 0
+        return self._get_observation(self.nethack.reset())
+
+    def step_async(self, actions):
+        self._actions = self._action_array[np.asarray(actions)]
+
+    def step_wait(self):
+        observation, dones, rewards = self.nethack.step(self._actions)
+        self._actions = None
+
+        self._steps += 1
+        end_status = np.where(
+            dones, base.NLE.StepStatus.DEATH, base.NLE.StepStatus.RUNNING
+        )
+        for i in np.flatnonzero(~dones & (self._steps >= self._max_episode_steps)):
+            self.nethack.reset(int(i))
+            dones[i] = True
+            end_status[i] = base.NLE.StepStatus.ABORTED
+        self._steps[dones] = 0
+
+        infos = [{"end_status": base.NLE.StepStatus(s)} for s in end_status]
+        return self._get_observation(observation), rewards, dones, infos
+
+    def close_extras(self, **kwargs):
+        self.nethack.close()
+
+
+def _worker(pipe, parent_pipe, env_class, env_kwargs, start, stop, shared):
+    """Runs the envs start..stop-1 of a SharedMemoryVectorEnv.
+
+    Commands come in on pipe, each answered with (True, result) or, if it
+    failed, (False, exception).
+    """
+    parent_pipe.close()
+    observation = {
+        key: _sharedmem.as_array(s) for key, s in shared["observation"].items()
+    }
+    actions = _sharedmem.as_array(shared["actions"])
+    rewards = _sharedmem.as_array(shared["rewards"])
+    dones = _sharedmem.as_array(shared["dones"])
+
+    envs = []
+    try:
+        try:
+            for i in range(start, stop):
+                env = env_class(**env_kwargs)
+                envs.append(env)
+                env.nethack.set_buffers(
+                    **{key: array[i] for key, array in observation.items()}
+                )
+            pipe.send((True, (env.observation_space, env.action_space)))
+        except Exception as e:
+            pipe.send((False, e))
+            return
+
+        while True:
+            command, arg = pipe.recv()
+            try:
+                if command == "step":
+                    infos = []
+                    for i, env in enumerate(envs, start):
+                        _, rewards[i], dones[i], info = env.step(int(actions[i]))
+                        if dones[i]:
+                            env.reset()
+                        infos.append(info)
+                    pipe.send((True, infos))
+                elif command == "reset":
+                    for env in envs:
+                        env.reset()
+                    pipe.send((True, None))
+                elif command == "seed":
+                    for env, seeds in zip(envs, arg[start:stop]):
+                        env.seed(*seeds)
+                    pipe.send((True, None))
+                elif command == "close":
+                    pipe.send((True, None))
+                    return
+                else:
+                    raise ValueError("Unknown command '%s'" % command)
+            except Exception as e:
+                pipe.send((False, e))
+    except KeyboardInterrupt:
+        pass  # Return silently, the parent gets interrupted too.
+    finally:
+        for env in envs:
+            env.close()
+        pipe.close()
+
+
+class SharedMemoryVectorEnv(gym.vector.VectorEnv):
+    """Several NLE environments, stepped in parallel by worker processes.
+
+    Each worker owns a contiguous share of the environments and steps them
+    one after the other. Observations are written by NetHack directly into
+    shared memory holding the whole ``[num_envs, ...]`` batch, so nothing
+    but short commands and the infos passes between processes, and
+    throughput can scale with the number of cores.
+
+    `step_async` starts stepping and `step_wait` waits for it, so callers
+    can do other work in between. Observations are the same arrays for
+    every step: They change from `step_async` on, so copy what's needed
+    for longer. Finished environments are reset automatically, like in
+    `NLEVectorEnv`.
+
+    Examples:
+        >>> env = SharedMemoryVectorEnv(32, num_workers=4)
+        >>> obs = env.reset()
+        >>> env.step_async(env.action_space.sample())
+        >>> obs, rewards, dones, infos = env.step_wait()
+    """
+
+    def __init__(
+        self,
+        num_envs,
+        num_workers=None,
+        env_class=base.NLE,
+        observation_keys=(
+            "glyphs",
+            "chars",
+            "colors",
+            "specials",
+            "blstats",
+            "message",
+            "inv_glyphs",
+            "inv_strs",
+            "inv_letters",
+            "inv_oclasses",
+            "screen_descriptions",
+            "tty_chars",
+            "tty_colors",
+            "tty_cursor",
+        ),
+        context=None,
+        **kwargs,
+    ):
+        """Constructs a new shared memory vector environment.
+
+        Args:
+            num_envs (int): number of environments.
+            num_workers (int): number of worker processes. Defaults to the
+                number of CPUs, at most num_envs.
+            env_class (type): `NLE` or a subclass of it, like the tasks in
+                ``nle.env.tasks``. Defaults to `NLE`.
+            observation_keys (list): keys to use when creating the
+                observation, see `NLE`.
+            context (str): the multiprocessing start method, e.g. "fork" or
+                "spawn". Defaults to the platform's default.
+            kwargs: further arguments of env_class, except savedir as all
+                environments would record to the same files.
+        """
+        if num_workers is None:
+            num_workers = os.cpu_count() or 1
+        num_workers = max(1, min(num_workers, num_envs))
+        ctx = mp.get_context(context)
+
+        self._observation_keys = tuple(observation_keys)
+        env_kwargs = dict(kwargs, observation_keys=self._observation_keys)
+
+        # Shapes depend on env_class and its arguments, e.g. the actions.
+        env = env_class(**env_kwargs)
+        spaces = env.observation_space.spaces
+        env.close()
+
+        shared = {
+            "observation": {
+                key: _sharedmem.shared_array(
+                    ctx, (num_envs,) + space.shape, space.dtype
+                )
+                for key, space in spaces.items()
+            },
+            "actions": _sharedmem.shared_array(ctx, (num_envs,), np.int64),
+            "rewards": _sharedmem.shared_array(ctx, (num_envs,), np.float64),
+            "dones": _sharedmem.shared_array(ctx, (num_envs,), np.bool_),
+        }
+        self._observation = {
+            key: _sharedmem.as_array(s) for key, s in shared["observation"].items()
+        }
+        self._actions = _sharedmem.as_array(shared["actions"])
+        self._rewards = _sharedmem.as_array(shared["rewards"])
+        self._dones = _sharedmem.as_array(shared["dones"])
+
+        bounds = np.linspace(0, num_envs, num_workers + 1).astype(int)
+        self._pipes = []
+        self._processes = []
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            pipe, worker_pipe = ctx.Pipe()
+            process = ctx.Process(
+                target=_worker,
+                args=(
+                    worker_pipe,
+                    pipe,
+                    env_class,
+                    env_kwargs,
+                    int(start),
+                    int(stop),
+                    shared,
+                ),
+                daemon=True,
+            )
+            process.start()
+            worker_pipe.close()
+            self._pipes.append(pipe)
+            self._processes.append(process)
+
+        self._waiting = False
+        try:
+            observation_space, action_space = self._receive()[0]
+        except Exception:
+            self._terminate()
+            raise
+        super().__init__(num_envs, observation_space, action_space)
+
+    def _send(self, command, arg=None):
+        for pipe in self._pipes:
+            pipe.send((command, arg))
+
+    def _receive(self):
+        """Returns the workers' results, raising the first error."""
+        results = []
+        error = None
+        for pipe in self._pipes:
+            ok, result = pipe.recv()
+            if not ok and error is None:
+                error = result
+            results.append(result)
+        if error is not None:
+            raise error
+        return results
+
+    def _terminate(self):
+        for process in self._processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        for pipe in self._pipes:
+            pipe.close()
+
+    def reset_async(self, **kwargs):
+        self._send("reset")
+        self._waiting = True
+
+    def reset_wait(self, **kwargs):
+        self._receive()
+        self._waiting = False
+        return self._observation
+
+    def step_async(self, actions):
+        self._actions[:] = actions
+        self._send("step")
+        self._waiting = True
+
+    def step_wait(self):
+        infos = sum(self._receive(), [])
+        self._waiting = False
+        return self._observation, self._rewards.copy(), self._dones.copy(), infos
+
+    def seed(self, seeds):
+        """Sets the seeds of all environments, see `NLE.seed`.
+
+        Args:
+            seeds (list): one tuple of arguments to `NLE.seed` per environment.
+        """
+        self._send("seed", list(seeds))
+        self._receive()
+
+    def close_extras(self, **kwargs):
+        try:
+            if self._waiting:
+                self._receive()
+            self._send("close")
+            self._receive()
+            for process in self._processes:
+                process.join()
+        except (OSError, EOFError):
+            pass  # Workers are gone already, e.g. at interpreter exit.
+        finally:
+            self._terminate()
@@ -3,6 +3,7 @@ from nle.nethack.actions import *  # noqa: F403
 from nle._pynethack.nethack import *  # noqa: F403
 from nle.nethack.nethack import (
     Nethack,
+    BatchNethack,
     NETHACKOPTIONS,
     DUNGEON_SHAPE,
     BLSTATS_SHAPE,
@@ -11,6 +12,12 @@ from nle.nethack.nethack import (
     PROGRAM_STATE_SHAPE,
     INTERNAL_SHAPE,
     OBSERVATION_DESC,
+    EGOCENTRIC_RADIUS,
+    LEVEL_MAPS,
+    observation_desc,
     TTYREC_VERSION,
+    TTYREC_EXTENSIONS,
     tty_render,
+    set_dl_pool_size,
+    clear_dl_pool,
 )
@@ -3,6 +3,7 @@ import os
 import shutil
 import sys
 import tempfile
+import threading
 import warnings
 import weakref
 
@@ -10,6 +11,7 @@ import numpy as np
 import pkg_resources
 
 from nle import _pynethack
+from nle.nethack.actions import ACTIONS
 
 DLPATH = os.path.join(os.path.dirname(_pynethack.__file__), "libnethack.so")
 
@@ -28,6 +30,12 @@ SCREEN_DESCRIPTIONS_SHAPE = DUNGEON_SHAPE + (
     _pynethack.nethack.NLE_SCREEN_DESCRIPTION_LENGTH,
 )
 TERMINAL_SHAPE = (_pynethack.nethack.NLE_TERM_LI, _pynethack.nethack.NLE_TERM_CO)
+# Indexed by dungeon number and level - 1, see NLE_BL_DNUM and NLE_BL_DLEVEL.
+EXPLORED_CELLS_SHAPE = (_pynethack.nethack.MAXDUNGEON, _pynethack.nethack.MAXLEVEL)
+EGOCENTRIC_RADIUS = _pynethack.nethack.NLE_EGOCENTRIC_RADIUS
+LEVEL_MAPS = _pynethack.nethack.NLE_LEVEL_MAPS
+# With the default radius, see observation_desc.
+EGOCENTRIC_SHAPE = (2 * EGOCENTRIC_RADIUS + 1, 2 * EGOCENTRIC_RADIUS + 1)
 
 OBSERVATION_DESC = {
     "glyphs": dict(shape=DUNGEON_SHAPE, dtype=np.int16),
@@ -47,9 +55,33 @@ OBSERVATION_DESC = {
     "tty_colors": dict(shape=TERMINAL_SHAPE, dtype=np.int8),
     "tty_cursor": dict(shape=(2,), dtype=np.uint8),
     "misc": dict(shape=MISC_SHAPE, dtype=np.int32),
+    "glyphs_changed": dict(shape=DUNGEON_SHAPE, dtype=np.uint8),
+    "explored_cells": dict(shape=EXPLORED_CELLS_SHAPE, dtype=np.int32),
+    "egocentric_glyphs": dict(shape=EGOCENTRIC_SHAPE, dtype=np.int16),
+    "egocentric_chars": dict(shape=EGOCENTRIC_SHAPE, dtype=np.uint8),
+    "egocentric_colors": dict(shape=EGOCENTRIC_SHAPE, dtype=np.uint8),
+    "level_maps": dict(shape=(LEVEL_MAPS,) + DUNGEON_SHAPE, dtype=np.int16),
+    "level_map_levels": dict(shape=(LEVEL_MAPS, 2), dtype=np.int32),
+    # With all ACTIONS, see observation_desc.
+    "action_mask": dict(shape=(len(ACTIONS),), dtype=np.uint8),
 }
 
 
+def observation_desc(key, egocentric_radius=EGOCENTRIC_RADIUS, actions=ACTIONS):
+    """Returns OBSERVATION_DESC[key], with the shape of the egocentric_*
+    observations for the given radius and of action_mask for the given
+    actions."""
+    if key not in OBSERVATION_DESC:
+        raise ValueError("Unknown observation '%s'" % key)
+    desc = OBSERVATION_DESC[key]
+    if key.startswith("egocentric_"):
+        size = 2 * egocentric_radius + 1
+        desc = dict(desc, shape=(size, size))
+    elif key == "action_mask":
+        desc = dict(desc, shape=(len(actions),))
+    return desc
+
+
 NETHACKOPTIONS = (
     "autopickup",
     "color",
@@ -70,13 +102,20 @@ NETHACKOPTIONS = (
 HACKDIR = pkg_resources.resource_filename("nle", "nethackdir")
 TTYREC_VERSION = 3
 
+# Ttyrecs are compressed according to their file extension, when recorded
+# by Nethack as well as when read by the dataset's converter. Names without
+# one of these extensions are uncompressed. zstd needs NLE_ZSTD_TTYRECS.
+TTYREC_EXTENSIONS = {"none": "", "bz2": ".bz2", "gzip": ".gz", "zstd": ".zst"}
+
+STEP_MANY_STOP_CONDITIONS = frozenset(("message", "hp_drop", "level_change"))
+
 
 def _new_dl_linux(vardir):
     if hasattr(os, "memfd_create"):
         target = os.memfd_create("nle.so")
         path = "/proc/self/fd/%i" % target
         try:
-            shutil.copyfile(DLPATH, path)  # Should use sendfile.
+            _copy_dl(target)
         except IOError:
             os.close(target)
             raise
@@ -85,10 +124,52 @@ def _new_dl_linux(vardir):
     # Otherwise, no memfd_create. Try with O_TMPFILE via the tempfile module.
     dl = tempfile.TemporaryFile(suffix="libnethack.so", dir=vardir)
     path = "/proc/self/fd/%i" % dl.fileno()
-    shutil.copyfile(DLPATH, path)  # Should use sendfile.
+    _copy_dl(dl.fileno())
     return dl, path
 
 
+def _copy_dl(target):
+    """Copies DLPATH into the empty file descriptor target, in the kernel if
+    possible."""
+    with open(DLPATH, "rb") as f:
+        source = f.fileno()
+        size = os.fstat(source).st_size
+        if hasattr(os, "copy_file_range"):
+            try:
+                offset = 0
+                while offset < size:
+                    # Explicit offsets, the file positions stay at zero.
+                    copied = os.copy_file_range(
+                        source, target, size - offset, offset, offset
+                    )
+                    if not copied:
+                        break
+                    offset += copied
+                if offset == size:
+                    return
+            except OSError:
+                pass  # E.g. EXDEV: Copying between file systems.
+        try:
+            offset = 0
+            while offset < size:
+                copied = os.sendfile(target, source, offset, size - offset)
+                if not copied:
+                    break
+                offset += copied
+            if offset == size:
+                return
+        except OSError:
+            pass
+        os.ftruncate(target, 0)
+        os.lseek(target, 0, os.SEEK_SET)
+        f.seek(0)
+        while True:
+            data = f.read(1 << 20)
+            if not data:
+                break
+            os.write(target, data)
+
+
 def _new_dl(vardir):
     """Creates a copied .so file to allow for multiple independent NLE instances"""
     if sys.platform == "linux":
@@ -102,11 +183,117 @@ def _new_dl(vardir):
     return dl, dl.name
 
 
-def _close(pynethack, dl, tempdir, warn=True):
+class _DlPool:
+    """Copies of libnethack.so, handed out to new instances and returned
+    when instances close.
+
+    Each instance needs its own copy of the library file, as dlopen would
+    otherwise return the already loaded library with its global state.
+    For the same reason, copies can't share their text pages: A hardlink or
+    reflink is the same file to dlopen, and pages in the page cache belong
+    to one file. Reusing copies saves making them and keeps memory flat.
+    """
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._dls = []
+
+    def get(self, vardir):
+        with self._lock:
+            if self._dls:
+                return self._dls.pop()
+        return _new_dl(vardir)
+
+    def put(self, dl, path):
+        """Returns a copy, which must not be loaded anymore."""
+        if sys.platform == "linux":  # Elsewhere, copies live in their vardir.
+            with self._lock:
+                if len(self._dls) < self.max_size:
+                    self._dls.append((dl, path))
+                    return
+        dl.close()
+
+    def resize(self, max_size):
+        with self._lock:
+            self.max_size = max_size
+            dls, self._dls = self._dls[max_size:], self._dls[:max_size]
+        for dl, _ in dls:
+            dl.close()
+
+    def clear(self):
+        with self._lock:
+            dls, self._dls = self._dls, []
+        for dl, _ in dls:
+            dl.close()
+
+
+_DL_POOL = _DlPool()
+
+
+def set_dl_pool_size(max_size):
+    """Sets how many copies of libnethack.so closed instances leave for new
+    ones (256 by default), closing the copies above it. With 0, each
+    instance makes its own copy and closes it with the instance."""
+    if max_size < 0:
+        raise ValueError("max_size must be non-negative, got %i" % max_size)
+    _DL_POOL.resize(max_size)
+
+
+def clear_dl_pool():
+    """Closes the copies of libnethack.so that closed instances left for
+    new ones, freeing their memory."""
+    _DL_POOL.clear()
+
+
+def _check_hackdir(hackdir):
+    if not os.path.exists(hackdir) or not os.path.exists(
+        os.path.join(hackdir, "nhdat")
+    ):
+        raise FileNotFoundError("Couldn't find NetHack installation at '%s'." % hackdir)
+
+
+def _new_vardir(hackdir, scoreprefix=""):
+    """Creates a temporary HACKDIR for one NetHack game."""
+    tempdir = tempfile.TemporaryDirectory(prefix="nle")
+    vardir = tempdir.name
+
+    # Symlink a nhdat.
+    os.symlink(os.path.join(hackdir, "nhdat"), os.path.join(vardir, "nhdat"))
+
+    # Touch files, so lock_file() in files.c passes.
+    for fn in ["perm", "record", "logfile"]:
+        os.close(os.open(os.path.join(vardir, fn), os.O_CREAT))
+    if scoreprefix:
+        os.close(os.open(scoreprefix + "xlogfile", os.O_CREAT))
+    else:
+        os.close(os.open(os.path.join(vardir, "xlogfile"), os.O_CREAT))
+
+    os.mkdir(os.path.join(vardir, "save"))
+    return tempdir
+
+
+def _options(options, playername, wizard):
+    if options is None:
+        options = NETHACKOPTIONS
+    result = list(options) + ["name:" + playername]
+    if playername.split("-", 1)[1:] == ["@"]:
+        # Random role. Unless otherwise specified, randomize
+        # race/gender/alignment too.
+        for key in ("race", "gender", "align"):
+            if not any(o for o in options if o.startswith(key + ":")):
+                result.append("%s:random" % key)
+
+    if wizard:
+        result.append("playmode:debug")
+    return result
+
+
+def _close(pynethack, dl, dlpath, tempdir, warn=True):
     if pynethack is not None:
         pynethack.close()
     if dl is not None:
-        dl.close()
+        _DL_POOL.put(dl, dlpath)
     if tempdir is not None:
         tempdir.cleanup()
     if warn:
@@ -146,8 +333,35 @@ def tty_render(chars, colors, cursor=None):
     return result + "\033[0m"
 
 
-# TODO: Not thread-safe for many reasons.
 class Nethack:
+    """A NetHack game, running in its own copy of libnethack.so.
+
+    Instances don't share any state, and `step` and `reset` release the GIL,
+    so several instances can be stepped concurrently from different threads.
+    A single instance must not be used from several threads at once.
+
+    Games are recorded to `ttyrec`, compressed according to its file
+    extension (see `TTYREC_EXTENSIONS`), unless it is None.
+
+    With ``headless=True``, NetHack's terminal isn't drawn at all, which
+    makes steps faster. Headless games have no tty_* observations and
+    can't be recorded.
+
+    The egocentric_* observations are the glyphs, chars and colors within
+    `egocentric_radius` cells of the hero. Cells outside of the map are
+    `egocentric_pad_glyph`, " " and 0.
+
+    The action_mask observation tells which of `actions` may do anything
+    at the current prompt, e.g. only y, n and ESC at "Really quit? [yn]".
+    Keys that are 0 can't do anything.
+
+    On Linux, the copy of libnethack.so lives in memory (a memfd), and
+    `close` leaves it to the next instance instead of deleting it. Each
+    copy takes about 5 MB, and up to 256 of them are kept until the process
+    exits. Use `set_dl_pool_size` to keep fewer, and `clear_dl_pool` to
+    free them.
+    """
+
     _instances = 0
 
     def __init__(
@@ -161,59 +375,49 @@ class Nethack:
         hackdir=HACKDIR,
         spawn_monsters=True,
         scoreprefix="",
+        fast_reset=False,
+        collect_stats=False,
+        headless=False,
+        egocentric_radius=EGOCENTRIC_RADIUS,
+        egocentric_pad_glyph=_pynethack.nethack.GLYPH_CMAP_OFF,
+        actions=ACTIONS,
     ):
         self._copy = copy
 
-        if not os.path.exists(hackdir) or not os.path.exists(
-            os.path.join(hackdir, "nhdat")
-        ):
-            raise FileNotFoundError(
-                "Couldn't find NetHack installation at '%s'." % hackdir
-            )
+        if headless:
+            if ttyrec is not None:
+                raise ValueError("Headless games can't be recorded, set ttyrec=None")
+            for key in observation_keys:
+                if key.startswith("tty_"):
+                    raise ValueError("No '%s' observation in headless games" % key)
+
+        _check_hackdir(hackdir)
 
         # Create a HACKDIR for us.
-        self._tempdir = tempfile.TemporaryDirectory(prefix="nle")
+        self._tempdir = _new_vardir(hackdir, scoreprefix)
         self._vardir = self._tempdir.name
 
-        # Symlink a nhdat.
-        os.symlink(os.path.join(hackdir, "nhdat"), os.path.join(self._vardir, "nhdat"))
-
-        # Touch files, so lock_file() in files.c passes.
-        for fn in ["perm", "record", "logfile"]:
-            os.close(os.open(os.path.join(self._vardir, fn), os.O_CREAT))
-        if scoreprefix:
-            os.close(os.open(scoreprefix + "xlogfile", os.O_CREAT))
-        else:
-            os.close(os.open(os.path.join(self._vardir, "xlogfile"), os.O_CREAT))
-
-        os.mkdir(os.path.join(self._vardir, "save"))
-
         # An assortment of hacks:
         #   Copy our .so into self._vardir to load several copies of the dl.
         #   (Or use a memfd_create hack to create a file that gets deleted on
-        #    process exit.)
-        self._dl, self.dlpath = _new_dl(self._vardir)
+        #    process exit.) Copies from closed instances get reused.
+        self._dl, self.dlpath = _DL_POOL.get(self._vardir)
 
         # Finalize even when the rest of this constructor fails.
-        self._finalizer = weakref.finalize(self, _close, None, self._dl, self._tempdir)
-
-        if options is None:
-            options = NETHACKOPTIONS
-        self.options = list(options) + ["name:" + playername]
-        if playername.split("-", 1)[1:] == ["@"]:
-            # Random role. Unless otherwise specified, randomize
-            # race/gender/alignment too.
-            for key in ("race", "gender", "align"):
-                if not any(o for o in options if o.startswith(key + ":")):
-                    self.options.append("%s:random" % key)
-
-        if wizard:
-            self.options.append("playmode:debug")
+        self._finalizer = weakref.finalize(
+            self, _close, None, self._dl, self.dlpath, self._tempdir
+        )
+
+        self.options = _options(options, playername, wizard)
         self._wizard = wizard
         self._nethackoptions = ",".join(self.options)
         if ttyrec is None:
             self._pynethack = _pynethack.Nethack(
-                self.dlpath, self._vardir, self._nethackoptions, spawn_monsters
+                self.dlpath,
+                self._vardir,
+                self._nethackoptions,
+                spawn_monsters,
+                fast_reset,
             )
         else:
             self._pynethack = _pynethack.Nethack(
@@ -223,33 +427,209 @@ class Nethack:
                 self._nethackoptions,
                 spawn_monsters,
                 scoreprefix,
+                fast_reset,
             )
         self._ttyrec = ttyrec
+        if collect_stats:
+            self._pynethack.enable_stats()
+        self._headless = headless
+        if headless:
+            self._pynethack.enable_headless()
 
         self._finalizer.detach()
         self._finalizer = weakref.finalize(
-            self, _close, self._pynethack, self._dl, self._tempdir
+            self, _close, self._pynethack, self._dl, self.dlpath, self._tempdir
         )
 
         self._obs_buffers = {}
 
         for key in observation_keys:
-            if key not in OBSERVATION_DESC:
-                raise ValueError("Unknown observation '%s'" % key)
-            self._obs_buffers[key] = np.zeros(**OBSERVATION_DESC[key])
+            self._obs_buffers[key] = np.zeros(
+                **observation_desc(key, egocentric_radius, actions)
+            )
 
-        self._pynethack.set_buffers(**self._obs_buffers)
+        # Passed along with the buffers.
+        self._buffer_args = dict(
+            egocentric_radius=egocentric_radius,
+            egocentric_pad_glyph=egocentric_pad_glyph,
+            actions=[int(a) for a in actions],
+        )
+        self._pynethack.set_buffers(**self._obs_buffers, **self._buffer_args)
 
+        self._observation_keys = tuple(observation_keys)
         self._obs = tuple(self._obs_buffers[key] for key in observation_keys)
         if self._copy:
             self._step_return = lambda: tuple(o.copy() for o in self._obs)
         else:
             self._step_return = lambda: self._obs
 
-    def step(self, action):
-        self._pynethack.step(action)
+    def step(self, action, skip_prompts=False):
+        """Steps the game.
+
+        Arguments:
+            action [int]: The key to send to NetHack.
+            skip_prompts [bool]: Answer prompts after this step as set by
+                `set_skip_policy`.
+        """
+        self._pynethack.step(action, skip_prompts)
         return self._step_return(), self._pynethack.done()
 
+    def step_many(self, actions, stop_on=(), skip_prompts=False):
+        """Steps the game with several keys at once, e.g. for macro actions.
+
+        Only the observations needed to check `stop_on` are updated between
+        actions; the full observation is filled once at the end. Each action
+        is still recorded in the ttyrec. If the game ends early, fields like
+        glyphs or the inventory keep their values from before the call.
+
+        Arguments:
+            actions [list of int]: The keys to send to NetHack.
+            stop_on [collection of str]: Stop after an action that causes
+                any of these: "message" (a non-empty message line),
+                "hp_drop" (lower HP), "level_change" (a different dungeon
+                level). The latter two require the blstats observation. The
+                game always stops when it is done.
+            skip_prompts [bool]: Answer prompts after each action as set by
+                `set_skip_policy`.
+
+        Returns:
+            A tuple (observation, done, count), `count` being the number of
+            actions taken.
+        """
+        stop_on = set(stop_on)
+        unknown = stop_on - STEP_MANY_STOP_CONDITIONS
+        if unknown:
+            raise ValueError("Unknown stop conditions: %s" % sorted(unknown))
+        count = self._pynethack.step_many(
+            list(actions),
+            skip_prompts,
+            stop_on_message="message" in stop_on,
+            stop_on_hp_drop="hp_drop" in stop_on,
+            stop_on_level_change="level_change" in stop_on,
+        )
+        return self._step_return(), self._pynethack.done(), count
+
+    def set_buffers(self, **buffers):
+        """Makes the game write observations into the given arrays instead
+        of its own, e.g. into shared memory. Only possible before `reset`.
+
+        Arrays must be C-contiguous, with the shape and dtype given in
+        OBSERVATION_DESC. Observations not given keep their arrays.
+        """
+        for key in buffers:
+            if key not in self._obs_buffers:
+                raise ValueError("Observation '%s' not requested" % key)
+        self._pynethack.set_buffers(
+            **dict(self._obs_buffers, **buffers), **self._buffer_args
+        )
+        self._obs_buffers.update(buffers)
+        self._obs = tuple(self._obs_buffers[key] for key in self._observation_keys)
+
+    def get_stats(self):
+        """Returns counts and total times of the phases of running the game.
+
+        Only collected if constructed with ``collect_stats=True``. For each
+        phase, there are ``<phase>_calls`` and ``<phase>_ns`` entries:
+            start: Starting games in `reset`.
+            step: NetHack's steps, several per `step` if prompts are skipped.
+            fill_obs: Filling the observation arrays.
+            tty: Terminal emulation for the tty_* observations.
+            ttyrec: Writing ttyrecs.
+            call: Calls to `step`, `step_many` and `reset`.
+        Phases include the time of phases within them. ``game_ns`` is the
+        time of start and step not in fill_obs, tty or ttyrec, i.e., mostly
+        NetHack's own logic.
+        """
+        stats = {}
+        for phase, (calls, ns) in self._pynethack.get_stats().items():
+            stats[phase + "_calls"] = calls
+            stats[phase + "_ns"] = ns
+        stats["game_ns"] = (
+            stats["start_ns"]
+            + stats["step_ns"]
+            - stats["fill_obs_ns"]
+            - stats["tty_ns"]
+            - stats["ttyrec_ns"]
+        )
+        return stats
+
+    def reset_stats(self):
+        """Sets the counts and times of `get_stats` to zero."""
+        self._pynethack.reset_stats()
+
+    def describe(self, x, y):
+        """Returns the screen description of a map cell, e.g. "tame kitten".
+
+        This is what the screen_descriptions observation holds for the cell,
+        looked up on demand. Use it if only a few descriptions are needed.
+
+        Arguments:
+            x [int]: The column, as in the glyphs observation.
+            y [int]: The row, as in the glyphs observation.
+        """
+        return self._pynethack.describe(x, y).decode("utf-8")
+
+    def describe_cells(self, mask):
+        """Returns screen descriptions for the map cells where mask is True.
+
+        Arguments:
+            mask [np.ndarray]: A boolean array with the glyphs' shape.
+
+        Returns:
+            An array like the screen_descriptions observation, zero outside
+            of the mask.
+        """
+        return self._pynethack.describe_cells(np.asarray(mask, dtype=bool))
+
+    def level_map(self, dnum, dlevel):
+        """Returns the glyphs of a level as of when it was last shown.
+
+        The level_maps observation holds the same for the first LEVEL_MAPS
+        levels shown, with their dnum and dlevel in level_map_levels.
+
+        Arguments:
+            dnum [int]: The dungeon number, as in blstats[NLE_BL_DNUM].
+            dlevel [int]: The level, as in blstats[NLE_BL_DLEVEL].
+
+        Returns:
+            An array like the glyphs observation, or None if the level
+            wasn't shown in this game.
+        """
+        return self._pynethack.level_map(dnum, dlevel)
+
+    def set_skip_policy(
+        self,
+        every_step=False,
+        on_game_over=False,
+        decline_yn=True,
+        yn_exceptions=(),
+        reset_to_moveloop=False,
+    ):
+        """Sets which prompts `step(action, skip_prompts=True)` answers.
+
+        Prompts are answered within the C++ step loop, so that one call to
+        `step` corresponds to one decision of the agent: --More-- is answered
+        with space, text input and y/n questions are cancelled with ESC.
+
+        Arguments:
+            every_step [bool]: Skip prompts after every step.
+            on_game_over [bool]: Skip prompts after steps that end the
+                game (e.g. the death messages), even if `every_step` is False.
+            decline_yn [bool]: Cancel y/n questions. If False, they are
+                left for the caller to answer.
+            yn_exceptions [list of bytes]: y/n questions whose message
+                contains any of these aren't cancelled.
+            reset_to_moveloop [bool]: Make `reset` step past the initial
+                phase of the game, until NetHack's move loop.
+        """
+        self._pynethack.set_skip_policy(
+            every_step,
+            on_game_over,
+            decline_yn,
+            list(yn_exceptions),
+            reset_to_moveloop,
+        )
+
     def reset(self, new_ttyrec=None, wizkit_items=None):
         if wizkit_items is not None:
             if not self._wizard:
@@ -258,6 +638,8 @@ class Nethack:
             self._pynethack.set_wizkit("\n".join(wizkit_items))
         if new_ttyrec is None:
             self._pynethack.reset()
+        elif self._headless:
+            raise ValueError("Headless games can't be recorded")
         else:
             self._pynethack.reset(new_ttyrec)
             self._ttyrec = new_ttyrec
@@ -265,9 +647,39 @@ class Nethack:
         # get one episode.
         return self._step_return()
 
+    def clone_state(self):
+        """Returns a snapshot of the current game.
+
+        The snapshot includes the game's memory, its level files and the
+        current observation. It can be restored with `restore_state` any
+        number of times until the next `reset`, which makes tree search
+        possible without replaying actions. Only supported on Linux.
+
+        Games that are recorded can't be cloned, as the ttyrec can't go back
+        with the game. Create them with ttyrec=None.
+        """
+        self._check_not_recorded()
+        return self._pynethack.clone_state()
+
+    def restore_state(self, state):
+        """Restores a snapshot from `clone_state` of the current episode.
+
+        Like `clone_state`, this isn't supported while recording a ttyrec.
+
+        Returns:
+            The observation at the time of the snapshot, like `reset`.
+        """
+        self._check_not_recorded()
+        self._pynethack.restore_state(state)
+        return self._step_return()
+
+    def _check_not_recorded(self):
+        if self._ttyrec is not None:
+            raise ValueError("Recorded games can't be restored, set ttyrec=None")
+
     def close(self):
         if self._finalizer.detach():
-            _close(self._pynethack, self._dl, self._tempdir, warn=False)
+            _close(self._pynethack, self._dl, self.dlpath, self._tempdir, warn=False)
         self._pynethack = None
         self._dl = None
         self._tempdir = None
@@ -315,3 +727,137 @@ class Nethack:
 
     def how_done(self):
         return self._pynethack.how_done()
+
+
+def _close_batch(pynethack, dls, tempdirs, warn=True):
+    if pynethack is not None:
+        pynethack.close()
+    for dl, dlpath in dls:
+        _DL_POOL.put(dl, dlpath)
+    for tempdir in tempdirs:
+        tempdir.cleanup()
+    if warn:
+        warnings.warn("nethack.BatchNethack instance not closed", ResourceWarning)
+
+
+class BatchNethack:
+    """Several NetHack games, stepped together with one call.
+
+    Observations are stacked numpy arrays with a leading dimension of
+    `num_games`, which get overwritten by each call to `step` and `reset`.
+    Finished games are reset automatically during `step`, and by default all
+    games are stepped past their initial phase (until NetHack's move loop)
+    on reset. Unlike `Nethack`, no ttyrecs are recorded.
+    """
+
+    def __init__(
+        self,
+        num_games,
+        observation_keys=OBSERVATION_DESC.keys(),
+        playername="Agent-mon-hum-neu-mal",
+        options=None,
+        wizard=False,
+        hackdir=HACKDIR,
+        spawn_monsters=True,
+        fast_reset=False,
+        egocentric_radius=EGOCENTRIC_RADIUS,
+        egocentric_pad_glyph=_pynethack.nethack.GLYPH_CMAP_OFF,
+        actions=ACTIONS,
+    ):
+        _check_hackdir(hackdir)
+
+        self._tempdirs = []
+        self._dls = []
+        # Finalize even when the rest of this constructor fails.
+        self._finalizer = weakref.finalize(
+            self, _close_batch, None, self._dls, self._tempdirs
+        )
+
+        # Each game needs its own HACKDIR and copy of the .so, see Nethack.
+        for _ in range(num_games):
+            self._tempdirs.append(_new_vardir(hackdir))
+            self._dls.append(_DL_POOL.get(self._tempdirs[-1].name))
+
+        self.options = _options(options, playername, wizard)
+        self._pynethack = _pynethack.BatchNethack(
+            [dlpath for _, dlpath in self._dls],
+            [t.name for t in self._tempdirs],
+            ",".join(self.options),
+            spawn_monsters,
+            fast_reset,
+        )
+
+        self._finalizer.detach()
+        self._finalizer = weakref.finalize(
+            self, _close_batch, self._pynethack, self._dls, self._tempdirs
+        )
+
+        self._obs_buffers = {}
+        for key in observation_keys:
+            desc = observation_desc(key, egocentric_radius, actions)
+            self._obs_buffers[key] = np.zeros(
+                (num_games,) + desc["shape"], dtype=desc["dtype"]
+            )
+
+        self._pynethack.set_buffers(
+            **self._obs_buffers,
+            egocentric_radius=egocentric_radius,
+            egocentric_pad_glyph=egocentric_pad_glyph,
+            actions=[int(a) for a in actions],
+        )
+        self._obs = tuple(self._obs_buffers[key] for key in observation_keys)
+
+    def __len__(self):
+        return len(self._pynethack)
+
+    def step(self, actions):
+        """Steps all games.
+
+        Args:
+            actions: An integer array with one action per game.
+
+        Returns:
+            A tuple (observation, done, reward). `done` and `reward` are
+            arrays with one entry per game, the reward being the difference
+            in score. Finished games are reset, so their observation is the
+            first one of the next episode.
+        """
+        done, reward = self._pynethack.step(actions)
+        return self._obs, done, reward
+
+    def set_skip_policy(
+        self,
+        every_step=False,
+        on_game_over=False,
+        decline_yn=True,
+        yn_exceptions=(),
+        reset_to_moveloop=True,
+    ):
+        """Sets which prompts `step` answers, see `Nethack.set_skip_policy`.
+
+        Unlike there, reset_to_moveloop defaults to True: Games are reset
+        automatically during `step`, and the caller can't step them past
+        their initial phase.
+        """
+        self._pynethack.set_skip_policy(
+            every_step,
+            on_game_over,
+            decline_yn,
+            list(yn_exceptions),
+            reset_to_moveloop,
+        )
+
+    def reset(self, index=None):
+        """Resets all games, or only the game at `index`."""
+        if index is None:
+            self._pynethack.reset()
+        else:
+            self._pynethack.reset(index)
+        return self._obs
+
+    def close(self):
+        if self._finalizer.detach():
+            _close_batch(self._pynethack, self._dls, self._tempdirs, warn=False)
+        self._pynethack = None
+        self._dls = []
+        self._tempdirs = []
@@ -1,11 +1,14 @@
 import bz2
+import gzip
 import os
+import random
 import re
 
 import numpy as np
 import pytest
 from memory_profiler import memory_usage
 
+from nle import nethack
 from nle.dataset import Converter
 
 # From
@@ -422,3 +425,104 @@ class TestConverter:
             lines = f.readlines()
             assert " ".join("%i" % a for a in actions) == lines[0].rstrip()
             assert " ".join("%i" % s for s in scores) == lines[1].rstrip()
+
+    def test_codecs(self, tmpdir, seq_length=500):
+        if not nethack.NLE_ALLOW_SEEDING:
+            pytest.skip("Seeding not enabled")
+
+        codecs = ["none", "bz2", "gzip"]
+        if nethack.NLE_ZSTD_TTYRECS:
+            codecs.append("zstd")
+        else:
+            with pytest.raises(ValueError, match="zstd"):
+                Converter(ROWS, COLUMNS, TTYREC_V3).load_ttyrec("nle.ttyrec3.zst")
+            with pytest.raises(ValueError, match="zstd"):
+                nethack.Nethack(ttyrec=str(tmpdir / "nle.ttyrec3.zst"))
+
+        results = []
+        for codec in codecs:
+            ttyrec = str(tmpdir / ("nle.ttyrec3" + nethack.TTYREC_EXTENSIONS[codec]))
+            game = nethack.Nethack(ttyrec=ttyrec)
+            game.set_initial_seeds(core=42, disp=666)
+            game.reset()
+            rng = random.Random(0)
+            for _ in range(seq_length - 100):
+                _, done = game.step(rng.choice(list(nethack.CompassDirection)))
+                if done:
+                    break
+            game.close()
+
+            chars = np.zeros((seq_length, ROWS, COLUMNS), dtype=np.uint8)
+            colors = np.zeros((seq_length, ROWS, COLUMNS), dtype=np.int8)
+            cursors = np.zeros((seq_length, 2), dtype=np.int16)
+            timestamps = np.zeros((seq_length,), dtype=np.int64)
+            actions = np.zeros((seq_length), dtype=np.uint8)
+            scores = np.zeros((seq_length), dtype=np.int32)
+            converter = Converter(ROWS, COLUMNS, TTYREC_V3)
+            converter.load_ttyrec(ttyrec)
+            remaining = converter.convert(
+                chars, colors, cursors, timestamps, actions, scores
+            )
+            results.append((remaining, chars, colors, cursors, actions, scores))
+
+        assert 100 <= results[0][0] < seq_length
+        for result in results[1:]:
+            np.testing.assert_equal(result, results[0])
+
+    @pytest.mark.parametrize("codec", ["bz2", "bz2-blocks", "none", "gzip"])
+    def test_checkpoints(self, tmpdir, codec, interval=100, seq_length=50):
+        with open(getfilename(TTYREC_2020), "rb") as f:
+            ttyrec = f.read()
+        if codec != "bz2":
+            ttyrec = bz2.decompress(ttyrec)
+            if codec == "bz2-blocks":  # Many blocks of up to 100 kB.
+                ttyrec = bz2.compress(ttyrec, compresslevel=1)
+            elif codec == "gzip":
+                ttyrec = gzip.compress(ttyrec)
+        filename = str(
+            tmpdir / ("ttyrec" + nethack.TTYREC_EXTENSIONS[codec.split("-")[0]])
+        )
+        with open(filename, "wb") as f:
+            f.write(ttyrec)
+
+        def convert(converter, n):
+            arrays = [
+                np.zeros((n, ROWS, COLUMNS), dtype=np.uint8),
+                np.zeros((n, ROWS, COLUMNS), dtype=np.int8),
+                np.zeros((n, 2), dtype=np.int16),
+                np.zeros((n,), dtype=np.int64),
+                np.zeros((n), dtype=np.uint8),
+                np.zeros((n), dtype=np.int32),
+            ]
+            remaining = converter.convert(*arrays)
+            return [a[: n - remaining] for a in arrays]
+
+        converter = Converter(ROWS, COLUMNS, TTYREC_V1)
+        converter.load_ttyrec(getfilename(TTYREC_2020))
+        expected = convert(converter, 3000)
+        length = len(expected[0])
+
+        converter = Converter(ROWS, COLUMNS, TTYREC_V1)
+        converter.load_ttyrec(filename, seekable=True)
+        checkpoints = [converter.checkpoint()]
+        while converter.skip(interval) == interval:
+            checkpoints.append(converter.checkpoint())
+        assert converter.frame == length
+
+        rng = np.random.RandomState(0)
+        for start in [0, 1, length - 1, length] + list(rng.randint(length, size=10)):
+            converter = Converter(ROWS, COLUMNS, TTYREC_V1)
+            converter.load_ttyrec(filename, checkpoint=checkpoints[start // interval])
+            assert converter.frame == start - start % interval
+            assert converter.skip(start % interval) == start % interval
+            for actual, array in zip(convert(converter, seq_length), expected):
+                np.testing.assert_array_equal(actual, array[start : start + seq_length])
+
+        with pytest.raises(RuntimeError, match="failed to load"):
+            Converter(ROWS + 1, COLUMNS, TTYREC_V1).load_ttyrec(
+                filename, checkpoint=checkpoints[1]
+            )
+        if codec == "bz2":
+            converter.load_ttyrec(filename)
+            with pytest.raises(RuntimeError, match="not loaded seekable"):
+                converter.checkpoint()
@@ -1,6 +1,8 @@
 import bz2
 import concurrent.futures as futures
 import contextlib
+import shutil
+import time
 
 import numpy as np
 import pytest
@@ -14,6 +16,7 @@ from test_db import mockdata  # noqa: F401
 
 from nle.dataset import dataset
 from nle.dataset import db
+from nle.dataset import populate_db
 
 
 class TestDataset:
@@ -263,6 +266,116 @@ class TestDataset:
             np.testing.assert_array_equal(a1, a5)
         np.testing.assert_array_equal(g1, g5)
 
+    @pytest.mark.parametrize("batch_size,num_workers", [(3, 1), (3, 2), (7, 3)])
+    def test_num_workers(self, db_exists, batch_size, num_workers):
+        def get_data(**kwargs):
+            data = dataset.TtyrecDataset(
+                "basictest",
+                seq_length=100,
+                batch_size=batch_size,
+                gameids=range(1, 8),
+                shuffle=False,
+                **kwargs,
+            )
+            return [{k: t.copy() for k, t in mb.items()} for mb in data]
+
+        def get_games(mbs):
+            # Each game is in one entry, so these are its frames in order.
+            arrays = {k: np.concatenate([mb[k] for mb in mbs], axis=1) for k in mbs[0]}
+            gameids = arrays["gameids"]
+            return {
+                g: {k: a[gameids == g] for k, a in arrays.items()}
+                for g in np.unique(gameids[gameids != 0])
+            }
+
+        mbs1 = get_data()
+        mbs2 = get_data(num_workers=num_workers)
+        assert len(mbs1) == len(mbs2)
+        for mb1, mb2 in zip(mbs1, mbs2):
+            assert mb1.keys() == mb2.keys()
+            for k in mb1:
+                if num_workers == 1 or batch_size == 7:
+                    np.testing.assert_array_equal(mb1[k], mb2[k])
+                else:
+                    # Which entry gets a later game depends on the workers.
+                    assert mb1[k].shape == mb2[k].shape
+
+        games1 = get_games(mbs1)
+        games2 = get_games(mbs2)
+        assert list(games2) == list(range(1, 8))
+        for g in games1:
+            for k in games1[g]:
+                np.testing.assert_array_equal(games1[g][k], games2[g][k])
+
+    @pytest.mark.parametrize("num_workers", [0, 1])
+    @pytest.mark.parametrize("prefetch", [1, 3])
+    def test_prefetch(self, db_exists, num_workers, prefetch):
+        def make_data(**kwargs):
+            return dataset.TtyrecDataset(
+                "basictest",
+                seq_length=20,
+                batch_size=3,
+                gameids=range(1, 8),
+                shuffle=False,
+                **kwargs,
+            )
+
+        expected = [{k: t.copy() for k, t in mb.items()} for mb in make_data()]
+        data = make_data(num_workers=num_workers, prefetch=prefetch)
+        assert sum(1 for _ in data) == len(expected)
+
+        held = []
+        for i, mb in enumerate(data):
+            # Conversions running ahead don't touch the minibatch in use.
+            time.sleep(0.01)
+            for k in mb:
+                np.testing.assert_array_equal(mb[k], expected[i][k])
+            held.append(mb["tty_chars"].ctypes.data)
+        # Arrays are released with the next minibatch and then reused.
+        assert len(set(held[: prefetch + 2])) == prefetch + 1
+
+        # Stopping early is fine too.
+        it = iter(data)
+        next(it)
+        it.close()
+
+    @pytest.mark.parametrize("dataset_name", ["basictest", "nletest"])
+    def test_get_ttyrec_window(self, db_exists, tmpdir, dataset_name):
+        # Index a copy, leaving the shared db as it is.
+        dbfilename = str(tmpdir.join("ttyrecs.db"))
+        shutil.copyfile(db.DB, dbfilename)
+        data = dataset.TtyrecDataset(dataset_name, dbfilename=dbfilename)
+
+        gameid = max(data._gameids, key=lambda g: len(data.get_paths(g)))
+        chunks = data.get_ttyrec(gameid, chunk_size=10000)
+        expected = {k: np.concatenate([c[k][0] for c in chunks]) for k in chunks[0]}
+        length = np.count_nonzero(expected["gameids"])
+        starts = [0, 1, 5, 8, length - 1, length, length + 1]
+        starts += list(np.random.RandomState(0).randint(length, size=10))
+
+        def check(seq_length):
+            for start in starts:
+                window = data.get_ttyrec_window(gameid, start, seq_length)
+                assert list(window.keys()) == list(expected.keys())
+                for k, array in window.items():
+                    np.testing.assert_array_equal(
+                        array[0], expected[k][start : start + seq_length]
+                    )
+
+        check(20)
+        populate_db.index_ttyrecs(dataset_name, interval=7, filename=dbfilename)
+        with db.db(filename=dbfilename) as c:
+            frame, _ = db.get_checkpoint(gameid, 0, 8, c)
+            assert frame == 7
+            lengths = [
+                db.count_frames(gameid, part, c)
+                for part in range(len(data.get_paths(gameid)))
+            ]
+        assert sum(lengths) == length
+        if len(lengths) > 1:
+            starts.extend([lengths[0] - 1, lengths[0], lengths[0] + 7])
+        check(20)
+
     def test_sql(self, db_exists, pool):
 
         sql = """
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from nle.dataset import delta
+
+
+def make_frames(num_frames, rows=4, cols=6, seed=0):
+    rng = np.random.default_rng(seed)
+    chars = np.zeros((num_frames, rows, cols), dtype=np.uint8)
+    colors = np.zeros((num_frames, rows, cols), dtype=np.int8)
+    for t in range(1, num_frames):
+        chars[t] = chars[t - 1]
+        colors[t] = colors[t - 1]
+        chars[t].flat[rng.integers(0, rows * cols, 3)] = rng.integers(0, 256, 3)
+        colors[t].flat[rng.integers(0, rows * cols, 2)] = rng.integers(-8, 8, 2)
+    return dict(chars=chars, colors=colors)
+
+
+class TestDelta:
+    def test_encode(self):
+        frames = dict(
+            chars=np.full((3, 2, 3), 32, dtype=np.uint8),
+            colors=np.zeros((3, 2, 3), dtype=np.int8),
+        )
+        frames["chars"][1, 0, 1:] = [1, 2]
+        frames["chars"][2] = frames["chars"][1]
+        frames["colors"][2, 1, 0] = 3
+        keyframes = np.zeros(3, dtype=bool)
+        run_counts, value_counts, starts, lengths, values = delta.encode(
+            frames, keyframes
+        )
+        np.testing.assert_array_equal(run_counts, [1, 1, 1])
+        np.testing.assert_array_equal(value_counts, [6, 2, 1])
+        np.testing.assert_array_equal(starts, [0, 1, 3])
+        np.testing.assert_array_equal(lengths, [6, 2, 1])
+        np.testing.assert_array_equal(values["chars"], [32] * 6 + [1, 2, 32])
+        np.testing.assert_array_equal(values["colors"][-1], 3)
+
+    @pytest.mark.parametrize("split", [0, 1, 20, 50])
+    def test_decode(self, split):
+        frames = make_frames(50)
+        keyframes = np.arange(50) % 16 == 0
+        parts = [
+            delta.encode({k: a[:split] for k, a in frames.items()}, keyframes[:split]),
+            delta.encode(
+                {k: a[split:] for k, a in frames.items()},
+                keyframes[split:],
+                {k: a[split - 1] for k, a in frames.items()} if split else None,
+            ),
+        ]
+        decoder = delta.DeltaFrames(
+            (4, 6),
+            *(np.concatenate(arrays) for arrays in list(zip(*parts))[:4]),
+            {k: np.concatenate([p[4][k] for p in parts]) for k in frames},
+        )
+        assert len(decoder) == 50
+
+        for start, stop in [(0, 50), (16, 40), (32, 33), (48, 48)]:
+            decoded = decoder.decode(start, stop)
+            for k, a in frames.items():
+                np.testing.assert_array_equal(decoded[k], a[start:stop])
+
+        previous = {k: a[22] for k, a in frames.items()}
+        decoded = decoder.decode(23, 45, previous)
+        for k, a in frames.items():
+            np.testing.assert_array_equal(decoded[k], a[23:45])
+
+        with pytest.raises(ValueError, match="keyframe"):
+            decoder.decode(23, 45)
@@ -14,6 +14,7 @@ import pytest
 import nle
 import nle.env
 from nle import nethack
+from nle.env import tasks
 
 
 def get_nethack_env_ids():
@@ -377,9 +378,16 @@ class TestGymDynamics:
         assert done
         assert reward == 0.0
 
-    def test_ttyrec_every(self):
+    @pytest.mark.parametrize("codec", ["bz2", "gzip", "none"])
+    def test_ttyrec_every(self, codec):
         path = pathlib.Path(".")
-        env = gym.make("NetHackChallenge-v0", save_ttyrec_every=2, savedir=str(path))
+        env = gym.make(
+            "NetHackChallenge-v0",
+            save_ttyrec_every=2,
+            savedir=str(path),
+            ttyrec_codec=codec,
+        )
+        extension = nethack.TTYREC_EXTENSIONS[codec]
         pid = os.getpid()
         for episode in range(10):
             env.reset()
@@ -393,7 +401,8 @@ class TestGymDynamics:
             # `contents` includes xlogfile and ttyrecs.
             assert len(contents) - 1 == episode // 2 + 1
             assert (
-                "nle.%i.%i.ttyrec%i.bz2" % (pid, episode, nethack.TTYREC_VERSION)
+                "nle.%i.%i.ttyrec%i%s"
+                % (pid, episode, nethack.TTYREC_VERSION, extension)
                 in contents
             )
             assert "nle.%i.xlogfile" % pid in contents
@@ -423,6 +432,124 @@ class TestEnvMisc:
         with pytest.raises(RuntimeError, match="step called without reset()"):
             env.step(0)
 
+    def test_one_nethack_step_per_step(self, env):
+        calls = 0
+        step = env.nethack.step
+
+        def counting_step(*args, **kwargs):
+            nonlocal calls
+            calls += 1
+            return step(*args, **kwargs)
+
+        env.nethack.step = counting_step
+        env.reset()
+        assert calls == 0
+
+        for steps in range(1, 101):
+            _, _, done, _ = env.step(env.action_space.sample())
+            if done:
+                break
+            assert calls == steps
+
+    def test_last_observation(self, env):
+        last_observations = []
+        reward_fn = env._reward_fn
+
+        def recording_reward_fn(last_observation, *args):
+            last_observations.append(last_observation)
+            return reward_fn(last_observation, *args)
+
+        env._reward_fn = recording_reward_fn
+        blstats = env.reset()["blstats"].copy()
+        for _ in range(10):
+            obs, _, done, _ = env.step(env.action_space.sample())
+            last_observation = last_observations[-1]
+            np.testing.assert_array_equal(last_observation[env._blstats_index], blstats)
+            assert last_observation[env._glyph_index] is None
+            if done:
+                break
+            blstats = obs["blstats"].copy()
+
+    def test_last_observation_shapes(self):
+        class Task(tasks.NetHackScore):
+            _last_observation_keys = ("blstats", "egocentric_glyphs", "action_mask")
+
+        env = Task(
+            observation_keys=("egocentric_glyphs", "action_mask", "blstats"),
+            egocentric_radius=2,
+        )
+        try:
+            obs = {k: v.copy() for k, v in env.reset().items()}
+            for _ in range(5):
+                last_obs = obs
+                obs, _, done, _ = env.step(env.action_space.sample())
+                for key in ("egocentric_glyphs", "action_mask"):
+                    i = env._observation_keys.index(key)
+                    np.testing.assert_array_equal(
+                        env._last_observation[i], last_obs[key]
+                    )
+                if done:
+                    break
+                obs = {k: v.copy() for k, v in obs.items()}
+        finally:
+            env.close()
+
+    def test_stats(self, env):
+        env.reset()
+        _, _, _, info = env.step(0)
+        assert "stats" not in info
+
+        stats_env = gym.make("NetHackScore-v0", collect_stats=True)
+        try:
+            stats_env.reset()
+            for _ in range(10):
+                _, _, done, info = stats_env.step(stats_env.action_space.sample())
+                if done:
+                    break
+            stats = info["stats"]
+            assert stats["env_step_calls"] == stats["call_calls"] - 1  # reset.
+            assert stats["env_step_ns"] > 0
+            assert stats["step_calls"] >= stats["env_step_calls"]
+            assert stats["tty_calls"] > 0  # tty_chars are requested.
+
+            stats_env.reset_stats()
+            _, _, _, info = stats_env.step(0)
+            assert info["stats"]["env_step_calls"] == 1
+        finally:
+            stats_env.close()
+
+    def test_action_mask(self):
+        env = gym.make("NetHackScore-v0", observation_keys=("action_mask", "blstats"))
+        try:
+            assert env.observation_space["action_mask"].shape == (len(env.actions),)
+            obs = env.reset()
+            assert obs["action_mask"].shape == (len(env.actions),)
+            # In the move loop, only MORE doesn't do anything.
+            invalid = [a for a, m in zip(env.actions, obs["action_mask"]) if not m]
+            assert invalid == [nethack.MiscAction.MORE]
+        finally:
+            env.close()
+
+
+class TestNetHackScout:
+    def test_reward(self):
+        env = gym.make("NetHackScout-v0", penalty_step=0.0)
+        try:
+            explored = {}
+            obs = env.reset()
+            for _ in range(200):
+                obs, reward, done, _ = env.step(env.action_space.sample())
+                if done:
+                    break
+                # What NetHack counts, computed from the whole map.
+                blstats = obs["blstats"]
+                key = (blstats[nethack.NLE_BL_DNUM], blstats[nethack.NLE_BL_DLEVEL])
+                count = np.sum(obs["glyphs"] != nethack.GLYPH_CMAP_OFF)
+                assert reward == count - explored.get(key, 0)
+                explored[key] = count
+        finally:
+            env.close()
+
 
 class TestNetHackChallenge:
     def test_no_seed_setting(self):
@@ -437,3 +564,94 @@ class TestNetHackChallenge:
         if not nethack.NLE_ALLOW_SEEDING:
             with pytest.raises(RuntimeError, match="Seeding not enabled"):
                 env.nethack._pynethack.set_initial_seeds(0, 0, True)
+
+
+class TestVectorEnv:
+    @pytest.fixture
+    def env(self):
+        e = nle.env.NLEVectorEnv(2, max_episode_steps=5)
+        try:
+            yield e
+        finally:
+            e.close()
+
+    def test_rollout(self, env):
+        obs = env.reset()
+        assert obs["glyphs"].shape == (2,) + nle.env.DUNGEON_SHAPE
+        assert env.observation_space["glyphs"].shape == obs["glyphs"].shape
+
+        for _ in range(5):
+            obs, rewards, dones, infos = env.step(env.action_space.sample())
+            assert rewards.shape == dones.shape == (2,)
+            assert len(infos) == 2
+        # The time limit applies to both games.
+        assert dones.all()
+        assert all(
+            info["end_status"] == nle.env.NLE.StepStatus.ABORTED for info in infos
+        )
+        assert np.all(obs["blstats"][:, nethack.NLE_BL_TIME] == 1)
+
+
+class TestSharedMemoryVectorEnv:
+    @pytest.fixture
+    def env(self):
+        e = nle.env.SharedMemoryVectorEnv(
+            3, num_workers=2, context="fork", max_episode_steps=5
+        )
+        try:
+            yield e
+        finally:
+            e.close()
+
+    def test_rollout(self, env):
+        obs = env.reset()
+        assert obs["glyphs"].shape == (3,) + nle.env.DUNGEON_SHAPE
+        assert env.observation_space["glyphs"].shape == obs["glyphs"].shape
+        assert np.all(obs["blstats"][:, nethack.NLE_BL_TIME] == 1)
+
+        for _ in range(5):
+            env.step_async(env.action_space.sample())
+            obs, rewards, dones, infos = env.step_wait()
+            assert rewards.shape == dones.shape == (3,)
+            assert len(infos) == 3
+        assert dones.all()
+        assert all(
+            info["end_status"] == nle.env.NLE.StepStatus.ABORTED for info in infos
+        )
+        assert np.all(obs["blstats"][:, nethack.NLE_BL_TIME] == 1)
+
+    @pytest.mark.skipif(not nethack.NLE_ALLOW_SEEDING, reason="Seeding not enabled")
+    def test_same_as_nle(self, env):
+        seeds = [(i + 1, 2 * i + 1, False) for i in range(3)]
+        envs = [nle.env.NLE(max_episode_steps=5) for _ in range(3)]
+        try:
+            for e, s in zip(envs, seeds):
+                e.seed(*s)
+            env.seed(seeds)
+            obs = env.reset()
+            expected = [e.reset() for e in envs]
+
+            # Seeds only apply to the first episode, which ends after 5 steps.
+            actions = np.random.RandomState(0).randint(
+                env.single_action_space.n, size=(5, 3)
+            )
+            for step_actions in actions:
+                for i in range(len(envs)):
+                    for key in ("glyphs", "blstats", "tty_chars"):
+                        np.testing.assert_array_equal(obs[key][i], expected[i][key])
+                obs, rewards, dones, _ = env.step(step_actions)
+                expected = []
+                for i, e in enumerate(envs):
+                    o, reward, done, _ = e.step(step_actions[i])
+                    if done:
+                        o = e.reset()
+                    assert (rewards[i], dones[i]) == (reward, done)
+                    expected.append(o)
+            assert dones.all()
+        finally:
+            for e in envs:
+                e.close()
+
+    def test_worker_error(self):
+        with pytest.raises(ValueError, match="Unknown ttyrec codec"):
+            nle.env.SharedMemoryVectorEnv(2, num_workers=2, ttyrec_codec="nope")
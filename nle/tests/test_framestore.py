@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from test_db import conn  # noqa: F401
+from test_db import mockdata  # noqa: F401
+
+from nle.dataset import dataset
+from nle.dataset import framestore
+
+
+@pytest.fixture(params=["basictest", "nletest"])
+def dataset_name(request):
+    return request.param
+
+
+@pytest.fixture(params=[None, 7], ids=["dense", "delta"])
+def store(request, dataset_name, conn, tmpdir):  # noqa: F811
+    path = str(tmpdir.join(dataset_name))
+    framestore.materialize(
+        dataset_name, path, chunk_size=50, keyframe_interval=request.param
+    )
+    return dataset_name, path
+
+
+class TestFrameStore:
+    @pytest.mark.parametrize("batch_size,seq_length", [(1, 100), (3, 20)])
+    def test_minibatches(self, store, batch_size, seq_length):
+        dataset_name, path = store
+        kwargs = dict(batch_size=batch_size, seq_length=seq_length, shuffle=False)
+        data1 = dataset.TtyrecDataset(dataset_name, **kwargs)
+        data2 = framestore.FrameStoreDataset(path, gameids=data1._gameids, **kwargs)
+
+        mbs1 = [{k: t.copy() for k, t in mb.items()} for mb in data1]
+        mbs2 = [{k: t.copy() for k, t in mb.items()} for mb in data2]
+        assert len(mbs1) == len(mbs2)
+        for mb1, mb2 in zip(mbs1, mbs2):
+            assert list(mb1.keys()) == list(mb2.keys())
+            for k in mb1:
+                np.testing.assert_array_equal(mb1[k], mb2[k])
+
+    def test_random_access(self, store):
+        dataset_name, path = store
+        data1 = dataset.TtyrecDataset(dataset_name)
+        data2 = framestore.FrameStoreDataset(path)
+
+        gameid = max(data2._gameids, key=data2.get_length)
+        chunks = data1.get_ttyrec(gameid, chunk_size=1000)
+        length = data2.get_length(gameid)
+        assert length == sum(np.count_nonzero(c["gameids"]) for c in chunks)
+
+        frames = data2.get_frames(gameid, 2, 8)
+        for k, array in frames.items():
+            expected = np.concatenate([c[k][0] for c in chunks])
+            assert array.shape[0] == 6
+            np.testing.assert_array_equal(array, expected[2:8])
+            np.testing.assert_array_equal(data2[gameid, 7][k], expected[7])
+            np.testing.assert_array_equal(data2[gameid, 8][k], expected[8])
+            np.testing.assert_array_equal(data2[gameid, -1][k], expected[length - 1])
+
+        with pytest.raises(IndexError):
+            data2[gameid, length]
+
+    def test_exists(self, store):
+        dataset_name, path = store
+        with pytest.raises(FileExistsError):
+            framestore.materialize(dataset_name, path)
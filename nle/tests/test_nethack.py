@@ -1,6 +1,11 @@
 # Copyright (c) Facebook, Inc. and its affiliates.
+import bz2
+import concurrent.futures
+import gzip
 import os
 import random
+import struct
+import sys
 import timeit
 import warnings
 
@@ -144,6 +149,480 @@ class TestNetHack:
         game.set_current_seeds(core=42, disp=666)
         assert game.get_current_seeds() == (42, 666, False)
 
+    def test_fast_reset(self):
+        if not nethack.NLE_ALLOW_SEEDING:
+            return  # Nothing to test.
+
+        def play(game, seeds):
+            observations = []
+            for i, (core, disp) in enumerate(seeds):
+                game.set_initial_seeds(core=core, disp=disp)
+                observations.append(tuple(o.copy() for o in game.reset()))
+                rng = random.Random(core)
+                # Play some games until they're done and reset others early.
+                for _ in range(10000 if i % 2 else 100):
+                    obs, done = game.step(rng.choice(ACTIONS))
+                    if done:
+                        break
+                observations.append(tuple(o.copy() for o in obs))
+            return observations
+
+        def make(fast_reset):
+            return nethack.Nethack(
+                observation_keys=("glyphs", "chars", "blstats", "message"),
+                fast_reset=fast_reset,
+            )
+
+        seeds = [(42, 666), (1, 2), (42, 666), (3, 4)]
+        slow_game = make(fast_reset=False)
+        try:
+            expected = play(slow_game, seeds)
+        finally:
+            slow_game.close()
+
+        game = make(fast_reset=True)
+        try:
+            np.testing.assert_equal(play(game, seeds), expected)
+        finally:
+            game.close()
+
+    def test_clone_and_restore_state(self):
+        if not nethack.NLE_ALLOW_SEEDING:
+            return  # Nothing to test.
+
+        game = nethack.Nethack(
+            observation_keys=("glyphs", "blstats", "message", "tty_chars"),
+            copy=True,
+            wizard=True,
+            ttyrec=None,
+        )
+        try:
+            game.set_initial_seeds(core=42, disp=666)
+            game.reset()
+            for _ in range(3):
+                game.step(ord("\r"))  # Skip welcome message.
+
+            def play(actions):
+                observations = []
+                for action in actions:
+                    obs, done = game.step(action)
+                    observations.append(obs)
+                    if done:
+                        break
+                return observations
+
+            # Level teleports, so the game state includes level files.
+            teleport = [ord("\x16"), ord("3"), ord("\r")]
+            obs0 = play(teleport)[-1]
+            assert obs0[1][nethack.NLE_BL_DEPTH] == 3
+
+            state = game.clone_state()
+
+            rng = random.Random(0)
+            actions = [rng.choice(ACTIONS) for _ in range(200)]
+            actions += [27, 27, ord("\x16"), ord("1"), ord("\r")] + actions
+            observations = play(actions)
+            assert observations[-1][1][nethack.NLE_BL_DEPTH] == 1
+
+            for _ in range(2):
+                np.testing.assert_equal(game.restore_state(state), obs0)
+                np.testing.assert_equal(play(actions), observations)
+
+            game.reset()
+            with pytest.raises(ValueError, match="current episode"):
+                game.restore_state(state)
+        finally:
+            game.close()
+
+    def test_clone_recorded_game(self, game, tmpdir):
+        game.reset()
+        with pytest.raises(ValueError, match="set ttyrec=None"):
+            game.clone_state()
+
+        game = nethack.Nethack(observation_keys=("blstats",), ttyrec=None)
+        try:
+            game.reset()
+            state = game.clone_state()
+            game.reset(new_ttyrec=str(tmpdir.join("nle.ttyrec.bz2")))
+            with pytest.raises(ValueError, match="set ttyrec=None"):
+                game.restore_state(state)
+        finally:
+            game.close()
+
+    def test_skip_policy(self):
+        game = nethack.Nethack(
+            observation_keys=("message", "internal", "program_state"), ttyrec=None
+        )
+        try:
+            game.set_skip_policy(
+                every_step=True, yn_exceptions=[b"direction?"], reset_to_moveloop=True
+            )
+            _, _, program_state = game.reset()
+            assert program_state[3]  # in_moveloop.
+
+            obs, _ = game.step(nethack.Command.KICK, skip_prompts=True)
+            message, internal, _ = obs
+            assert b"In what direction?" in bytes(message)
+            assert internal[1]  # in_yn_function, an exception.
+            game.step(nethack.C("["))  # ESC
+
+            # Really quit? Declined.
+            obs, done = game.step(nethack.M("q"), skip_prompts=True)
+            assert not obs[1][1] and not done
+
+            obs, done = game.step(nethack.M("q"))
+            assert obs[1][1]  # Not skipped.
+        finally:
+            game.close()
+
+    def test_library_copies_reused(self):
+        if sys.platform != "linux":
+            pytest.skip("Library copies only reused on Linux")
+
+        game = nethack.Nethack(ttyrec=None)
+        game.reset()
+        dlpath = game.dlpath
+        game.close()
+
+        game = nethack.Nethack(ttyrec=None)
+        try:
+            assert game.dlpath == dlpath
+            game.reset()
+            game.step(ord("s"))
+        finally:
+            game.close()
+
+    def test_dl_pool_size(self):
+        if sys.platform != "linux":
+            pytest.skip("Library copies only reused on Linux")
+
+        pool = nethack.nethack._DL_POOL
+        games = [nethack.Nethack(ttyrec=None) for _ in range(3)]
+        try:
+            nethack.set_dl_pool_size(2)
+            for game in games:
+                game.close()
+            assert len(pool._dls) == 2
+            nethack.set_dl_pool_size(1)
+            assert len(pool._dls) == 1
+            nethack.clear_dl_pool()
+            assert not pool._dls
+            with pytest.raises(ValueError, match="non-negative"):
+                nethack.set_dl_pool_size(-1)
+        finally:
+            for game in games:
+                game.close()
+            nethack.set_dl_pool_size(256)
+
+    def test_threads(self, num_games=32, steps=300):
+        if not nethack.NLE_ALLOW_SEEDING:
+            pytest.skip("Seeding not enabled")
+
+        actions = np.random.RandomState(0).choice(ACTIONS, size=steps)
+        games = [
+            nethack.Nethack(
+                observation_keys=("glyphs", "blstats", "tty_chars"), ttyrec=None
+            )
+            for _ in range(num_games)
+        ]
+
+        def play(i):
+            game = games[i]
+            game.set_initial_seeds(i, 2 * i, False)
+            obs = game.reset()
+            digests = []
+            for action in actions:
+                digests.append(hash(b"".join(o.tobytes() for o in obs)))
+                obs, done = game.step(int(action))
+                if done:
+                    game.set_initial_seeds(i, 2 * i, False)
+                    obs = game.reset()
+            return digests
+
+        try:
+            with concurrent.futures.ThreadPoolExecutor(num_games) as pool:
+                threaded = list(pool.map(play, range(num_games)))
+            sequential = [play(i) for i in range(num_games)]
+        finally:
+            for game in games:
+                game.close()
+
+        assert threaded == sequential
+        assert len(set(digests[-1] for digests in threaded)) == num_games
+
+    def test_glyphs_changed(self):
+        game = nethack.Nethack(
+            observation_keys=("glyphs", "glyphs_changed"), ttyrec=None
+        )
+        try:
+            game.set_skip_policy(every_step=True, reset_to_moveloop=True)
+            glyphs, changed = game.reset()
+            assert changed[glyphs != nethack.GLYPH_CMAP_OFF].all()  # Not stone.
+
+            partial = False
+            for action in np.random.RandomState(0).choice(ACTIONS, size=200):
+                previous = glyphs.copy()
+                (glyphs, changed), done = game.step(int(action), skip_prompts=True)
+                if done:
+                    break
+                assert changed[glyphs != previous].all()
+                partial = partial or not changed.all()
+            assert partial
+        finally:
+            game.close()
+
+    def test_explored_cells(self):
+        game = nethack.Nethack(
+            observation_keys=("glyphs", "blstats", "explored_cells"),
+            ttyrec=None,
+            wizard=True,
+        )
+
+        def check(glyphs, blstats, explored_cells):
+            level = (blstats[nethack.NLE_BL_DNUM], blstats[nethack.NLE_BL_DLEVEL])
+            explored = explored_cells[level[0], level[1] - 1]
+            assert explored == np.sum(glyphs != nethack.GLYPH_CMAP_OFF)
+            return level, explored
+
+        try:
+            game.set_skip_policy(every_step=True, reset_to_moveloop=True)
+            obs = game.reset()
+            check(*obs)
+            for action in np.random.RandomState(0).choice(ACTIONS, size=100):
+                obs, done = game.step(int(action), skip_prompts=True)
+                assert not done
+                first_level, first_explored = check(*obs)
+
+            # Teleport to another level and back.
+            for level in (b"3", b"1"):
+                for key in (nethack.C("v"),) + tuple(level + b"\r"):
+                    obs, done = game.step(key)
+                obs, done = game.step(nethack.MiscAction.MORE, skip_prompts=True)
+                level, explored = check(*obs)
+                if level != first_level:
+                    assert level[1] == 3
+                    explored_cells = obs[2]
+                    # The first level's count is kept.
+                    assert explored_cells[0, 0] == first_explored
+            assert level == first_level
+            assert explored >= first_explored
+        finally:
+            game.close()
+
+    def test_level_maps(self):
+        game = nethack.Nethack(
+            observation_keys=("glyphs", "blstats", "level_maps", "level_map_levels"),
+            ttyrec=None,
+            wizard=True,
+        )
+        try:
+            game.set_skip_policy(every_step=True, reset_to_moveloop=True)
+            glyphs, blstats, level_maps, levels = game.reset()
+            assert game.level_map(0, 2) is None
+            np.testing.assert_array_equal(game.level_map(0, 1), glyphs)
+            np.testing.assert_array_equal(level_maps[0], glyphs)
+            assert (level_maps[1:] == nethack.GLYPH_CMAP_OFF).all()
+            assert levels[0].tolist() == [0, 1]
+            assert not levels[1:].any()
+
+            for action in np.random.RandomState(0).choice(ACTIONS, size=50):
+                (glyphs, *_), done = game.step(int(action), skip_prompts=True)
+            first_level = glyphs.copy()
+
+            # Teleport to another level and back.
+            for level, dlevel in ((b"3", 3), (b"1", 1)):
+                for key in (nethack.C("v"),) + tuple(level + b"\r"):
+                    game.step(key)
+                game.step(nethack.MiscAction.MORE, skip_prompts=True)
+                assert blstats[nethack.NLE_BL_DLEVEL] == dlevel
+                if dlevel == 3:
+                    np.testing.assert_array_equal(level_maps[0], first_level)
+                    third_level = glyphs.copy()
+                np.testing.assert_array_equal(game.level_map(0, dlevel), glyphs)
+
+            assert levels[:2].tolist() == [[0, 1], [0, 3]]
+            np.testing.assert_array_equal(level_maps[0], glyphs)
+            np.testing.assert_array_equal(level_maps[1], third_level)
+            np.testing.assert_array_equal(game.level_map(0, 3), third_level)
+
+            with pytest.raises(IndexError):
+                game.level_map(0, 0)
+        finally:
+            game.close()
+
+    @pytest.mark.parametrize(
+        "radius,pad_glyph", [(nethack.EGOCENTRIC_RADIUS, None), (12, 0)]
+    )
+    def test_egocentric(self, radius, pad_glyph):
+        keys = ("glyphs", "chars", "colors", "blstats")
+        egocentric_keys = ("egocentric_glyphs", "egocentric_chars", "egocentric_colors")
+        kwargs = dict(egocentric_radius=radius)
+        if pad_glyph is not None:
+            kwargs.update(egocentric_pad_glyph=pad_glyph)
+        else:
+            pad_glyph = nethack.GLYPH_CMAP_OFF
+        game = nethack.Nethack(observation_keys=keys + egocentric_keys, **kwargs)
+
+        size = 2 * radius + 1
+
+        def check(obs):
+            x, y = obs[3][:2]
+            for full, crop, pad in zip(obs[:3], obs[4:], (pad_glyph, ord(" "), 0)):
+                assert crop.shape == (size, size)
+                padded = np.pad(full, radius, constant_values=pad)
+                np.testing.assert_array_equal(crop, padded[y : y + size, x : x + size])
+            assert obs[5][radius, radius] == ord("@")
+
+        try:
+            check(game.reset())
+            for action in np.random.RandomState(0).choice(ACTIONS, size=100):
+                obs, done = game.step(int(action))
+                if done:
+                    break
+                check(obs)
+        finally:
+            game.close()
+
+    def test_egocentric_bad_args(self):
+        with pytest.raises(ValueError, match="Negative egocentric_radius"):
+            nethack.Nethack(observation_keys=("glyphs",), egocentric_radius=-1)
+        with pytest.raises(ValueError, match="Invalid egocentric_pad_glyph"):
+            nethack.Nethack(
+                observation_keys=("glyphs",), egocentric_pad_glyph=nethack.MAX_GLYPH
+            )
+
+    def test_stats(self, tmpdir):
+        game = nethack.Nethack(
+            observation_keys=("glyphs", "tty_chars"),
+            ttyrec=str(tmpdir / "nle.ttyrec.bz2"),
+            collect_stats=True,
+        )
+        try:
+            game.reset()
+            for _ in range(10):
+                game.step(ord("s"))
+            stats = game.get_stats()
+            assert stats["start_calls"] == 1
+            assert stats["step_calls"] == stats["call_calls"] - 1 == 10
+            for phase in ("fill_obs", "tty", "ttyrec"):
+                assert stats[phase + "_calls"] > 0
+                assert 0 < stats[phase + "_ns"] < stats["call_ns"]
+            assert stats["game_ns"] > 0
+
+            game.reset_stats()
+            assert not any(game.get_stats().values())
+        finally:
+            game.close()
+
+        game = nethack.Nethack(ttyrec=None)
+        try:
+            game.reset()
+            game.step(ord("s"))
+            assert not any(game.get_stats().values())
+            with pytest.raises(RuntimeError, match="after reset"):
+                game._pynethack.enable_stats()
+        finally:
+            game.close()
+
+    def test_headless(self, tmpdir, steps=500):
+        if not nethack.NLE_ALLOW_SEEDING:
+            pytest.skip("Seeding not enabled")
+
+        with pytest.raises(ValueError, match="recorded"):
+            nethack.Nethack(observation_keys=("glyphs",), headless=True)
+        with pytest.raises(ValueError, match="tty_chars"):
+            nethack.Nethack(ttyrec=None, headless=True)
+
+        # Nothing but the terminal is different.
+        keys = ("glyphs", "chars", "colors", "blstats", "message", "inv_strs")
+        games = [
+            nethack.Nethack(observation_keys=keys, ttyrec=None, headless=headless)
+            for headless in (False, True)
+        ]
+        try:
+            for game in games:
+                game.set_initial_seeds(1, 2, False)
+            drawn, headless = (game.reset() for game in games)
+            actions = np.random.RandomState(0).choice(nethack.ACTIONS, size=steps)
+            for action in actions:
+                np.testing.assert_equal(headless, drawn)
+                (drawn, done), (headless, _) = (g.step(int(action)) for g in games)
+                if done:
+                    break
+            np.testing.assert_equal(headless, drawn)
+
+            with pytest.raises(ValueError, match="recorded"):
+                games[1].reset(str(tmpdir / "nle.ttyrec.bz2"))
+        finally:
+            for game in games:
+                game.close()
+
+    @pytest.mark.parametrize("extension", [".bz2", ".gz", ""])
+    def test_ttyrec(self, tmpdir, extension):
+        def recorded_actions(path):
+            with {".bz2": bz2.open, ".gz": gzip.open}.get(extension, open)(
+                path, "rb"
+            ) as f:
+                data = f.read()
+            actions = []
+            while data:
+                _, _, length, channel = struct.unpack("<iiiB", data[:13])
+                assert len(data) >= 13 + length
+                if channel == 1:
+                    actions.append(data[13])
+                data = data[13 + length :]
+            return actions
+
+        paths = [str(tmpdir / ("nle.%i.ttyrec%s" % (i, extension))) for i in range(2)]
+        game = nethack.Nethack(ttyrec=paths[0])
+        expected = [[], []]
+        # Enough output to go through the writer's buffers several times.
+        for episode, path in enumerate((None, None, paths[1])):
+            if path is None:
+                game.reset()
+            else:
+                game.reset(path)
+            for action in random.Random(episode).choices(ACTIONS, k=3000):
+                expected[path is not None].append(action)
+                _, done = game.step(action)
+                if done:
+                    break
+        game.close()
+
+        for path, actions in zip(paths, expected):
+            assert recorded_actions(path) == actions
+
+    def test_step_many(self):
+        if not nethack.NLE_ALLOW_SEEDING:
+            pytest.skip("Seeding not enabled")
+
+        keys = ("glyphs", "blstats", "message", "inv_strs", "tty_chars")
+        actions = [ord("s")] * 5 + [ord(":")] + [ord("s")] * 5
+        games = [nethack.Nethack(observation_keys=keys, ttyrec=None) for _ in "ab"]
+        try:
+            for game in games:
+                game.set_initial_seeds(1, 2, False)
+                game.set_skip_policy(every_step=True, reset_to_moveloop=True)
+                game.reset()
+
+            a, b = games
+            for action in actions:
+                expected, done = a.step(action, skip_prompts=True)
+            obs, done, count = b.step_many(actions, skip_prompts=True)
+            assert count == len(actions) and not done
+            for x, y in zip(obs, expected):
+                np.testing.assert_array_equal(x, y)
+
+            obs, done, count = b.step_many(actions, stop_on={"message"})
+            assert count == 6  # Looking here leaves a message.
+            assert bytes(obs[2]).rstrip(b"\0")
+
+            with pytest.raises(ValueError):
+                b.step_many(actions, stop_on=("ouch",))
+        finally:
+            for game in games:
+                game.close()
+
 
 class TestNetHackFurther:
     def test_run(self):
@@ -208,6 +687,22 @@ class TestNetHackFurther:
         with pytest.raises(RuntimeError, match=r"set_buffers called after reset()"):
             game._pynethack.set_buffers()
 
+    def test_set_buffers(self):
+        game = nethack.Nethack(observation_keys=("glyphs", "blstats"), ttyrec=None)
+        try:
+            with pytest.raises(ValueError, match="Observation 'chars' not requested"):
+                game.set_buffers(chars=np.zeros(nethack.DUNGEON_SHAPE, dtype=np.uint8))
+            glyphs = np.full(nethack.DUNGEON_SHAPE, -1, dtype=np.int16)
+            game.set_buffers(glyphs=glyphs)
+            obs_glyphs, blstats = game.reset()
+            assert obs_glyphs is glyphs
+            assert not np.any(glyphs == -1)
+            assert blstats[nethack.NLE_BL_TIME] == 1
+            with pytest.raises(RuntimeError, match="called after reset"):
+                game.set_buffers(glyphs=glyphs)
+        finally:
+            game.close()
+
     def test_nethack_random_character(self):
         game = nethack.Nethack(playername="Hugo-@")
         assert "race:random" in game.options
@@ -238,6 +733,83 @@ class TestNetHackFurther:
         assert "gender:female" in game.options
 
 
+class TestBatchNethack:
+    @pytest.fixture
+    def batch(self):  # Make sure we close even on test failure.
+        b = nethack.BatchNethack(
+            3, observation_keys=("chars", "blstats", "program_state")
+        )
+        try:
+            yield b
+        finally:
+            b.close()
+
+    def test_step(self, batch):
+        chars, blstats, program_state = batch.reset()
+        assert len(batch) == 3
+        assert chars.shape == (3,) + nethack.DUNGEON_SHAPE
+        assert blstats.shape == (3,) + nethack.BLSTATS_SHAPE
+        assert np.all(program_state[:, 3])  # in_moveloop.
+        assert np.all(blstats[:, nethack.NLE_BL_TIME] == 1)
+
+        for _ in range(20):
+            (chars, blstats, _), done, reward = batch.step(
+                np.random.choice(ACTIONS, size=3)
+            )
+            assert done.shape == (3,) and done.dtype == bool
+            assert reward.shape == (3,) and reward.dtype == np.float32
+            for i in range(3):
+                x, y = blstats[i, :2]
+                assert chars[i, y, x] == ord("@")
+
+        with pytest.raises(ValueError, match="one action per game"):
+            batch.step(np.zeros(2, dtype=np.int64))
+
+    def test_auto_reset(self, batch):
+        batch.set_skip_policy(every_step=True, decline_yn=False)
+        _, blstats, _ = batch.reset()
+        for _ in range(10):
+            batch.step(np.full(3, ord("s")))  # Search, turns pass.
+        times = blstats[:, nethack.NLE_BL_TIME].copy()
+        assert np.all(times > 1)
+
+        quit_game = [27, 0x80 | ord("q"), ord("y")]  # ESC M-q y
+        wait = ord("s")
+        for action in quit_game:
+            _, done, _ = batch.step(np.array([action, wait, wait]))
+        for _ in range(100):
+            if done[0]:
+                break
+            _, done, _ = batch.step(np.array([27, wait, wait]))  # ESC
+        else:
+            pytest.fail("Game didn't end after quitting")
+        assert not done[1:].any()
+
+        # Game 0 starts over, the others kept going.
+        assert blstats[0, nethack.NLE_BL_TIME] == 1
+        assert np.all(blstats[1:, nethack.NLE_BL_TIME] > times[1:])
+
+        times = blstats[:, nethack.NLE_BL_TIME].copy()
+        batch.reset(1)
+        assert blstats[1, nethack.NLE_BL_TIME] == 1
+        assert blstats[2, nethack.NLE_BL_TIME] == times[2]
+
+    def test_egocentric(self):
+        batch = nethack.BatchNethack(
+            2, observation_keys=("egocentric_chars",), egocentric_radius=2
+        )
+        try:
+            (chars,) = batch.reset()
+            assert chars.shape == (2, 5, 5)
+            assert np.all(chars[:, 2, 2] == ord("@"))
+        finally:
+            batch.close()
+
+    def test_step_without_reset(self, batch):
+        with pytest.raises(RuntimeError, match=r"step called without reset\(\)"):
+            batch.step(np.zeros(3, dtype=np.int64))
+
+
 class TestNethackSomeObs:
     @pytest.fixture
     def game(self):  # Make sure we close even on test failure.
@@ -628,6 +1200,24 @@ class TestNethackGlanceObservation:
                         elif glyph == 2372:
                             assert glance == "open door"
 
+    def test_describe(self, game):
+        desc, glyphs, _ = game.reset()
+        for _ in range(10):
+            (desc, glyphs, _), done = game.step(ord("s"))
+            np.testing.assert_array_equal(
+                game.describe_cells(np.ones_like(glyphs, dtype=bool)), desc
+            )
+
+        mask = np.zeros_like(glyphs, dtype=bool)
+        mask[0, :5] = True
+        np.testing.assert_array_equal(game.describe_cells(mask)[mask], desc[mask])
+        assert not game.describe_cells(mask)[~mask].any()
+
+        y, x = np.argwhere(glyphs == 333)[0]  # Us.
+        assert game.describe(x, y) == "human monk called MonkBot"
+        with pytest.raises(IndexError):
+            game.describe(-1, 0)
+
 
 class TestNethackTerminalObservation:
     @pytest.fixture
@@ -681,6 +1271,35 @@ class TestNethackTerminalObservation:
         np.testing.assert_array_equal(chars, tty_chars[1:-2, :-1])
         np.testing.assert_array_equal(colors, tty_colors[1:-2, :-1])
 
+    def test_direct_rendering(self, tmpdir, steps=500):
+        if not nethack.NLE_ALLOW_SEEDING:
+            pytest.skip("Seeding not enabled")
+
+        # Without a ttyrec, the terminal isn't emulated from the ANSI output
+        # but drawn directly. Both have to look the same.
+        keys = ("tty_chars", "tty_colors", "tty_cursor")
+        actions = [int(a) for a in nethack.ACTIONS]
+        for seed in range(4):
+            games = [
+                nethack.Nethack(observation_keys=keys, ttyrec=ttyrec)
+                for ttyrec in (str(tmpdir / "nle.ttyrec.bz2"), None)
+            ]
+            try:
+                for game in games:
+                    game.set_initial_seeds(seed, seed + 1, False)
+                emulated, direct = (game.reset() for game in games)
+                rng = np.random.RandomState(seed)
+                for _ in range(steps):
+                    np.testing.assert_equal(direct, emulated)
+                    action = int(rng.choice(actions))
+                    (emulated, done), (direct, _) = (g.step(action) for g in games)
+                    if done:
+                        break
+                np.testing.assert_equal(direct, emulated)
+            finally:
+                for game in games:
+                    game.close()
+
 
 class TestNethackMiscObservation:
     @pytest.fixture
@@ -751,6 +1370,69 @@ class TestNethackMiscObservation:
         np.testing.assert_array_equal(misc, internal[1:4])
 
 
+class TestNethackActionMask:
+    @pytest.fixture
+    def game(self):  # Make sure we close even on test failure.
+        g = nethack.Nethack(
+            playername="MonkBot-mon-hum-neu-mal",
+            observation_keys=("action_mask", "misc"),
+        )
+        try:
+            yield g
+        finally:
+            g.close()
+
+    def valid(self, mask):
+        return {a for a, m in zip(nethack.ACTIONS, mask) if m}
+
+    def test_action_mask(self, game):
+        mask, misc = game.reset()
+        while misc[2]:
+            (mask, misc), done = game.step(ord(" "))
+        assert mask.shape == (len(nethack.ACTIONS),)
+
+        # Commands and movement, but no keys that do nothing.
+        valid = self.valid(mask)
+        assert {ord("k"), ord("K"), ord("s"), nethack.M("p"), ord("5")} <= valid
+        assert not {nethack.Command.ESC, nethack.MiscAction.MORE} & valid
+
+        game.step(nethack.M("p"))  # Are you sure you want to pray? [yn] (n)
+        valid = self.valid(mask)
+        assert {ord("y"), ord("n"), ord("Y"), ord(" "), nethack.Command.ESC} <= valid
+        assert ord("k") not in valid
+        game.step(ord("n"))
+
+        game.step(ord("i"))  # Inventory menu, which picks nothing.
+        assert misc[2]
+        valid = self.valid(mask)
+        assert {ord(" "), ord(">"), nethack.MiscAction.MORE} <= valid
+        assert nethack.Command.ESC in valid
+        assert not {ord("k"), ord("a"), ord("."), ord("1")} & valid
+        game.step(nethack.Command.ESC)
+
+        game.step(ord("D"))  # Drop what type of items? Picks any.
+        valid = self.valid(mask)
+        assert {ord("a"), ord("A"), ord("."), ord("1"), ord(" ")} <= valid
+        assert ord("k") not in valid
+        game.step(nethack.Command.ESC)
+
+        game.step(nethack.M("n"))  # Name ...
+        game.step(ord("a"))  # ... the current level.
+        assert misc[1]
+        assert mask.all()
+
+    def test_shape(self):
+        actions = (ord("k"), ord("j"), nethack.Command.ESC)
+        game = nethack.Nethack(observation_keys=("action_mask",), actions=actions)
+        try:
+            (mask,) = game.reset()
+            assert mask.shape == (3,)
+        finally:
+            game.close()
+        with pytest.raises(ValueError, match="between 0 and 255"):
+            nethack.Nethack(observation_keys=("action_mask",), actions=(256,))
+
+
 class TestAuxillaryFunctions:
     def test_tty_render(self):
         text = ["DE", "HV"]
@@ -6,6 +6,7 @@
 #   pip install pytest-benchmark
 # to run
 import os
+import sys
 
 import gym
 import numpy as np
@@ -70,3 +71,107 @@ class TestProfile:
                     env.reset()
 
         benchmark.pedantic(play_1k_steps, setup=seed, rounds=100, warmup_rounds=10)
+
+
+@pytest.mark.parametrize("fast_reset", [False, True], ids=["reload", "fast"])
+class TestResetProfile:
+    @pytest.fixture(autouse=True)
+    def make_cwd_tmp(self, tmpdir):
+        """Makes cwd point to the test's tmpdir."""
+        with tmpdir.as_cwd():
+            yield
+
+    @pytest.mark.benchmark(disable_gc=True, warmup=False)
+    def test_reset(self, fast_reset, benchmark):
+        if os.environ.get("CI") == "true":
+            pytest.skip("Not running benchmark on CI")
+
+        env = gym.make("NetHack-v0", fast_reset=fast_reset)
+        env.reset()
+        try:
+            benchmark.pedantic(env.reset, rounds=200, warmup_rounds=10)
+        finally:
+            env.close()
+
+
+class TestBatchProfile:
+    @pytest.mark.benchmark(disable_gc=True, warmup=False)
+    def test_run_1k_batch_steps(self, benchmark):
+        if os.environ.get("CI") == "true":
+            pytest.skip("Not running benchmark on CI")
+
+        env = nle.env.NLEVectorEnv(16, observation_keys=BASE_KEYS)
+        np.random.seed(123456)
+        actions = np.random.choice(len(env.actions), size=(1000, 16))
+
+        def play_1k_steps():
+            env.reset()
+            for a in actions:
+                env.step(a)
+
+        try:
+            benchmark.pedantic(play_1k_steps, rounds=5, warmup_rounds=1)
+        finally:
+            env.close()
+
+    @pytest.mark.benchmark(disable_gc=True, warmup=False)
+    def test_run_1k_shared_memory_steps(self, benchmark):
+        if os.environ.get("CI") == "true":
+            pytest.skip("Not running benchmark on CI")
+
+        env = nle.env.SharedMemoryVectorEnv(16, observation_keys=BASE_KEYS)
+        np.random.seed(123456)
+        actions = np.random.choice(env.single_action_space.n, size=(1000, 16))
+
+        def play_1k_steps():
+            env.reset()
+            for a in actions:
+                env.step(a)
+
+        try:
+            benchmark.pedantic(play_1k_steps, rounds=5, warmup_rounds=1)
+        finally:
+            env.close()
+
+
+def _rss():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+@pytest.mark.parametrize("reuse", [False, True], ids=["copy", "pooled"])
+class TestInstanceProfile:
+    @pytest.fixture(autouse=True)
+    def make_cwd_tmp(self, tmpdir):
+        """Makes cwd point to the test's tmpdir."""
+        with tmpdir.as_cwd():
+            yield
+
+    @pytest.mark.benchmark(disable_gc=True, warmup=False)
+    def test_new_instance(self, reuse, benchmark):
+        if os.environ.get("CI") == "true":
+            pytest.skip("Not running benchmark on CI")
+        if sys.platform != "linux":
+            pytest.skip("Linux only")
+
+        def setup():
+            if not reuse:
+                nle.nethack.clear_dl_pool()
+
+        def new_instance():
+            game = nle.nethack.Nethack(ttyrec=None)
+            game.reset()
+            game.close()
+
+        new_instance()
+        benchmark.pedantic(new_instance, setup=setup, rounds=50, warmup_rounds=2)
+
+        # Memory per running instance.
+        setup()
+        rss = _rss()
+        games = [nle.nethack.Nethack(ttyrec=None) for _ in range(16)]
+        for game in games:
+            game.reset()
+        benchmark.extra_info["rss_per_instance"] = (_rss() - rss) / len(games)
+        for game in games:
+            game.close()
@@ -482,6 +482,19 @@ dlb_cleanup()
     }
 }
 
+/* NLE: The libraries' file positions aren't part of the game state that
+ * nle_restore_state restores, so make the next read seek. */
+void
+dlb_forget_marks()
+{
+#ifdef DLBLIB
+    int i;
+
+    for (i = 0; i < MAX_LIBS && dlb_libs[i].fdata; i++)
+        dlb_libs[i].fmark = -1;
+#endif
+}
+
 dlb *
 dlb_fopen(name, mode)
 const char *name, *mode;
@@ -1718,10 +1718,12 @@ int status;
 #endif
     /* don't bother to try to release memory if we're in panic mode, to
        avoid trouble in case that happens to be due to memory problems */
+#ifndef RL_GRAPHICS
     if (!program_state.panicking) {
         freedynamicdata();
         dlb_cleanup();
     }
+#endif /* NLE: nle_finish() in nle.c does this once the game is reset. */
 
 #ifdef VMS
     /*
@@ -849,6 +849,18 @@ boolean caseblind;
     && !defined(_DCC) && !defined(__GNUC__)
 extern struct tm *FDECL(localtime, (time_t *));
 #endif
+#if defined(RL_GRAPHICS) && defined(UNIX)
+/* NLE: localtime()'s result is shared by all copies of this library in the
+ * process, which may run on several threads at once. */
+STATIC_OVL struct tm *
+nle_localtime(const time_t *date)
+{
+    static struct tm lt;
+
+    return localtime_r(date, &lt);
+}
+#define localtime nle_localtime
+#endif
 STATIC_DCL struct tm *NDECL(getlt);
 
 /* NLE hack for seeds. Should stay in sync with rnglist in src/rnd.c. */
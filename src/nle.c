@@ -2,6 +2,7 @@
 #include <assert.h>
 #include <string.h>
 #include <sys/time.h>
+#include <time.h>
 
 #include <tmt.h>
 
@@ -15,9 +16,6 @@
 
 #include "nle.h"
 
-#ifdef NLE_BZ2_TTYRECS
-#include <bzlib.h>
-#endif
 
 #define STACK_SIZE (1 << 15) /* 32KiB */
 
@@ -30,6 +28,18 @@
 #endif
 
 extern int unixmain(int, char **);
+extern void rl_free_instance(void); /* See winrl.cc. */
+extern void rl_fill_obs(nle_obs *);
+extern int rl_describe(int, const int *, unsigned char *);
+extern int rl_level_map(int, int, short *);
+
+/* See nlealloc.c. */
+extern void *nle_sys_malloc(size_t);
+extern void nle_sys_free(void *);
+extern int nle_arena_used(char **, char **);
+extern int nle_data_segments(char **, size_t *, int);
+
+nle_ctx_t *current_nle_ctx;
 
 signed char
 vt_char_color_extract(TMTCHAR *c)
@@ -117,35 +127,31 @@ nle_vt_callback(tmt_msg_t m, TMT *vt, const void *a, void *p)
     }
 }
 
-nle_ctx_t *
-init_nle(FILE *ttyrec, nle_obs *obs)
+void
+init_nle(nle_ctx_t *nle, FILE *ttyrec, nle_obs *obs)
 {
-    nle_ctx_t *nle = malloc(sizeof(nle_ctx_t));
-
     nle->ttyrec = ttyrec;
-
-#ifdef NLE_BZ2_TTYRECS
-    if (nle->ttyrec) {
-        int bzerror;
-        nle->ttyrec_bz2 = BZ2_bzWriteOpen(&bzerror, ttyrec, 9, 0, 0);
-        assert(bzerror == BZ_OK);
-    }
-#endif
+    nle->ttyrec_writer =
+        ttyrec ? nle_ttyrec_writer_open(ttyrec, nle->settings.ttyrec_codec)
+               : NULL;
 
     nle->observation = obs;
 
-    TMT *vterminal = tmt_open(LI, CO, nle_vt_callback, nle, NULL);
-    assert(vterminal);
-    nle->vterminal = vterminal;
+    /* With a ttyrec, the tty_* observations show what it shows. Otherwise,
+     * they are rendered directly, see nletty.c. */
+    if (ttyrec) {
+        nle->vterminal = tmt_open(LI, CO, nle_vt_callback, nle, NULL);
+        assert(nle->vterminal);
+    } else {
+        nle->vterminal = NULL;
+        nle_tty_init(&nle->tty);
+        nle_tty_fill_obs(&nle->tty, obs);
+    }
 
     nle->outbuf_write_ptr = nle->outbuf;
     nle->outbuf_write_end = nle->outbuf + sizeof(nle->outbuf);
-
-    return nle;
 }
 
-nle_settings settings;
-
 /* TODO: Consider copying the relevant parts of main() in unixmain.c. */
 void
 mainloop(fcontext_transfer_t ctx_transfer)
@@ -163,49 +169,89 @@ mainloop(fcontext_transfer_t ctx_transfer)
                                 stack->ssize);
 #endif
 
-    int len = strnlen(settings.hackdir, sizeof(settings.hackdir));
+    nle_settings *settings = &current_nle_ctx->settings;
+    int len = strnlen(settings->hackdir, sizeof(settings->hackdir));
 
-    if (len >= sizeof(settings.hackdir) - 1) {
+    if (len >= sizeof(settings->hackdir) - 1) {
         error("HACKDIR too long");
         return;
     }
-    if (settings.hackdir[len - 1] != '/') {
-        settings.hackdir[len] = '/';
-        settings.hackdir[len + 1] = '\0';
+    if (settings->hackdir[len - 1] != '/') {
+        settings->hackdir[len] = '/';
+        settings->hackdir[len + 1] = '\0';
     } else {
-        settings.hackdir[len] = '\0';
-    }
-
-    char *scoreprefix = (settings.scoreprefix[0] != '\0')
-                            ? settings.scoreprefix
-                            : settings.hackdir;
-    fqn_prefix[SYSCONFPREFIX] = settings.hackdir;
-    fqn_prefix[CONFIGPREFIX] = settings.hackdir;
-    fqn_prefix[HACKPREFIX] = settings.hackdir;
-    fqn_prefix[SAVEPREFIX] = settings.hackdir;
-    fqn_prefix[LEVELPREFIX] = settings.hackdir;
-    fqn_prefix[BONESPREFIX] = settings.hackdir;
+        settings->hackdir[len] = '\0';
+    }
+
+    char *scoreprefix = (settings->scoreprefix[0] != '\0')
+                            ? settings->scoreprefix
+                            : settings->hackdir;
+    fqn_prefix[SYSCONFPREFIX] = settings->hackdir;
+    fqn_prefix[CONFIGPREFIX] = settings->hackdir;
+    fqn_prefix[HACKPREFIX] = settings->hackdir;
+    fqn_prefix[SAVEPREFIX] = settings->hackdir;
+    fqn_prefix[LEVELPREFIX] = settings->hackdir;
+    fqn_prefix[BONESPREFIX] = settings->hackdir;
     fqn_prefix[SCOREPREFIX] = scoreprefix;
-    fqn_prefix[LOCKPREFIX] = settings.hackdir;
-    fqn_prefix[TROUBLEPREFIX] = settings.hackdir;
-    fqn_prefix[DATAPREFIX] = settings.hackdir;
+    fqn_prefix[LOCKPREFIX] = settings->hackdir;
+    fqn_prefix[TROUBLEPREFIX] = settings->hackdir;
+    fqn_prefix[DATAPREFIX] = settings->hackdir;
 
     char *argv[1] = { "nethack" };
 
     unixmain(1, argv);
 }
 
+/*
+ * Timing of phases, if enabled in nle_settings. Otherwise, this costs a
+ * branch per phase.
+ */
+static unsigned long long
+stats_start(nle_ctx_t *nle)
+{
+    struct timespec ts;
+    if (!nle->settings.stats)
+        return 0;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return ts.tv_sec * 1000000000ULL + ts.tv_nsec;
+}
+
+static void
+stats_end(nle_ctx_t *nle, int phase, unsigned long long start)
+{
+    nle_stats *stats = nle->settings.stats;
+    if (!stats)
+        return;
+    ++stats->calls[phase];
+    stats->nanoseconds[phase] += stats_start(nle) - start;
+}
+
+/* For the window port, which has no access to nle_ctx_t. */
+unsigned long long
+nle_stats_start(void)
+{
+    return stats_start(current_nle_ctx);
+}
+
+void
+nle_stats_end(int phase, unsigned long long start)
+{
+    stats_end(current_nle_ctx, phase, start);
+}
+
+int
+nle_headless(void)
+{
+    return current_nle_ctx->settings.headless;
+}
+
 boolean
 write_ttyrec_data(void *buf, int length)
 {
     nle_ctx_t *nle = current_nle_ctx;
-#ifdef NLE_BZ2_TTYRECS
-    int bzerror;
-    BZ2_bzWrite(&bzerror, nle->ttyrec_bz2, buf, length);
-    assert(bzerror == BZ_OK);
-#else
-    assert(fwrite(buf, 1, length, nle->ttyrec) == length);
-#endif
+    unsigned long long start = stats_start(nle);
+    nle_ttyrec_writer_write(nle->ttyrec_writer, buf, length);
+    stats_end(nle, NLE_STATS_TTYREC, start);
     return TRUE;
 }
 
@@ -239,37 +285,48 @@ nle_fflush(FILE *stream)
         return fflush(stream);
     }
     nle_ctx_t *nle = current_nle_ctx;
+    nle_obs *obs = nle->observation;
+    int tty_obs = obs->tty_chars || obs->tty_colors || obs->tty_cursor;
+
+    if (!nle->ttyrec) {
+        if (tty_obs) {
+            unsigned long long start = stats_start(nle);
+            nle_tty_fill_obs(&nle->tty, obs);
+            stats_end(nle, NLE_STATS_TTY, start);
+        }
+        return 0;
+    }
 
     ssize_t length = nle->outbuf_write_ptr - nle->outbuf;
     if (length == 0)
         return 0;
 
-    if (nle->ttyrec) {
-        write_ttyrec_header(length, 0);
-        write_ttyrec_data(nle->outbuf, length);
-    }
+    write_ttyrec_header(length, 0);
+    write_ttyrec_data(nle->outbuf, length);
 
-    nle_obs *obs = nle->observation;
-    if (obs->tty_chars || obs->tty_colors || obs->tty_cursor) {
+    if (tty_obs) {
+        unsigned long long start = stats_start(nle);
         tmt_write(nle->vterminal, nle->outbuf, length);
+        stats_end(nle, NLE_STATS_TTY, start);
     }
     nle->outbuf_write_ptr = nle->outbuf;
-
-#ifdef NLE_BZ2_TTYRECS
     return 0;
-#else
-    return nle->ttyrec ? fflush(nle->ttyrec) : 0;
-#endif
 }
 
 /*
  * NetHack prints most of its output via putchar. We do our
- * own buffering.
+ * own buffering, which is only needed for ttyrecs.
  */
 int
 nle_putchar(int c)
 {
     nle_ctx_t *nle = current_nle_ctx;
+    if (!nle->ttyrec) {
+        nle_obs *obs = nle->observation;
+        if (obs->tty_chars || obs->tty_colors || obs->tty_cursor)
+            nle_tty_putc(&nle->tty, c);
+        return c;
+    }
     if (nle->outbuf_write_ptr >= nle->outbuf_write_end) {
         nle_fflush(stdout);
     }
@@ -279,7 +336,8 @@ nle_putchar(int c)
 
 /*
  * Used in place of xputs from termcap.c. Not using
- * the tputs padding logic from tclib.c.
+ * the tputs padding logic from tclib.c. Without a ttyrec, control
+ * sequences are dropped: termcap.c reports their effects to nletty.c.
  */
 void
 nle_xputs(const char *str)
@@ -289,6 +347,8 @@ nle_xputs(const char *str)
 
     if (!p || !*p)
         return;
+    if (*p == '\033' && !current_nle_ctx->ttyrec)
+        return;
 
     while ((c = *p++) != '\0') {
         nle_putchar(c);
@@ -355,17 +415,15 @@ nle_done(int how)
 char *
 nle_ttyrecname()
 {
-    return settings.ttyrecname;
+    return current_nle_ctx->settings.ttyrecname;
 }
 
 int
 nle_spawn_monsters()
 {
-    return settings.spawn_monsters;
+    return current_nle_ctx->settings.spawn_monsters;
 }
 
-nle_seeds_init_t *nle_seeds_init;
-
 /* See rng.c. */
 extern int FDECL(whichrng, (int FDECL((*fn), (int) )));
 
@@ -383,7 +441,7 @@ nle_getenv(const char *name)
         return "ansi";
     }
     if (strcmp(name, "NETHACKOPTIONS") == 0) {
-        return settings.options;
+        return current_nle_ctx->settings.options;
     }
     /* Don't return anything for "SHOPTYPE" or "SPLEVTYPE". */
     return (char *) 0;
@@ -392,11 +450,12 @@ nle_getenv(const char *name)
 FILE *
 nle_fopen_wizkit_file()
 {
-    size_t len = strnlen(settings.wizkit, sizeof(settings.wizkit));
+    nle_settings *settings = &current_nle_ctx->settings;
+    size_t len = strnlen(settings->wizkit, sizeof(settings->wizkit));
     if (!len) {
         return (FILE *) 0;
     }
-    return fmemopen(settings.wizkit, len, "r");
+    return fmemopen(settings->wizkit, len, "r");
 }
 
 /*
@@ -407,29 +466,31 @@ void
 init_random(int FDECL((*fn), (int) ))
 {
 #ifdef NLE_ALLOW_SEEDING
-    if (nle_seeds_init) {
-        set_random(nle_seeds_init->seeds[whichrng(fn)], fn);
-        has_strong_rngseed = nle_seeds_init->reseed;
+    nle_seeds_init_t *seeds_init = current_nle_ctx->seeds_init;
+    if (seeds_init) {
+        set_random(seeds_init->seeds[whichrng(fn)], fn);
+        has_strong_rngseed = seeds_init->reseed;
         return;
     }
 #endif
     set_random(sys_random_seed(), fn);
 }
 
-nle_ctx_t *
-nle_start(nle_obs *obs, FILE *ttyrec, nle_seeds_init_t *seed_init,
-          nle_settings *settings_p)
+/* Starts a new game on nle's (possibly reused) stack. */
+void
+start_game(nle_ctx_t *nle, nle_obs *obs, FILE *ttyrec,
+           nle_seeds_init_t *seed_init, nle_settings *settings_p)
 {
     /* Set CO and LI to control ttyrec output size. */
     CO = NLE_TERM_CO;
     LI = NLE_TERM_LI;
 
-    settings = *settings_p;
+    nle->settings = *settings_p;
+    unsigned long long start = stats_start(nle);
 
-    nle_ctx_t *nle = init_nle(ttyrec, obs);
-    nle_seeds_init = seed_init;
+    init_nle(nle, ttyrec, obs);
+    nle->seeds_init = seed_init;
 
-    nle->stack = create_fcontext_stack(STACK_SIZE);
     nle->generatorcontext =
         make_fcontext(nle->stack.sptr, nle->stack.ssize, mainloop);
 
@@ -438,7 +499,7 @@ nle_start(nle_obs *obs, FILE *ttyrec, nle_seeds_init_t *seed_init,
     nle->generatorcontext = t.ctx;
     nle->done = (t.data == NULL);
     obs->done = nle->done;
-    nle_seeds_init =
+    nle->seeds_init =
         NULL; /* Don't set to *these* seeds on subsequent reseeds, if any. */
 
     if (nle->ttyrec) {
@@ -450,13 +511,38 @@ nle_start(nle_obs *obs, FILE *ttyrec, nle_seeds_init_t *seed_init,
             write_ttyrec_data(&obs->blstats[9], 4);
         }
     }
+    stats_end(nle, NLE_STATS_START, start);
+}
 
+nle_ctx_t *
+nle_start(nle_obs *obs, FILE *ttyrec, nle_seeds_init_t *seed_init,
+          nle_settings *settings_p)
+{
+    /* Outside of this library's heap, which nle_restore_state rewinds. */
+    nle_ctx_t *nle = nle_sys_malloc(sizeof(nle_ctx_t));
+    nle->stack = create_fcontext_stack(STACK_SIZE);
+
+    start_game(nle, obs, ttyrec, seed_init, settings_p);
+    return nle;
+}
+
+/*
+ * Starts a new game on a context previously ended with nle_finish.
+ * The caller has to restore this library's writable data to its state
+ * right after loading before calling this (see nle_reset in nledl.c).
+ */
+nle_ctx_t *
+nle_restart(nle_ctx_t *nle, nle_obs *obs, FILE *ttyrec,
+            nle_seeds_init_t *seed_init, nle_settings *settings_p)
+{
+    start_game(nle, obs, ttyrec, seed_init, settings_p);
     return nle;
 }
 
 nle_ctx_t *
 nle_step(nle_ctx_t *nle, nle_obs *obs)
 {
+    unsigned long long start = stats_start(nle);
     current_nle_ctx = nle;
     nle->observation = obs;
     if (nle->ttyrec) {
@@ -492,34 +578,290 @@ nle_step(nle_ctx_t *nle, nle_obs *obs)
         }
     }
 
+    stats_end(nle, NLE_STATS_STEP, start);
     return nle;
 }
 
+/*
+ * Switches to obs as the observation and fills it without stepping, e.g.
+ * after steps taken with only some of the observation's fields. Fields
+ * the window port sets are left alone if the game is over.
+ */
 void
-nle_end(nle_ctx_t *nle)
+nle_fill_obs(nle_ctx_t *nle, nle_obs *obs)
 {
-    if (!nle->done) {
-        /* Reset without closing nethack. Need free memory, etc.
-         * this is what nh_terminate in end.c does. I hope it's enough. */
-        if (!program_state.panicking) {
-            freedynamicdata();
-            dlb_cleanup();
-        }
+    current_nle_ctx = nle;
+    nle->observation = obs;
+    obs->done = nle->done;
+    if (!nle->done)
+        rl_fill_obs(obs);
+}
+
+/*
+ * Writes the screen descriptions of n map cells, given as offsets into the
+ * glyphs observation, to out. Returns 0 if the map isn't shown.
+ */
+int
+nle_describe(nle_ctx_t *nle, int n, const int *cells, unsigned char *out)
+{
+    current_nle_ctx = nle;
+    return !nle->done && rl_describe(n, cells, out);
+}
+
+/*
+ * Writes the glyphs of level dlevel of dungeon dnum as of when it was last
+ * shown to out, like the glyphs observation. Returns 0 if it wasn't shown
+ * in this game.
+ */
+int
+nle_level_map(nle_ctx_t *nle, int dnum, int dlevel, short *out)
+{
+    current_nle_ctx = nle;
+    return !nle->done && rl_level_map(dnum, dlevel, out);
+}
+
+/*
+ * Ends the current game and releases its resources, but keeps nle
+ * and its stack around for nle_restart.
+ */
+void
+nle_finish(nle_ctx_t *nle)
+{
+    /* Free memory, etc. This is what nh_terminate in end.c does, except
+     * that in NLE it leaves this to us: A state saved before the game
+     * ended may still be restored until now. I hope it's enough. */
+    if (!program_state.panicking) {
+        freedynamicdata();
+        dlb_cleanup();
     }
+    rl_free_instance();
     nle_fflush(stdout);
 
-#ifdef NLE_BZ2_TTYRECS
-    if (nle->ttyrec) {
-        int bzerror;
-        BZ2_bzWriteClose(&bzerror, nle->ttyrec_bz2, 0, NULL, NULL);
-        assert(bzerror == BZ_OK);
+    if (nle->ttyrec_writer) {
+        nle_ttyrec_writer_close(nle->ttyrec_writer);
+        nle->ttyrec_writer = NULL;
     }
-#endif
 
-    tmt_close(nle->vterminal);
+    if (nle->vterminal) {
+        tmt_close(nle->vterminal);
+        nle->vterminal = NULL;
+    }
+}
 
+void
+nle_end(nle_ctx_t *nle)
+{
+    nle_finish(nle);
     destroy_fcontext_stack(&nle->stack);
-    free(nle);
+    nle_sys_free(nle);
+}
+
+/*
+ * Game state snapshots.
+ *
+ * A state consists of this library's writable data and heap (see
+ * nlealloc.c), the used part of the game's coroutine stack, parts of
+ * nle_ctx_t and the level files NetHack keeps on disk.
+ */
+
+#define NLE_MAX_SEGMENTS 8
+
+typedef struct nle_state_region {
+    char *addr;    /* Location in this library's memory. */
+    size_t size;
+    size_t offset; /* Of the copy, from the start of the state. */
+} nle_state_region;
+
+typedef struct nle_state_file {
+    int ledger;
+    size_t size;
+    size_t offset;
+} nle_state_file;
+
+struct nle_state {
+    size_t nregions;
+    nle_state_region regions[NLE_MAX_SEGMENTS + 2];
+    boolean has_ctx;
+    nle_ctx_t ctx;
+    int nfiles;
+    nle_state_file files[];
+};
+
+static boolean
+levelfile_exists(int ledger)
+{
+    /* Level 0 is the lock file, see delete_levelfile in files.c. */
+    return ledger == 0 || (level_info[ledger].flags & LFILE_EXISTS);
+}
+
+static const char *
+levelfile_path(int ledger)
+{
+    set_levelfile_name(lock, ledger);
+    return fqname(lock, LEVELPREFIX, 0);
+}
+
+static long
+levelfile_size(int ledger)
+{
+    FILE *f = fopen(levelfile_path(ledger), "rb");
+    long size = -1;
+    if (f) {
+        if (!fseek(f, 0, SEEK_END))
+            size = ftell(f);
+        fclose(f);
+    }
+    return size;
+}
+
+/*
+ * Returns a copy of the current game's state, or of this library's
+ * initial state if nle is NULL. The state is a single block from the
+ * process' malloc; callers release it with free().
+ * Returns NULL if not supported on this platform.
+ */
+nle_state_t *
+nle_save_state(nle_ctx_t *nle)
+{
+    char *addrs[NLE_MAX_SEGMENTS];
+    size_t sizes[NLE_MAX_SEGMENTS];
+    nle_state_region regions[NLE_MAX_SEGMENTS + 2];
+    char *arena_base, *arena_top;
+    int i, nregions, nfiles = 0;
+    long file_sizes[MAXLINFO];
+
+    nregions = nle_data_segments(addrs, sizes, NLE_MAX_SEGMENTS);
+    if (nregions < 0 || !nle_arena_used(&arena_base, &arena_top))
+        return NULL;
+    for (i = 0; i < nregions; ++i) {
+        regions[i].addr = addrs[i];
+        regions[i].size = sizes[i];
+    }
+    regions[nregions].addr = arena_base;
+    regions[nregions++].size = arena_top - arena_base;
+    if (nle) {
+        /* The suspended coroutine's stack pointer is its context. */
+        char *sp = (char *) nle->generatorcontext;
+        assert(sp > (char *) nle->stack.sptr - nle->stack.ssize
+               && sp <= (char *) nle->stack.sptr);
+        regions[nregions].addr = sp;
+        regions[nregions++].size = (char *) nle->stack.sptr - sp;
+
+        for (i = 0; i < MAXLINFO; ++i) {
+            file_sizes[i] = levelfile_exists(i) ? levelfile_size(i) : -1;
+            if (file_sizes[i] >= 0)
+                ++nfiles;
+        }
+    }
+
+    size_t size = sizeof(nle_state_t) + nfiles * sizeof(nle_state_file);
+    for (i = 0; i < nregions; ++i) {
+        regions[i].offset = size;
+        size += regions[i].size;
+    }
+    for (i = 0; nle && i < MAXLINFO; ++i) {
+        if (file_sizes[i] > 0)
+            size += file_sizes[i];
+    }
+
+    nle_state_t *state = nle_sys_malloc(size);
+    if (!state)
+        return NULL;
+    char *data = (char *) state;
+
+    state->nregions = nregions;
+    for (i = 0; i < nregions; ++i) {
+        state->regions[i] = regions[i];
+        memcpy(data + regions[i].offset, regions[i].addr, regions[i].size);
+    }
+
+    state->has_ctx = nle != NULL;
+    if (nle)
+        state->ctx = *nle;
+
+    state->nfiles = 0;
+    for (i = 0; nle && i < MAXLINFO; ++i) {
+        if (file_sizes[i] < 0)
+            continue;
+        nle_state_file *file = &state->files[state->nfiles++];
+        file->ledger = i;
+        file->size = file_sizes[i];
+        file->offset = size - file->size; /* Filled from the end. */
+        size = file->offset;
+
+        FILE *f = fopen(levelfile_path(i), "rb");
+        boolean ok = f && fread(data + file->offset, 1, file->size, f)
+                              == file->size;
+        if (f)
+            fclose(f);
+        if (!ok) {
+            fprintf(stderr, "nle_save_state: cannot read level file %d\n",
+                    i);
+            nle_sys_free(state);
+            return NULL;
+        }
+    }
+
+    return state;
+}
+
+/*
+ * Restores a state returned by nle_save_state. For a game's state, nle
+ * has to be the context it was saved from.
+ */
+void
+nle_restore_state(nle_ctx_t *nle, nle_state_t *state)
+{
+    const char *data = (const char *) state;
+    boolean existed[MAXLINFO];
+    int i;
+
+    assert(state->has_ctx == (nle != NULL));
+    assert(!nle || state->ctx.stack.sptr == nle->stack.sptr);
+    for (i = 0; nle && i < MAXLINFO; ++i) {
+        existed[i] = levelfile_exists(i);
+    }
+
+    for (i = 0; i < state->nregions; ++i) {
+        const nle_state_region *region = &state->regions[i];
+        memcpy(region->addr, data + region->offset, region->size);
+    }
+    /* The libraries' FILE positions weren't part of the state. */
+    dlb_forget_marks();
+
+    if (!nle)
+        return;
+
+    /* Things that outlive a game's state: Its stack and where it is
+     * called from, its recording and its observation. */
+    fcontext_stack_t stack = nle->stack;
+    fcontext_t returncontext = nle->returncontext;
+    FILE *ttyrec = nle->ttyrec;
+    nle_ttyrec_writer *ttyrec_writer = nle->ttyrec_writer;
+    nle_obs *observation = nle->observation;
+    *nle = state->ctx;
+    nle->stack = stack;
+    nle->returncontext = returncontext;
+    nle->ttyrec = ttyrec;
+    nle->ttyrec_writer = ttyrec_writer;
+    nle->observation = observation;
+
+    for (i = 0; i < state->nfiles; ++i) {
+        existed[state->files[i].ledger] = FALSE;
+    }
+    for (i = 0; i < MAXLINFO; ++i) {
+        if (existed[i])
+            (void) remove(levelfile_path(i));
+    }
+    for (i = 0; i < state->nfiles; ++i) {
+        const nle_state_file *file = &state->files[i];
+        FILE *f = fopen(levelfile_path(file->ledger), "wb");
+        if (!f || fwrite(data + file->offset, 1, file->size, f) != file->size)
+            fprintf(stderr, "nle_restore_state: cannot write level file %d\n",
+                    file->ledger);
+        if (f)
+            fclose(f);
+    }
 }
 
 #ifdef NLE_ALLOW_SEEDING
@@ -0,0 +1,444 @@
+/*
+ * Memory layout of libnethack.so for NLE's game state snapshots.
+ *
+ * On Linux, this replaces malloc, calloc, realloc, free and the aligned
+ * allocators aligned_alloc, posix_memalign and memalign within
+ * libnethack.so (the definitions are hidden, so they bind only to callers
+ * in this library, including the statically linked libstdc++ and its
+ * aligned operator new). All of NetHack's, the window
+ * ports' and libtmt's heap memory then lives in one contiguous arena
+ * whose used part can be copied and restored wholesale, see
+ * nle_save_state in nle.c.
+ *
+ * This file must not include stdlib.h, whose declarations of malloc
+ * would clash with the hidden definitions below.
+ */
+
+#define _GNU_SOURCE
+
+#if defined(__linux__) && !defined(__SANITIZE_ADDRESS__)
+#define NLE_ARENA
+#endif
+
+#include <dlfcn.h>
+#include <errno.h>
+#include <stddef.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <string.h>
+
+#ifdef NLE_ARENA
+#include <link.h>
+#include <sys/mman.h>
+#include <unistd.h>
+#endif
+
+extern void abort(void);
+
+#define NLE_HIDDEN __attribute__((visibility("hidden")))
+
+/* Memory outside of the arena, from the process' malloc. */
+static void *(*sys_malloc_fn)(size_t);
+static void (*sys_free_fn)(void *);
+static void *(*sys_realloc_fn)(void *, size_t);
+
+static void
+sys_init(void)
+{
+    if (sys_malloc_fn)
+        return;
+    sys_malloc_fn = (void *(*) (size_t)) dlsym(RTLD_DEFAULT, "malloc");
+    sys_free_fn = (void (*)(void *)) dlsym(RTLD_DEFAULT, "free");
+    sys_realloc_fn =
+        (void *(*) (void *, size_t)) dlsym(RTLD_DEFAULT, "realloc");
+    if (!sys_malloc_fn || !sys_free_fn || !sys_realloc_fn) {
+        fprintf(stderr, "nlealloc: cannot find the process' malloc\n");
+        abort();
+    }
+}
+
+void *
+nle_sys_malloc(size_t size)
+{
+    sys_init();
+    return sys_malloc_fn(size);
+}
+
+void
+nle_sys_free(void *ptr)
+{
+    sys_init();
+    sys_free_fn(ptr);
+}
+
+#ifdef NLE_ARENA
+
+#define ARENA_RESERVE ((size_t) 1 << 32)    /* Address space, 4GiB. */
+#define ARENA_COMMIT_STEP ((size_t) 1 << 20) /* Made read/writable, 1MiB. */
+#define MIN_CLASS 5 /* Smallest block: 32 bytes, including the header. */
+#define NUM_CLASSES 40
+
+/* Blocks are powers of two in size. Free blocks of each size form a
+ * singly linked list through their first payload word. */
+typedef struct block_header {
+    size_t cls;
+    size_t pad; /* Keeps the payload aligned. */
+} block_header;
+
+/* Payloads with a larger alignment lie within a block, after a second
+ * header of this class whose pad is their offset from the block's
+ * payload. */
+#define ALIGNED_CLASS NUM_CLASSES
+
+/* Lives in the library's data segment, so it is saved and restored along
+ * with the arena's contents. */
+static struct {
+    char *base;
+    char *end;
+    char *top;
+    char *committed;
+    int closed;
+    void *free_lists[NUM_CLASSES];
+} arena;
+
+static void
+arena_fail(const char *what, size_t size)
+{
+    fprintf(stderr, "nlealloc: %s failed for %zu bytes\n", what, size);
+    abort();
+}
+
+__attribute__((constructor)) static void
+arena_init(void)
+{
+    if (arena.base)
+        return;
+    sys_init();
+    /* Reserve address space only; it is committed as the arena grows. */
+    void *base = mmap(NULL, ARENA_RESERVE, PROT_NONE,
+                      MAP_PRIVATE | MAP_ANONYMOUS | MAP_NORESERVE, -1, 0);
+    if (base == MAP_FAILED)
+        arena_fail("mmap", ARENA_RESERVE);
+    arena.base = arena.top = arena.committed = base;
+    arena.end = arena.base + ARENA_RESERVE;
+}
+
+__attribute__((destructor)) static void
+arena_close(void)
+{
+    if (!arena.base || arena.closed)
+        return;
+    /* Keep base and end so late calls to free() still recognize our
+     * pointers. */
+    munmap(arena.base, ARENA_RESERVE);
+    arena.closed = 1;
+}
+
+static int
+in_arena(const void *ptr)
+{
+    return (const char *) ptr >= arena.base && (const char *) ptr < arena.end;
+}
+
+static size_t
+size_class(size_t size)
+{
+    size_t cls = MIN_CLASS;
+    size += sizeof(block_header);
+    if (size < sizeof(block_header)) /* Overflow. */
+        return NUM_CLASSES;
+    while (cls < NUM_CLASSES && ((size_t) 1 << cls) < size)
+        ++cls;
+    return cls;
+}
+
+static block_header *
+carve(size_t cls)
+{
+    size_t size = (size_t) 1 << cls;
+    if ((size_t) (arena.end - arena.top) < size)
+        return NULL;
+
+    char *top = arena.top + size;
+    if (top > arena.committed) {
+        size_t commit = (size_t) (top - arena.committed);
+        commit = (commit + ARENA_COMMIT_STEP - 1) & ~(ARENA_COMMIT_STEP - 1);
+        if ((size_t) (arena.end - arena.committed) < commit)
+            commit = arena.end - arena.committed;
+        if (mprotect(arena.committed, commit, PROT_READ | PROT_WRITE))
+            return NULL;
+        arena.committed += commit;
+    }
+
+    block_header *block = (block_header *) arena.top;
+    arena.top = top;
+    return block;
+}
+
+static void *
+arena_alloc(size_t size)
+{
+    if (!arena.base)
+        arena_init();
+    if (arena.closed)
+        return nle_sys_malloc(size);
+
+    size_t cls = size_class(size);
+    if (cls >= NUM_CLASSES)
+        return NULL;
+
+    block_header *block = arena.free_lists[cls];
+    if (block) {
+        arena.free_lists[cls] = *(void **) (block + 1);
+    } else {
+        block = carve(cls);
+        if (!block)
+            return NULL;
+    }
+    block->cls = cls;
+    return block + 1;
+}
+
+NLE_HIDDEN void *
+malloc(size_t size)
+{
+    return arena_alloc(size);
+}
+
+/* Returns the payload of the block that holds ptr, and the bytes from
+ * ptr to the end of the block in *capacity. */
+static void *
+block_payload(void *ptr, size_t *capacity)
+{
+    block_header *header = (block_header *) ptr - 1;
+    size_t offset = 0;
+    if (header->cls == ALIGNED_CLASS) {
+        offset = header->pad;
+        header = (block_header *) ((char *) ptr - offset) - 1;
+    }
+    *capacity = ((size_t) 1 << header->cls) - sizeof(block_header) - offset;
+    return header + 1;
+}
+
+NLE_HIDDEN void
+free(void *ptr)
+{
+    if (!ptr)
+        return;
+    if (!in_arena(ptr)) {
+        /* E.g. from strdup or other libc functions. */
+        nle_sys_free(ptr);
+        return;
+    }
+    if (arena.closed)
+        return;
+
+    size_t capacity;
+    ptr = block_payload(ptr, &capacity);
+    block_header *block = (block_header *) ptr - 1;
+    *(void **) ptr = arena.free_lists[block->cls];
+    arena.free_lists[block->cls] = block;
+}
+
+NLE_HIDDEN void *
+calloc(size_t n, size_t size)
+{
+    if (size && n > SIZE_MAX / size)
+        return NULL;
+    /* Not malloc: The compiler would turn this function into calloc. */
+    void *ptr = arena_alloc(n * size);
+    if (ptr)
+        memset(ptr, 0, n * size);
+    return ptr;
+}
+
+NLE_HIDDEN void *
+realloc(void *ptr, size_t size)
+{
+    if (!ptr)
+        return arena_alloc(size);
+    if (!in_arena(ptr)) {
+        sys_init();
+        return sys_realloc_fn(ptr, size);
+    }
+
+    size_t capacity;
+    block_payload(ptr, &capacity);
+    if (size <= capacity)
+        return ptr;
+
+    void *result = arena_alloc(size);
+    if (result) {
+        memcpy(result, ptr, capacity);
+        free(ptr);
+    }
+    return result;
+}
+
+static void *
+arena_aligned_alloc(size_t alignment, size_t size)
+{
+    if (!arena.base)
+        arena_init();
+    if (arena.closed) {
+        static void *(*sys_aligned_alloc_fn)(size_t, size_t);
+        if (!sys_aligned_alloc_fn)
+            sys_aligned_alloc_fn = (void *(*) (size_t, size_t)) dlsym(
+                RTLD_DEFAULT, "aligned_alloc");
+        return sys_aligned_alloc_fn(alignment, size);
+    }
+    if (alignment <= sizeof(block_header))
+        return arena_alloc(size);
+    if (size > SIZE_MAX - alignment - sizeof(block_header))
+        return NULL;
+    char *payload = arena_alloc(size + alignment + sizeof(block_header));
+    if (!payload)
+        return NULL;
+
+    /* Leave room for the second header. */
+    uintptr_t start = (uintptr_t) payload + sizeof(block_header);
+    uintptr_t mask = alignment - 1;
+    char *ptr = (char *) ((start + mask) & ~mask);
+    block_header *header = (block_header *) ptr - 1;
+    header->cls = ALIGNED_CLASS;
+    header->pad = ptr - payload;
+    return ptr;
+}
+
+static int
+valid_alignment(size_t alignment)
+{
+    return alignment && !(alignment & (alignment - 1));
+}
+
+NLE_HIDDEN void *
+aligned_alloc(size_t alignment, size_t size)
+{
+    if (!valid_alignment(alignment)) {
+        errno = EINVAL;
+        return NULL;
+    }
+    return arena_aligned_alloc(alignment, size);
+}
+
+NLE_HIDDEN void *
+memalign(size_t alignment, size_t size)
+{
+    return aligned_alloc(alignment, size);
+}
+
+NLE_HIDDEN int
+posix_memalign(void **memptr, size_t alignment, size_t size)
+{
+    if (!valid_alignment(alignment) || alignment % sizeof(void *))
+        return EINVAL;
+    void *ptr = arena_aligned_alloc(alignment, size);
+    if (!ptr)
+        return ENOMEM;
+    *memptr = ptr;
+    return 0;
+}
+
+/* Returns the used part of the arena. */
+int
+nle_arena_used(char **base, char **top)
+{
+    if (!arena.base || arena.closed)
+        return 0;
+    *base = arena.base;
+    *top = arena.top;
+    return 1;
+}
+
+typedef struct segments_query {
+    char **addrs;
+    size_t *sizes;
+    int max;
+    int n;
+} segments_query;
+
+static int
+add_segment(segments_query *query, char *start, char *end)
+{
+    if (start >= end)
+        return 0;
+    if (query->n == query->max)
+        return -1;
+    query->addrs[query->n] = start;
+    query->sizes[query->n] = end - start;
+    ++query->n;
+    return 0;
+}
+
+static int
+segments_callback(struct dl_phdr_info *info, size_t size, void *data)
+{
+    segments_query *query = data;
+    const char *self = (const char *) &arena;
+    int i, found = 0;
+
+    for (i = 0; i < info->dlpi_phnum && !found; ++i) {
+        const ElfW(Phdr) *phdr = &info->dlpi_phdr[i];
+        const char *start = (const char *) (info->dlpi_addr + phdr->p_vaddr);
+        found = phdr->p_type == PT_LOAD && self >= start
+                && self < start + phdr->p_memsz;
+    }
+    if (!found)
+        return 0; /* Not this library, continue. */
+
+    /* The dynamic linker makes the RELRO region read-only (page-wise)
+     * after relocation. It can neither be nor needs to be restored. */
+    char *relro_start = NULL, *relro_end = NULL;
+    uintptr_t pagemask = ~((uintptr_t) sysconf(_SC_PAGESIZE) - 1);
+    for (i = 0; i < info->dlpi_phnum; ++i) {
+        const ElfW(Phdr) *phdr = &info->dlpi_phdr[i];
+        if (phdr->p_type == PT_GNU_RELRO) {
+            uintptr_t start = info->dlpi_addr + phdr->p_vaddr;
+            relro_start = (char *) (start & pagemask);
+            relro_end = (char *) ((start + phdr->p_memsz) & pagemask);
+        }
+    }
+
+    for (i = 0; i < info->dlpi_phnum; ++i) {
+        const ElfW(Phdr) *phdr = &info->dlpi_phdr[i];
+        if (phdr->p_type != PT_LOAD || !(phdr->p_flags & PF_W))
+            continue;
+        char *start = (char *) (info->dlpi_addr + phdr->p_vaddr);
+        char *end = start + phdr->p_memsz;
+        if (relro_start && relro_start < end && relro_end > start) {
+            if (add_segment(query, start, relro_start)
+                || add_segment(query, relro_end, end))
+                return -1;
+        } else if (add_segment(query, start, end)) {
+            return -1;
+        }
+    }
+    return 1; /* Found, stop iterating. */
+}
+
+/* Finds the writable data (.data, .bss, ...) of this library. Returns
+ * the number of segments or -1. */
+int
+nle_data_segments(char **addrs, size_t *sizes, int max)
+{
+    segments_query query = { addrs, sizes, max, 0 };
+    if (dl_iterate_phdr(segments_callback, &query) != 1)
+        return -1;
+    return query.n;
+}
+
+#else /* !NLE_ARENA */
+
+int
+nle_arena_used(char **base, char **top)
+{
+    return 0;
+}
+
+int
+nle_data_segments(char **addrs, size_t *sizes, int max)
+{
+    return -1;
+}
+
+#endif /* NLE_ARENA */
@@ -0,0 +1,271 @@
+/*
+ * Direct rendering of the tty_* observations.
+ *
+ * Without a ttyrec, there's no need to encode win/tty's output as ANSI
+ * escape sequences only to decode them again with libtmt. Instead,
+ * printed characters come here via nle_putchar, and termcap.c reports
+ * what its control sequences would have done via the nle_tty_* functions
+ * below. The result is exactly what libtmt shows for the same output,
+ * including its quirks.
+ *
+ * nle_tty is part of nle_ctx_t, so it's saved and restored with the game.
+ */
+
+#include <string.h>
+
+#include "hack.h"
+
+#include "nle.h"
+
+#define TAB 8
+
+void
+nle_tty_init(nle_tty *tty)
+{
+    memset(tty->chars, ' ', sizeof(tty->chars));
+    memset(tty->colors, CLR_BLACK, sizeof(tty->colors));
+    memset(tty->dirty, 1, sizeof(tty->dirty));
+    tty->row = tty->col = 0;
+    tty->fg = -1;
+    tty->bold = tty->reverse = 0;
+}
+
+/* Blank cells have the default attributes, see vt_char_color_extract. */
+static void
+clear_row(nle_tty *tty, int row, int col)
+{
+    memset(&tty->chars[row][col], ' ', NLE_TERM_CO - col);
+    memset(&tty->colors[row][col], CLR_BLACK, NLE_TERM_CO - col);
+    tty->dirty[row] = 1;
+}
+
+static void
+scroll_up(nle_tty *tty)
+{
+    memmove(tty->chars[0], tty->chars[1],
+            (NLE_TERM_LI - 1) * sizeof(tty->chars[0]));
+    memmove(tty->colors[0], tty->colors[1],
+            (NLE_TERM_LI - 1) * sizeof(tty->colors[0]));
+    memset(tty->dirty, 1, sizeof(tty->dirty));
+    clear_row(tty, NLE_TERM_LI - 1, 0);
+}
+
+/* As vt_char_color_extract in nle.c. */
+static signed char
+cell_color(const nle_tty *tty, int c)
+{
+    signed char color;
+
+    if (tty->fg < 0)
+        color = (c == ' ') ? CLR_BLACK : CLR_GRAY;
+    else
+        color = tty->fg | (tty->bold ? BRIGHT : 0);
+    if (tty->reverse)
+        color += CLR_MAX;
+    return color;
+}
+
+/* Prints c like libtmt's tmt_write does. */
+void
+nle_tty_putc(nle_tty *tty, int c)
+{
+    switch (c) {
+    case '\0': /* Like libtmt, treat NUL like BEL. */
+    case '\007':
+    case '\016': /* Shift in/out (graph_on/off) don't change cells. */
+    case '\017':
+        return;
+    case '\b':
+        if (tty->col)
+            --tty->col;
+        return;
+    case '\t':
+        while (++tty->col < NLE_TERM_CO - 1 && tty->col % TAB)
+            continue;
+        return;
+    case '\n':
+        if (tty->row < NLE_TERM_LI - 1)
+            ++tty->row;
+        else
+            scroll_up(tty);
+        return;
+    case '\r':
+        tty->col = 0;
+        return;
+    case '\033': /* Control sequences go through termcap.c, not here. */
+        return;
+    }
+
+    tty->chars[tty->row][tty->col] = c;
+    tty->colors[tty->row][tty->col] = cell_color(tty, c);
+    tty->dirty[tty->row] = 1;
+    if (tty->col < NLE_TERM_CO - 1) {
+        ++tty->col;
+    } else {
+        tty->col = 0;
+        if (tty->row < NLE_TERM_LI - 1)
+            ++tty->row;
+        else
+            scroll_up(tty);
+    }
+}
+
+/* Copies the changed rows and the cursor to the tty_* observations. */
+void
+nle_tty_fill_obs(nle_tty *tty, nle_obs *obs)
+{
+    int r;
+
+    for (r = 0; r < NLE_TERM_LI; ++r) {
+        if (!tty->dirty[r])
+            continue;
+        if (obs->tty_chars)
+            memcpy(&obs->tty_chars[r * NLE_TERM_CO], tty->chars[r],
+                   NLE_TERM_CO);
+        if (obs->tty_colors)
+            memcpy(&obs->tty_colors[r * NLE_TERM_CO], tty->colors[r],
+                   NLE_TERM_CO);
+        tty->dirty[r] = 0;
+    }
+    if (obs->tty_cursor) {
+        obs->tty_cursor[0] = tty->row;
+        obs->tty_cursor[1] = tty->col;
+    }
+}
+
+/*
+ * Called by termcap.c. These act on the current game's terminal if it
+ * is rendered directly, i.e. its tty_* observations are requested and no
+ * ttyrec is written (which are rendered from the ANSI output by libtmt).
+ */
+
+static nle_tty *
+direct_tty(void)
+{
+    nle_ctx_t *nle = current_nle_ctx;
+    nle_obs *obs = nle->observation;
+
+    if (nle->ttyrec || !obs
+        || !(obs->tty_chars || obs->tty_colors || obs->tty_cursor))
+        return NULL;
+    return &nle->tty;
+}
+
+/* cmov, home. */
+void
+nle_tty_move(int x, int y)
+{
+    nle_tty *tty = direct_tty();
+    if (!tty)
+        return;
+    tty->row = (y < 0) ? 0 : min(y, NLE_TERM_LI - 1);
+    tty->col = (x < 0) ? 0 : min(x, NLE_TERM_CO - 1);
+}
+
+/* UP, XD, ND and BC, one step each. */
+void
+nle_tty_up(void)
+{
+    nle_tty *tty = direct_tty();
+    if (!tty)
+        return;
+    /* libtmt wraps around from the top row. */
+    tty->row = tty->row ? tty->row - 1 : NLE_TERM_LI - 1;
+}
+
+void
+nle_tty_down(void)
+{
+    nle_tty *tty = direct_tty();
+    if (tty && tty->row < NLE_TERM_LI - 1)
+        ++tty->row;
+}
+
+void
+nle_tty_right(void)
+{
+    nle_tty *tty = direct_tty();
+    if (tty && tty->col < NLE_TERM_CO - 1)
+        ++tty->col;
+}
+
+void
+nle_tty_left(void)
+{
+    nle_tty *tty = direct_tty();
+    if (tty && tty->col)
+        --tty->col;
+}
+
+/* CE. */
+void
+nle_tty_clear_eol(void)
+{
+    nle_tty *tty = direct_tty();
+    if (tty)
+        clear_row(tty, tty->row, tty->col);
+}
+
+/* CL. Doesn't move the cursor. */
+void
+nle_tty_clear_screen(void)
+{
+    nle_tty *tty = direct_tty();
+    int r;
+
+    if (!tty)
+        return;
+    for (r = 0; r < NLE_TERM_LI; ++r)
+        clear_row(tty, r, 0);
+}
+
+/* SO and nh_HI. */
+void
+nle_tty_bold(void)
+{
+    nle_tty *tty = direct_tty();
+    if (tty)
+        tty->bold = 1;
+}
+
+/* MR. */
+void
+nle_tty_reverse(void)
+{
+    nle_tty *tty = direct_tty();
+    if (tty)
+        tty->reverse = 1;
+}
+
+/* ME, and SE, nh_HE, nh_UE and TI, which are the same. */
+void
+nle_tty_reset(void)
+{
+    nle_tty *tty = direct_tty();
+    if (!tty)
+        return;
+    tty->fg = -1;
+    tty->bold = tty->reverse = 0;
+}
+
+/*
+ * hilites[color], as set up by init_hilite in termcap.c: Gray is the
+ * default, bright colors add bold, other colors reset all attributes.
+ * Black is blue unless it's dark gray (bright black).
+ */
+void
+nle_tty_color(int color, int darkgray)
+{
+    nle_tty *tty = direct_tty();
+    if (!tty || color == CLR_GRAY || color == NO_COLOR)
+        return;
+
+    if (color == CLR_BLACK)
+        color = darkgray ? (CLR_BLACK | BRIGHT) : CLR_BLUE;
+    if (color & BRIGHT) {
+        tty->bold = 1;
+    } else {
+        tty->bold = tty->reverse = 0;
+    }
+    tty->fg = color & ~BRIGHT;
+}
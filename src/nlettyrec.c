@@ -0,0 +1,319 @@
+/*
+ * Asynchronous ttyrec output.
+ *
+ * The game thread appends its ttyrec data to a ring of fixed-size chunks.
+ * Full chunks are compressed and written to the file by a background
+ * thread, one per recorded game. If that thread falls behind, the game
+ * blocks until a chunk is free again; memory use is bounded by the ring.
+ *
+ * All memory, including the compressor's, is outside of libnethack.so's
+ * arena (see nlealloc.c): The writer outlives the game states that
+ * nle_restore_state rewinds, and runs concurrently with it.
+ */
+
+#include <pthread.h>
+#include <string.h>
+
+#include <bzlib.h>
+#include <zlib.h>
+#ifdef NLE_ZSTD_TTYRECS
+#include <zstd.h>
+#endif
+
+#include "nleobs.h"
+#include "nlettyrec.h"
+
+extern void *nle_sys_malloc(size_t);
+extern void nle_sys_free(void *);
+
+#define TTYREC_CHUNK_SIZE ((size_t) 1 << 15)
+#define TTYREC_NUM_CHUNKS 8
+
+typedef struct ttyrec_chunk {
+    char data[TTYREC_CHUNK_SIZE];
+    size_t size;
+} ttyrec_chunk;
+
+struct nle_ttyrec_writer {
+    FILE *file;
+    int codec;
+    BZFILE *bz2;
+    z_stream gzip;
+#ifdef NLE_ZSTD_TTYRECS
+    ZSTD_CStream *zstd;
+#endif
+    char *out;  /* Compressed output for gzip and zstd. */
+    int failed; /* Only accessed by whoever writes to the file. */
+
+    pthread_t thread;
+    int threaded;
+    pthread_mutex_t mutex;
+    pthread_cond_t ready; /* A chunk was queued, or closing was set. */
+    pthread_cond_t space; /* A chunk was written. */
+
+    /* Chunks head, ..., head + queued - 1 (modulo TTYREC_NUM_CHUNKS) are
+     * queued for writing, tail is filled by the game. */
+    int head;
+    int queued;
+    int tail;
+    int closing;
+    ttyrec_chunk *chunks[TTYREC_NUM_CHUNKS];
+};
+
+/*
+ * Compression. Each function returns whether it succeeded.
+ */
+
+static int
+write_out(nle_ttyrec_writer *writer, size_t size)
+{
+    return fwrite(writer->out, 1, size, writer->file) == size;
+}
+
+static int
+codec_open(nle_ttyrec_writer *writer)
+{
+    int bzerror;
+
+    switch (writer->codec) {
+    case NLE_TTYREC_BZ2:
+        writer->bz2 = BZ2_bzWriteOpen(&bzerror, writer->file, 9, 0, 0);
+        return bzerror == BZ_OK;
+    case NLE_TTYREC_RAW:
+        return 1;
+    case NLE_TTYREC_GZIP:
+        writer->out = nle_sys_malloc(TTYREC_CHUNK_SIZE);
+        /* 16: Write a gzip header. */
+        return deflateInit2(&writer->gzip, Z_DEFAULT_COMPRESSION, Z_DEFLATED,
+                            15 + 16, 8, Z_DEFAULT_STRATEGY)
+               == Z_OK;
+#ifdef NLE_ZSTD_TTYRECS
+    case NLE_TTYREC_ZSTD:
+        writer->out = nle_sys_malloc(TTYREC_CHUNK_SIZE);
+        writer->zstd = ZSTD_createCStream();
+        return writer->zstd
+               && !ZSTD_isError(ZSTD_CCtx_setParameter(
+                   writer->zstd, ZSTD_c_compressionLevel, 3));
+#endif
+    }
+    fprintf(stderr, "nle: unknown ttyrec codec %d\n", writer->codec);
+    return 0;
+}
+
+static int
+gzip_deflate(nle_ttyrec_writer *writer, int flush)
+{
+    int ret;
+    do {
+        writer->gzip.next_out = (Bytef *) writer->out;
+        writer->gzip.avail_out = TTYREC_CHUNK_SIZE;
+        ret = deflate(&writer->gzip, flush);
+        if (ret == Z_STREAM_ERROR
+            || !write_out(writer,
+                          TTYREC_CHUNK_SIZE - writer->gzip.avail_out))
+            return 0;
+    } while (flush == Z_FINISH ? ret != Z_STREAM_END
+                               : !writer->gzip.avail_out);
+    return 1;
+}
+
+#ifdef NLE_ZSTD_TTYRECS
+static int
+zstd_compress(nle_ttyrec_writer *writer, ZSTD_inBuffer *in,
+              ZSTD_EndDirective mode)
+{
+    size_t remaining;
+    do {
+        ZSTD_outBuffer out = { writer->out, TTYREC_CHUNK_SIZE, 0 };
+        remaining = ZSTD_compressStream2(writer->zstd, &out, in, mode);
+        if (ZSTD_isError(remaining) || !write_out(writer, out.pos))
+            return 0;
+    } while (mode == ZSTD_e_end ? remaining : in->pos < in->size);
+    return 1;
+}
+#endif
+
+static int
+codec_write(nle_ttyrec_writer *writer, char *data, size_t size)
+{
+    int bzerror;
+
+    switch (writer->codec) {
+    case NLE_TTYREC_BZ2:
+        BZ2_bzWrite(&bzerror, writer->bz2, data, size);
+        return bzerror == BZ_OK;
+    case NLE_TTYREC_RAW:
+        return fwrite(data, 1, size, writer->file) == size;
+    case NLE_TTYREC_GZIP:
+        writer->gzip.next_in = (Bytef *) data;
+        writer->gzip.avail_in = size;
+        return gzip_deflate(writer, Z_NO_FLUSH);
+#ifdef NLE_ZSTD_TTYRECS
+    case NLE_TTYREC_ZSTD: {
+        ZSTD_inBuffer in = { data, size, 0 };
+        return zstd_compress(writer, &in, ZSTD_e_continue);
+    }
+#endif
+    }
+    return 0;
+}
+
+/* Finishes the compressed stream and frees the codec's resources. */
+static void
+codec_close(nle_ttyrec_writer *writer)
+{
+    int bzerror;
+
+    switch (writer->codec) {
+    case NLE_TTYREC_BZ2:
+        BZ2_bzWriteClose(&bzerror, writer->bz2, writer->failed, NULL, NULL);
+        break;
+    case NLE_TTYREC_GZIP:
+        if (!writer->failed)
+            gzip_deflate(writer, Z_FINISH);
+        deflateEnd(&writer->gzip);
+        break;
+#ifdef NLE_ZSTD_TTYRECS
+    case NLE_TTYREC_ZSTD:
+        if (!writer->failed) {
+            ZSTD_inBuffer in = { NULL, 0, 0 };
+            zstd_compress(writer, &in, ZSTD_e_end);
+        }
+        ZSTD_freeCStream(writer->zstd);
+        break;
+#endif
+    }
+    nle_sys_free(writer->out);
+}
+
+static void
+write_chunk(nle_ttyrec_writer *writer, ttyrec_chunk *chunk)
+{
+    if (writer->failed || !chunk->size)
+        return;
+    writer->failed = !codec_write(writer, chunk->data, chunk->size);
+    if (writer->failed)
+        fprintf(stderr, "nle: cannot write ttyrec, dropping its remainder\n");
+}
+
+static void *
+writer_loop(void *arg)
+{
+    nle_ttyrec_writer *writer = arg;
+
+    pthread_mutex_lock(&writer->mutex);
+    for (;;) {
+        while (!writer->queued && !writer->closing)
+            pthread_cond_wait(&writer->ready, &writer->mutex);
+        if (!writer->queued)
+            break; /* Closing, and all written. */
+
+        ttyrec_chunk *chunk = writer->chunks[writer->head];
+        pthread_mutex_unlock(&writer->mutex);
+        write_chunk(writer, chunk);
+        pthread_mutex_lock(&writer->mutex);
+
+        writer->head = (writer->head + 1) % TTYREC_NUM_CHUNKS;
+        --writer->queued;
+        pthread_cond_signal(&writer->space);
+    }
+    pthread_mutex_unlock(&writer->mutex);
+    return NULL;
+}
+
+/* Hands the tail chunk to the writer thread and waits for a free one. */
+static void
+submit_chunk(nle_ttyrec_writer *writer)
+{
+    if (!writer->threaded) {
+        write_chunk(writer, writer->chunks[writer->tail]);
+        writer->chunks[writer->tail]->size = 0;
+        return;
+    }
+
+    pthread_mutex_lock(&writer->mutex);
+    ++writer->queued;
+    pthread_cond_signal(&writer->ready);
+    while (writer->queued == TTYREC_NUM_CHUNKS)
+        pthread_cond_wait(&writer->space, &writer->mutex);
+    pthread_mutex_unlock(&writer->mutex);
+
+    writer->tail = (writer->tail + 1) % TTYREC_NUM_CHUNKS;
+    writer->chunks[writer->tail]->size = 0;
+}
+
+nle_ttyrec_writer *
+nle_ttyrec_writer_open(FILE *file, int codec)
+{
+    nle_ttyrec_writer *writer = nle_sys_malloc(sizeof(nle_ttyrec_writer));
+    int i;
+
+    memset(writer, 0, sizeof(*writer));
+    writer->file = file;
+    writer->codec = codec;
+    writer->failed = !codec_open(writer);
+    for (i = 0; i < TTYREC_NUM_CHUNKS; ++i) {
+        writer->chunks[i] = nle_sys_malloc(sizeof(ttyrec_chunk));
+        writer->chunks[i]->size = 0;
+    }
+
+    pthread_mutex_init(&writer->mutex, NULL);
+    pthread_cond_init(&writer->ready, NULL);
+    pthread_cond_init(&writer->space, NULL);
+    /* Without a thread, chunks are written synchronously. */
+    writer->threaded =
+        !pthread_create(&writer->thread, NULL, writer_loop, writer);
+    return writer;
+}
+
+void
+nle_ttyrec_writer_write(nle_ttyrec_writer *writer, const void *buf,
+                        size_t length)
+{
+    const char *data = buf;
+    while (length) {
+        ttyrec_chunk *chunk = writer->chunks[writer->tail];
+        size_t n = TTYREC_CHUNK_SIZE - chunk->size;
+        if (n > length)
+            n = length;
+        memcpy(chunk->data + chunk->size, data, n);
+        chunk->size += n;
+        data += n;
+        length -= n;
+        if (chunk->size == TTYREC_CHUNK_SIZE)
+            submit_chunk(writer);
+    }
+}
+
+/*
+ * Writes out everything and frees the writer, but leaves the file open.
+ * Takes as long as writing at most TTYREC_NUM_CHUNKS chunks.
+ */
+void
+nle_ttyrec_writer_close(nle_ttyrec_writer *writer)
+{
+    int i;
+
+    if (writer->threaded) {
+        pthread_mutex_lock(&writer->mutex);
+        if (writer->chunks[writer->tail]->size)
+            ++writer->queued; /* There's always room for this one. */
+        writer->closing = 1;
+        pthread_cond_signal(&writer->ready);
+        pthread_mutex_unlock(&writer->mutex);
+        pthread_join(writer->thread, NULL);
+    } else {
+        write_chunk(writer, writer->chunks[writer->tail]);
+    }
+
+    codec_close(writer);
+    fflush(writer->file);
+
+    pthread_cond_destroy(&writer->space);
+    pthread_cond_destroy(&writer->ready);
+    pthread_mutex_destroy(&writer->mutex);
+    for (i = 0; i < TTYREC_NUM_CHUNKS; ++i) {
+        nle_sys_free(writer->chunks[i]);
+    }
+    nle_sys_free(writer);
+}
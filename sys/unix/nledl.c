@@ -6,9 +6,42 @@
 
 #include "nledl.h"
 
+/* nle_ctx is NULL for the library's initial state. */
+static void *
+nledl_save_state(nledl_ctx *nledl, void *nle_ctx)
+{
+    void *(*save_state)(void *);
+
+    save_state = dlsym(nledl->dlhandle, "nle_save_state");
+
+    char *error = dlerror();
+    if (error != NULL) {
+        fprintf(stderr, "%s\n", error);
+        exit(EXIT_FAILURE);
+    }
+
+    return save_state(nle_ctx);
+}
+
+static void
+nledl_restore_state(nledl_ctx *nledl, void *nle_ctx, void *state)
+{
+    void (*restore_state)(void *, void *);
+
+    restore_state = dlsym(nledl->dlhandle, "nle_restore_state");
+
+    char *error = dlerror();
+    if (error != NULL) {
+        fprintf(stderr, "%s\n", error);
+        exit(EXIT_FAILURE);
+    }
+
+    restore_state(nle_ctx, state);
+}
+
 void
 nledl_init(nledl_ctx *nledl, nle_obs *obs, nle_seeds_init_t *seed_init,
-           nle_settings *settings)
+           nle_settings *settings, char fast_reset)
 {
     void *handle = dlopen(nledl->dlpath, RTLD_LAZY | RTLD_NOLOAD);
     if (handle) {
@@ -28,6 +61,11 @@ nledl_init(nledl_ctx *nledl, nle_obs *obs, nle_seeds_init_t *seed_init,
 
     dlerror(); /* Clear any existing error */
 
+    if (fast_reset) {
+        /* NULL if not supported, then resets reload the library. */
+        nledl->snapshot = nledl_save_state(nledl, NULL);
+    }
+
     void *(*start)(nle_obs *, FILE *, nle_seeds_init_t *, nle_settings *);
     start = dlsym(nledl->dlhandle, "nle_start");
     nledl->nle_ctx = start(obs, nledl->ttyrec, seed_init, settings);
@@ -63,16 +101,20 @@ nledl_close(nledl_ctx *nledl)
     dlerror();
 }
 
+/* If fast_reset is set, nle_reset will re-initialize the library in place
+ * from a snapshot of its data instead of reloading it (Linux only). */
 nledl_ctx *
 nle_start(const char *dlpath, nle_obs *obs, FILE *ttyrec,
-          nle_seeds_init_t *seed_init, nle_settings *settings)
+          nle_seeds_init_t *seed_init, nle_settings *settings,
+          char fast_reset)
 {
     /* TODO: Consider getting ttyrec path from caller? */
     struct nledl_ctx *nledl = malloc(sizeof(struct nledl_ctx));
     nledl->ttyrec = ttyrec;
     strncpy(nledl->dlpath, dlpath, sizeof(nledl->dlpath));
+    nledl->snapshot = NULL;
 
-    nledl_init(nledl, obs, seed_init, settings);
+    nledl_init(nledl, obs, seed_init, settings, fast_reset);
     return nledl;
 };
 
@@ -89,26 +131,55 @@ nle_step(nledl_ctx *nledl, nle_obs *obs)
     return nledl;
 }
 
-/* TODO: For a standard reset, we don't need the full close in nle.c.
- * E.g., we could re-use the stack buffer and the nledl_ctx. */
+/* Re-uses the loaded library, the nle_ctx and its stack. */
+static void
+nledl_fast_reset(nledl_ctx *nledl, nle_obs *obs, nle_seeds_init_t *seed_init,
+                 nle_settings *settings)
+{
+    void (*finish)(void *);
+    void *(*restart)(void *, nle_obs *, FILE *, nle_seeds_init_t *,
+                     nle_settings *);
+
+    finish = dlsym(nledl->dlhandle, "nle_finish");
+    restart = dlsym(nledl->dlhandle, "nle_restart");
+
+    char *error = dlerror();
+    if (error != NULL) {
+        fprintf(stderr, "%s\n", error);
+        exit(EXIT_FAILURE);
+    }
+
+    finish(nledl->nle_ctx);
+    nledl_restore_state(nledl, NULL, nledl->snapshot);
+    nledl->nle_ctx =
+        restart(nledl->nle_ctx, obs, nledl->ttyrec, seed_init, settings);
+}
+
 void
 nle_reset(nledl_ctx *nledl, nle_obs *obs, FILE *ttyrec,
           nle_seeds_init_t *seed_init, nle_settings *settings)
 {
-    nledl_close(nledl);
     /* Reset file only if not-NULL. */
     if (ttyrec)
         nledl->ttyrec = ttyrec;
 
+    if (nledl->snapshot) {
+        nledl_fast_reset(nledl, obs, seed_init, settings);
+        return;
+    }
+
+    nledl_close(nledl);
+
     // TODO: Consider refactoring nledl.h such that we expose this init
     // function but drop reset.
-    nledl_init(nledl, obs, seed_init, settings);
+    nledl_init(nledl, obs, seed_init, settings, 0);
 }
 
 void
 nle_end(nledl_ctx *nledl)
 {
     nledl_close(nledl);
+    free(nledl->snapshot);
     free(nledl);
 }
 
@@ -150,3 +221,63 @@ nle_get_seed(nledl_ctx *nledl, unsigned long *core, unsigned long *disp,
     get_seed(nledl->nle_ctx, core, disp, reseed);
 }
 #endif
+
+void *
+nle_save_state(nledl_ctx *nledl)
+{
+    return nledl_save_state(nledl, nledl->nle_ctx);
+}
+
+void
+nle_restore_state(nledl_ctx *nledl, void *state)
+{
+    nledl_restore_state(nledl, nledl->nle_ctx, state);
+}
+
+void
+nle_fill_obs(nledl_ctx *nledl, nle_obs *obs)
+{
+    void (*fill_obs)(void *, nle_obs *);
+
+    fill_obs = dlsym(nledl->dlhandle, "nle_fill_obs");
+
+    char *error = dlerror();
+    if (error != NULL) {
+        fprintf(stderr, "%s\n", error);
+        exit(EXIT_FAILURE);
+    }
+
+    fill_obs(nledl->nle_ctx, obs);
+}
+
+int
+nle_describe(nledl_ctx *nledl, int n, const int *cells, unsigned char *out)
+{
+    int (*describe)(void *, int, const int *, unsigned char *);
+
+    describe = dlsym(nledl->dlhandle, "nle_describe");
+
+    char *error = dlerror();
+    if (error != NULL) {
+        fprintf(stderr, "%s\n", error);
+        exit(EXIT_FAILURE);
+    }
+
+    return describe(nledl->nle_ctx, n, cells, out);
+}
+
+int
+nle_level_map(nledl_ctx *nledl, int dnum, int dlevel, short *out)
+{
+    int (*level_map)(void *, int, int, short *);
+
+    level_map = dlsym(nledl->dlhandle, "nle_level_map");
+
+    char *error = dlerror();
+    if (error != NULL) {
+        fprintf(stderr, "%s\n", error);
+        exit(EXIT_FAILURE);
+    }
+
+    return level_map(nledl->nle_ctx, dnum, dlevel, out);
+}
@@ -119,7 +119,7 @@ main(int argc, char **argv)
 
     ScopedTC tc;
     nledl_ctx *nle =
-        nle_start("libnethack.so", &obs, ttyrec.get(), nullptr, &settings);
+        nle_start("libnethack.so", &obs, ttyrec.get(), nullptr, &settings, 0);
     if (argc > 1 && argv[1][0] == 'r') {
         randgame(nle, &obs, 3, &settings);
     } else {
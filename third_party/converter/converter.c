@@ -20,6 +20,10 @@
 #include <string.h>
 #include <sys/time.h>
 #include <unistd.h>
+#include <zlib.h>
+#ifdef NLE_ZSTD_TTYRECS
+#include <zstd.h>
+#endif
 
 #include "stripgfx.h"
 #include "tmt.h"
@@ -118,14 +122,468 @@ vt_char_color_extract(TMTCHAR *c)
 }
 
 
-int read_header(BZFILE *bfp, Header *h, size_t version) {
-  int buf[3];
+/*
+ * Ttyrec input, possibly compressed. Reading stops at the end of the first
+ * compressed stream, even if more were appended to the file.
+ */
+#define STREAM_IN_SIZE (1 << 16)
+
+typedef struct Bz2Blocks Bz2Blocks;
+
+typedef struct Stream {
+  int codec;
+  FILE *f;
+  BZFILE *bz2;
+  z_stream gzip;
+#ifdef NLE_ZSTD_TTYRECS
+  ZSTD_DStream *zstd;
+  ZSTD_inBuffer zstd_in;
+#endif
+  unsigned char *in; /* Compressed input for gzip and zstd. */
+  int ended;         /* The compressed stream ended. */
+  int has_peek;
+  char peek;         /* See stream_read. */
+  Bz2Blocks *blocks; /* If set, bz2 is read block by block, see below. */
+  int64_t decoded;   /* Number of bytes decompressed, including the peek. */
+} Stream;
+
+/*
+ * Seekable bz2. A bz2 stream is a header ("BZh" and the block size) and a
+ * sequence of blocks, each starting with a 48 bit magic number, followed by
+ * another magic number and the combined CRC of the blocks. Blocks start at
+ * bit, not byte, offsets, but are independent of each other: We decompress
+ * each block as a stream of its own, with a copy of the header and an end
+ * (the combined CRC of a single block is its CRC), and so can resume
+ * reading at any block.
+ */
+#define BZ2_BLOCK_MAGIC 0x314159265359ULL
+#define BZ2_END_MAGIC 0x177245385090ULL
+#define BZ2_MAGIC_MASK 0xffffffffffffULL
+#define BZ2_HEADER_BITS 32
+
+struct Bz2Blocks {
+  char header[4];       /* "BZh" and the block size of the stream. */
+  bz_stream bz;
+  int bz_open;          /* Decompressing the current block. */
+  int64_t block_bit;    /* Bit offset of the current block in the file. */
+  int64_t block_offset; /* Decompressed offset of the current block. */
+  int64_t next_bit;     /* Bit offset of the next block, -1 at the end. */
+  int defer_end;        /* See blocks_start. */
+  unsigned char *buf;   /* The current block as a stream. */
+  size_t buf_size;
+  size_t nbits;         /* Number of bits in buf. */
+};
+
+typedef struct BitReader {
+  FILE *f;
+  int byte;
+  int avail; /* Unread bits of byte. */
+} BitReader;
+
+/* Returns the next bit, or -1 at the end of the file. */
+static int bits_get(BitReader *r) {
+  if (!r->avail) {
+    r->byte = fgetc(r->f);
+    if (r->byte == EOF) return -1;
+    r->avail = 8;
+  }
+  return (r->byte >> --r->avail) & 1;
+}
+
+/* Appends the lowest n bits to buf. Returns 0, or -1 on failure. */
+static int blocks_put(Bz2Blocks *b, uint64_t bits, int n) {
+  for (int i = n - 1; i >= 0; --i) {
+    if (b->nbits / 8 >= b->buf_size) {
+      size_t size = b->buf_size ? 2 * b->buf_size : STREAM_IN_SIZE;
+      unsigned char *buf = realloc(b->buf, size);
+      if (!buf) return -1;
+      b->buf = buf;
+      b->buf_size = size;
+    }
+    unsigned char mask = 0x80 >> (b->nbits % 8);
+    if ((bits >> i) & 1)
+      b->buf[b->nbits / 8] |= mask;
+    else
+      b->buf[b->nbits / 8] &= ~mask;
+    ++b->nbits;
+  }
+  return 0;
+}
+
+/* Starts decompressing the block at next_bit, finding the one after it.
+ * Returns 0, or -1 on failure. */
+static int blocks_start(Bz2Blocks *b, FILE *f) {
+  int64_t bit = b->next_bit;
+  BitReader r = {f, 0, 0};
+  if (fseek(f, bit / 8, SEEK_SET)) return -1;
+  for (int i = 0; i < bit % 8; ++i)
+    if (bits_get(&r) < 0) return -1;
+
+  uint64_t magic = 0;
+  for (int i = 0; i < 48; ++i) {
+    int x = bits_get(&r);
+    if (x < 0) return -1;
+    magic = magic << 1 | x;
+  }
+  if (magic == BZ2_END_MAGIC) {
+    b->next_bit = -1; /* No (more) blocks. */
+    return 0;
+  }
+  if (magic != BZ2_BLOCK_MAGIC) return -1;
+
+  uint64_t crc = 0;
+  for (int i = 0; i < 32; ++i) {
+    int x = bits_get(&r);
+    if (x < 0) return -1;
+    crc = crc << 1 | x;
+  }
+
+  b->nbits = 0;
+  for (int i = 0; i < 4; ++i)
+    if (blocks_put(b, (unsigned char)b->header[i], 8)) return -1;
+  if (blocks_put(b, magic, 48) || blocks_put(b, crc, 32)) return -1;
+
+  /* The block ends at the next magic number. */
+  int64_t end = bit + 80;
+  uint64_t reg = 0;
+  for (int n = 1;; ++n, ++end) {
+    int x = bits_get(&r);
+    if (x < 0) return -1;
+    if (blocks_put(b, x, 1)) return -1;
+    reg = (reg << 1 | x) & BZ2_MAGIC_MASK;
+    if (n >= 48 && (reg == BZ2_BLOCK_MAGIC || reg == BZ2_END_MAGIC)) break;
+  }
+  b->nbits -= 48;
+  b->next_bit = reg == BZ2_END_MAGIC ? -1 : end + 1 - 48;
+
+  /* BZ2_bzRead reads the file BZ_MAX_UNUSED bytes at a time, and reports
+   * the end already with the last data of the stream only if the end (of
+   * 80 bits) is in the same chunk of the file, or the data ends a chunk. */
+  int64_t last = (end - 48) / 8; /* Bytes of the last data and the end. */
+  int64_t eos = (end + 80 - 48) / 8;
+  b->defer_end = reg == BZ2_END_MAGIC &&
+                 last / BZ_MAX_UNUSED != eos / BZ_MAX_UNUSED &&
+                 (last + 1) % BZ_MAX_UNUSED != 0;
+
+  if (blocks_put(b, BZ2_END_MAGIC, 48) || blocks_put(b, crc, 32)) return -1;
+  while (b->nbits % 8)
+    if (blocks_put(b, 0, 1)) return -1;
+
+  memset(&b->bz, 0, sizeof(b->bz));
+  if (BZ2_bzDecompressInit(&b->bz, 0, 0) != BZ_OK) return -1;
+  b->bz.next_in = (char *)b->buf;
+  b->bz.avail_in = b->nbits / 8;
+  b->bz_open = 1;
+  b->block_bit = bit;
+  return 0;
+}
+
+/* Like stream_read_some. */
+static long blocks_read_some(Stream *s, char *buf, size_t len) {
+  Bz2Blocks *b = s->blocks;
+  size_t got = 0;
+  if (!b->bz_open) s->ended = 1;
+  while (b->bz_open && got < len) {
+    b->bz.next_out = buf + got;
+    b->bz.avail_out = len - got;
+    unsigned int avail_in = b->bz.avail_in;
+    int ret = BZ2_bzDecompress(&b->bz);
+    if (ret == BZ_OK && b->bz.avail_out == len - got &&
+        b->bz.avail_in == avail_in)
+      return -1; /* No progress: The block is truncated. */
+    got = len - b->bz.avail_out;
+    if (ret == BZ_STREAM_END) {
+      b->block_offset +=
+          (int64_t)b->bz.total_out_hi32 << 32 | b->bz.total_out_lo32;
+      BZ2_bzDecompressEnd(&b->bz);
+      b->bz_open = 0;
+      /* Start the next block right away, so that the current block always
+       * holds the next byte. */
+      if (b->next_bit >= 0 && blocks_start(b, s->f)) return -1;
+      s->ended = !b->bz_open && !b->defer_end;
+    } else if (ret != BZ_OK) {
+      return -1;
+    }
+  }
+  return got;
+}
+
+int conversion_codec_from_filename(const char *filename) {
+  size_t len = strlen(filename);
+#define ENDSWITH(suffix) \
+  (len >= sizeof(suffix) - 1 && \
+   !strcmp(filename + len - sizeof(suffix) + 1, suffix))
+  if (ENDSWITH(".bz2")) return CONV_CODEC_BZ2;
+  if (ENDSWITH(".gz")) return CONV_CODEC_GZIP;
+  if (ENDSWITH(".zst")) {
+#ifdef NLE_ZSTD_TTYRECS
+    return CONV_CODEC_ZSTD;
+#else
+    return -1;
+#endif
+  }
+  return CONV_CODEC_RAW;
+#undef ENDSWITH
+}
+
+static Stream *stream_open(FILE *f, int codec) {
+  Stream *s = calloc(1, sizeof(Stream));
+  if (!s) return NULL;
+  s->codec = codec;
+  s->f = f;
+
+  int ok;
   int bzerror;
-  BZ2_bzRead(&bzerror, bfp, buf, sizeof(int) * 3);
-  if (bzerror != BZ_OK) {
-    /* This could be BZ_STREAM_END, the logical end of a stream.
-       We still stop in that case. */
+  switch (codec) {
+  case CONV_CODEC_BZ2:
+    s->bz2 = BZ2_bzReadOpen(&bzerror, f, 0, 0, NULL, 0);
+    ok = bzerror == BZ_OK;
+    break;
+  case CONV_CODEC_RAW:
+    ok = 1;
+    break;
+  case CONV_CODEC_GZIP:
+    s->in = malloc(STREAM_IN_SIZE);
+    /* 16: gzip header. */
+    ok = s->in && inflateInit2(&s->gzip, 15 + 16) == Z_OK;
+    break;
+#ifdef NLE_ZSTD_TTYRECS
+  case CONV_CODEC_ZSTD:
+    s->in = malloc(STREAM_IN_SIZE);
+    s->zstd = ZSTD_createDStream();
+    s->zstd_in = (ZSTD_inBuffer){s->in, 0, 0};
+    ok = s->in && s->zstd;
+    break;
+#endif
+  default:
+    ok = 0;
+  }
+  if (!ok) {
+#ifdef NLE_ZSTD_TTYRECS
+    ZSTD_freeDStream(s->zstd);
+#endif
+    free(s->in);
+    free(s);
+    return NULL;
+  }
+  return s;
+}
+
+static void stream_close(Stream *s) {
+  int bzerror;
+  if (s->blocks) {
+    if (s->blocks->bz_open) BZ2_bzDecompressEnd(&s->blocks->bz);
+    free(s->blocks->buf);
+    free(s->blocks);
+    free(s);
+    return;
+  }
+  switch (s->codec) {
+  case CONV_CODEC_BZ2:
+    BZ2_bzReadClose(&bzerror, s->bz2);
+    break;
+  case CONV_CODEC_GZIP:
+    inflateEnd(&s->gzip);
+    break;
+#ifdef NLE_ZSTD_TTYRECS
+  case CONV_CODEC_ZSTD:
+    ZSTD_freeDStream(s->zstd);
+    break;
+#endif
+  }
+  free(s->in);
+  free(s);
+}
+
+/* Reads up to len bytes, fewer at the end of the stream. Returns the
+ * number of bytes read, or -1 on failure. */
+static long stream_read_some(Stream *s, char *buf, size_t len) {
+  size_t n;
+  if (s->blocks) return blocks_read_some(s, buf, len);
+  switch (s->codec) {
+  case CONV_CODEC_RAW:
+    n = fread(buf, 1, len, s->f);
+    return (n < len && ferror(s->f)) ? -1 : (long)n;
+
+  case CONV_CODEC_GZIP:
+    s->gzip.next_out = (Bytef *)buf;
+    s->gzip.avail_out = len;
+    while (s->gzip.avail_out && !s->ended) {
+      if (!s->gzip.avail_in) {
+        n = fread(s->in, 1, STREAM_IN_SIZE, s->f);
+        if (!n) break;
+        s->gzip.next_in = s->in;
+        s->gzip.avail_in = n;
+      }
+      int ret = inflate(&s->gzip, Z_NO_FLUSH);
+      if (ret == Z_STREAM_END)
+        s->ended = 1;
+      else if (ret != Z_OK)
+        return -1;
+    }
+    n = len - s->gzip.avail_out;
+    return (!n && ferror(s->f)) ? -1 : (long)n;
+
+#ifdef NLE_ZSTD_TTYRECS
+  case CONV_CODEC_ZSTD: {
+    ZSTD_outBuffer out = {buf, len, 0};
+    while (out.pos < out.size && !s->ended) {
+      if (s->zstd_in.pos == s->zstd_in.size) {
+        n = fread(s->in, 1, STREAM_IN_SIZE, s->f);
+        if (!n) break;
+        s->zstd_in.size = n;
+        s->zstd_in.pos = 0;
+      }
+      size_t ret = ZSTD_decompressStream(s->zstd, &out, &s->zstd_in);
+      if (ZSTD_isError(ret)) return -1;
+      s->ended = ret == 0; /* End of the frame. */
+    }
+    return (!out.pos && ferror(s->f)) ? -1 : (long)out.pos;
+  }
+#endif
+  }
+  return -1;
+}
+
+/*
+ * Reads exactly len bytes. Returns CONV_OK, CONV_STREAM_END, or
+ * CONV_BODY_ERROR.
+ *
+ * Like BZ2_bzRead, this reports the end of the stream already on the read
+ * that reaches it, dropping the last record. For the other codecs, we
+ * look one byte ahead to get the same frames from all of them.
+ */
+static int stream_read(Stream *s, void *buf, int len) {
+  if (s->codec == CONV_CODEC_BZ2 && !s->blocks) {
+    int bzerror;
+    int length = BZ2_bzRead(&bzerror, s->bz2, buf, len);
+    if (bzerror == BZ_OK && length == len) return CONV_OK;
     if (bzerror == BZ_STREAM_END) return CONV_STREAM_END;
+    fprintf(stderr, "bzRead failed with return code %d (read %d bytes)\n",
+            bzerror, length);
+    return CONV_BODY_ERROR;
+  }
+  if (s->blocks) {
+    /* Not looking ahead: Like BZ2_bzRead, the end is reported with the
+     * last data of the stream, see blocks_start. */
+    long length = s->ended ? 0 : stream_read_some(s, buf, len);
+    if (length < 0) {
+      fprintf(stderr, "Reading bz2 blocks failed\n");
+      return CONV_BODY_ERROR;
+    }
+    s->decoded += length;
+    if (length < len) s->ended = 1;
+    return s->ended ? CONV_STREAM_END : CONV_OK;
+  }
+
+  char *p = buf;
+  long got = 0;
+  if (len && s->has_peek) {
+    *p = s->peek;
+    s->has_peek = 0;
+    got = 1;
+  }
+  long n = stream_read_some(s, p + got, len - got);
+  if (n < 0) {
+    fprintf(stderr, "Reading ttyrec failed\n");
+    return CONV_BODY_ERROR;
+  }
+  s->decoded += n;
+  got += n;
+  if (got < len) {
+    if (got == 0) return CONV_STREAM_END;
+    fprintf(stderr, "Ttyrec ended in the middle of a record\n");
+    return CONV_BODY_ERROR;
+  }
+
+  n = stream_read_some(s, &s->peek, 1);
+  if (n <= 0) return n < 0 ? CONV_BODY_ERROR : CONV_STREAM_END;
+  s->decoded += n;
+  s->has_peek = 1;
+  return CONV_OK;
+}
+
+/*
+ * A position in a ttyrec, saved by conversion_save_checkpoint and followed
+ * by the state of the terminal.
+ */
+#define CHECKPOINT_MAGIC 0x6e6c6563 /* "nlec" */
+
+typedef struct Checkpoint {
+  uint32_t magic;
+  uint32_t size;        /* Including the terminal state. */
+  int64_t frame;        /* Number of frames before the checkpoint. */
+  int64_t decoded;      /* Stream.decoded. */
+  int64_t block_bit;    /* Bz2Blocks.block_bit, -1 at the end. */
+  int64_t block_offset; /* Bz2Blocks.block_offset. */
+  int32_t codec;
+  int32_t has_peek;
+  char peek;
+} Checkpoint;
+
+/* Skips the next n bytes of a stream. Returns 0, or -1 on failure. */
+static int stream_skip(Stream *s, int64_t n) {
+  char buf[1 << 12];
+  while (n > 0) {
+    size_t len = n < (int64_t)sizeof(buf) ? (size_t)n : sizeof(buf);
+    long got = stream_read_some(s, buf, len);
+    if (got <= 0) return -1;
+    n -= got;
+  }
+  return 0;
+}
+
+/* Opens a stream that can be checkpointed, at checkpoint cp or, if NULL, at
+ * the start. Only a bz2 stream can seek to a block, other compressed ones
+ * are decompressed from the start. */
+static Stream *stream_open_seekable(FILE *f, int codec, const Checkpoint *cp) {
+  Stream *s;
+  int64_t skip = cp ? cp->decoded : 0;
+  if (codec == CONV_CODEC_BZ2) {
+    s = calloc(1, sizeof(Stream));
+    if (!s) return NULL;
+    s->codec = codec;
+    s->f = f;
+    s->blocks = calloc(1, sizeof(Bz2Blocks));
+    if (!s->blocks) {
+      free(s);
+      return NULL;
+    }
+    Bz2Blocks *b = s->blocks;
+    b->next_bit = cp ? cp->block_bit : BZ2_HEADER_BITS;
+    b->block_offset = cp ? cp->block_offset : 0;
+    if (fseek(f, 0, SEEK_SET) || fread(b->header, 1, 4, f) != 4 ||
+        memcmp(b->header, "BZh", 3) ||
+        (b->next_bit >= 0 && blocks_start(b, f))) {
+      stream_close(s);
+      return NULL;
+    }
+    s->ended = !b->bz_open;
+    skip -= b->block_offset;
+  } else {
+    s = stream_open(f, codec);
+    if (!s) return NULL;
+    if (codec == CONV_CODEC_RAW && fseek(f, skip, SEEK_SET) == 0) skip = 0;
+  }
+  if (stream_skip(s, skip)) {
+    stream_close(s);
+    return NULL;
+  }
+  if (cp) {
+    s->decoded = cp->decoded;
+    s->has_peek = cp->has_peek;
+    s->peek = cp->peek;
+  }
+  return s;
+}
+
+int read_header(Stream *s, Header *h, size_t version) {
+  int buf[3];
+  int status = stream_read(s, buf, sizeof(int) * 3);
+  if (status != CONV_OK) {
+    /* This could be CONV_STREAM_END, the logical end of a stream.
+       We still stop in that case. */
+    if (status == CONV_STREAM_END) return CONV_STREAM_END;
     return CONV_HEADER_ERROR;
   }
 
@@ -137,9 +595,9 @@ int read_header(BZFILE *bfp, Header *h, size_t version) {
   if (version > 1) {
     /* NLE-based ttyrecs read have single-byte "channel" which codifies what 
     kind of information one is in the buffer. Here we read into the channel. */
-    BZ2_bzRead(&bzerror, bfp, &h->channel, 1);
-    if (bzerror != BZ_OK) {
-      if (bzerror == BZ_STREAM_END) return CONV_STREAM_END;
+    status = stream_read(s, &h->channel, 1);
+    if (status != CONV_OK) {
+      if (status == CONV_STREAM_END) return CONV_STREAM_END;
       return CONV_HEADER_ERROR;
     }
   }
@@ -155,8 +613,8 @@ int read_header(BZFILE *bfp, Header *h, size_t version) {
   return CONV_OK;
 }
 
-int ttyread(BZFILE *bfp, Header *h, char **buf, size_t version) {
-  int status = read_header(bfp, h, version);
+int ttyread(Stream *s, Header *h, char **buf, size_t version) {
+  int status = read_header(s, h, version);
   if (status != CONV_OK) {
     return status;
   }
@@ -167,15 +625,7 @@ int ttyread(BZFILE *bfp, Header *h, char **buf, size_t version) {
     return CONV_CRITICAL_ERROR;
   }
 
-  int bzerror;
-  int length = BZ2_bzRead(&bzerror, bfp, *buf, h->len);
-  if (bzerror != BZ_OK || length != h->len) {
-    if (bzerror == BZ_STREAM_END) return CONV_STREAM_END;
-    fprintf(stderr, "bzRead failed with return code %d (read %d bytes)\n",
-            bzerror, length);
-    return CONV_BODY_ERROR;
-  }
-  return CONV_OK;
+  return stream_read(s, *buf, h->len);
 }
 
 Conversion *conversion_create(size_t rows, size_t cols, size_t term_rows,
@@ -201,6 +651,8 @@ Conversion *conversion_create(size_t rows, size_t cols, size_t term_rows,
   c->inputs = (UnsignedCharPtr){0};
   c->scores = (Int32Ptr){0};
   c->remaining = 0;
+  c->frame = 0;
+  c->skip = 0;
   c->buf = NULL;
   c->vt = tmt_open(term_rows, term_cols, callback, c, NULL);
   if (!c->vt) {
@@ -208,7 +660,7 @@ Conversion *conversion_create(size_t rows, size_t cols, size_t term_rows,
     free(c);
     return NULL;
   }
-  c->bfp = NULL;
+  c->stream = NULL;
   return c;
 }
 
@@ -237,31 +689,89 @@ void conversion_set_buffers(Conversion *c, unsigned char *chars, size_t chars_si
       (Int32Ptr){scores, scores, scores + scores_size};
 }
 
-int conversion_load_ttyrec(Conversion *c, FILE *f) {
-  int bzerror;
-  if (c->bfp) {
-    BZ2_bzReadClose(&bzerror, c->bfp);
+int conversion_load_ttyrec(Conversion *c, FILE *f, int codec) {
+  if (c->stream) {
+    stream_close(c->stream);
   }
 
-  c->bfp = BZ2_bzReadOpen(&bzerror, f, 0, 1, NULL, 0);
-  if (bzerror != BZ_OK) {
-    perror("Could not open bzip2 file");
-    BZ2_bzReadClose(&bzerror, c->bfp);
+  c->stream = stream_open(f, codec);
+  if (!c->stream) {
+    perror("Could not open ttyrec");
     return EXIT_FAILURE;
   }
+  c->frame = 0;
   return EXIT_SUCCESS;
 }
 
-void write_to_buffers(Conversion *conv);
+int conversion_load_ttyrec_seekable(Conversion *c, FILE *f, int codec,
+                                    const void *checkpoint, size_t size) {
+  Checkpoint cp;
+  if (checkpoint) {
+    if (size < sizeof(cp)) {
+      fprintf(stderr, "Invalid checkpoint\n");
+      return EXIT_FAILURE;
+    }
+    memcpy(&cp, checkpoint, sizeof(cp));
+    if (cp.magic != CHECKPOINT_MAGIC || cp.size != size ||
+        size != conversion_checkpoint_size(c) || cp.codec != codec) {
+      fprintf(stderr, "Invalid checkpoint\n");
+      return EXIT_FAILURE;
+    }
+  }
 
-/* Returns 1 at end of buffer, 0 at end of input, -1 on failure. */
-int conversion_convert_frames(Conversion *c) {
-  if (!c->bfp || !c->chars.cur) return CONV_CRITICAL_ERROR;
+  if (c->stream) {
+    stream_close(c->stream);
+    c->stream = NULL;
+  }
 
+  if (checkpoint &&
+      !tmt_load_state(c->vt, (const char *)checkpoint + sizeof(cp))) {
+    fprintf(stderr, "Checkpoint of another terminal size\n");
+    return EXIT_FAILURE;
+  }
+  c->stream = stream_open_seekable(f, codec, checkpoint ? &cp : NULL);
+  if (!c->stream) {
+    perror("Could not open ttyrec");
+    return EXIT_FAILURE;
+  }
+  c->frame = checkpoint ? cp.frame : 0;
+  return EXIT_SUCCESS;
+}
+
+size_t conversion_checkpoint_size(Conversion *c) {
+  return sizeof(Checkpoint) + tmt_state_size(c->vt);
+}
+
+int conversion_save_checkpoint(Conversion *c, void *checkpoint) {
+  Stream *s = c->stream;
+  if (!s || (s->codec == CONV_CODEC_BZ2 && !s->blocks))
+    return CONV_CRITICAL_ERROR;
+
+  Checkpoint cp;
+  memset(&cp, 0, sizeof(cp));
+  cp.magic = CHECKPOINT_MAGIC;
+  cp.size = conversion_checkpoint_size(c);
+  cp.frame = c->frame;
+  cp.decoded = s->decoded;
+  if (s->blocks) {
+    cp.block_bit = s->blocks->bz_open ? s->blocks->block_bit : -1;
+    cp.block_offset = s->blocks->block_offset;
+  }
+  cp.codec = s->codec;
+  cp.has_peek = s->has_peek;
+  cp.peek = s->peek;
+  memcpy(checkpoint, &cp, sizeof(cp));
+  tmt_save_state(c->vt, (char *)checkpoint + sizeof(cp));
+  return CONV_OK;
+}
+
+void write_to_buffers(Conversion *conv);
+
+static int convert_records(Conversion *c) {
   int status = CONV_OK;
 
   while (c->remaining) {
-    status = ttyread(c->bfp, &c->header, &c->buf, c->version);
+    status = ttyread(c->stream, &c->header, &c->buf, c->version);
     if (status != CONV_OK) break;
 
     if (c->version > 1){
@@ -294,7 +804,31 @@ int conversion_convert_frames(Conversion *c) {
   return status;
 }
 
+/* Returns 1 at end of buffer, 0 at end of input, -1 on failure. */
+int conversion_convert_frames(Conversion *c) {
+  if (!c->stream || !c->chars.cur) return CONV_CRITICAL_ERROR;
+  return convert_records(c);
+}
+
+/* Like conversion_convert_frames, for n frames without writing them. */
+int conversion_skip_frames(Conversion *c, size_t n) {
+  if (!c->stream) return CONV_CRITICAL_ERROR;
+  c->remaining = n;
+  c->skip = 1;
+  int status = convert_records(c);
+  c->skip = 0;
+  return status;
+}
+
 void write_to_buffers(Conversion *conv) {
+  if (conv->skip) {
+    if (conv->version == 1 || conv->header.channel != 2) {
+      ++conv->frame;
+      --conv->remaining;
+    }
+    return;
+  }
+
   if (conv->version > 1)  {
     if (conv->header.channel == 2) {
       /* V3: Write just the reward. Do not write the screen. */
@@ -324,6 +858,7 @@ void write_to_buffers(Conversion *conv) {
   int64_t usec = 1000000 * (int64_t)conv->header.tv.tv_sec;
   *conv->timestamps.cur++ = usec + (int64_t)conv->header.tv.tv_usec;
 
+  ++conv->frame;
   --conv->remaining;
 
 }
@@ -334,9 +869,8 @@ int conversion_close(Conversion *c) {
     return 1;
   }
   tmt_close(c->vt);
-  if (c->bfp) {
-    int bzerror;
-    BZ2_bzReadClose(&bzerror, c->bfp);
+  if (c->stream) {
+    stream_close(c->stream);
   }
   if (c->buf) free(c->buf);
   free(c);
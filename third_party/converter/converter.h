@@ -15,6 +15,12 @@ extern "C"{
 #define CONV_BODY_ERROR       (-3)
 #define CONV_FILE_ERROR       (-4)
 
+/* Compression of ttyrecs. */
+#define CONV_CODEC_BZ2  0
+#define CONV_CODEC_RAW  1
+#define CONV_CODEC_GZIP 2
+#define CONV_CODEC_ZSTD 3 /* If built with NLE_ZSTD_TTYRECS. */
+
 typedef struct Header {
   struct timeval tv;
   int len;
@@ -70,10 +76,12 @@ typedef struct Conversion {
   Int32Ptr scores; /* Array to fill in-game score values in */
 
   size_t remaining; /* Remaining (free) number of frames in buffers */
+  int64_t frame; /* Number of frames converted from the current ttyrec. */
+  int skip; /* Skipping frames, see conversion_skip_frames. */
 
   Header header; /* Most recently read header. */
 
-  void *bfp; /* Pointer to current ttyrec BZFILE. */
+  void *stream; /* Current ttyrec, see converter.c. */
   char *buf; /* Buffer for read data. */
 } Conversion;
 
@@ -85,8 +93,20 @@ void conversion_set_buffers(Conversion *c, unsigned char *chars, size_t chars_si
                             int64_t *timestamps, size_t timestamps_size,
                             unsigned char *inputs, size_t inputs_size,
                             int32_t *scores, size_t scores_size);
-int conversion_load_ttyrec(Conversion *c, FILE *f);
+int conversion_codec_from_filename(const char *filename);
+int conversion_load_ttyrec(Conversion *c, FILE *f, int codec);
 int conversion_convert_frames(Conversion *c);
+int conversion_skip_frames(Conversion *c, size_t n);
+
+/* Checkpoints: Loading a ttyrec seekable, its position (with the state of
+ * the terminal) can be saved, and loading it again at a saved checkpoint
+ * continues from there. bz2 ttyrecs resume at the block of the checkpoint,
+ * uncompressed ones right at it. Checkpoints are only valid for the same
+ * ttyrec, terminal size and build. */
+int conversion_load_ttyrec_seekable(Conversion *c, FILE *f, int codec,
+                                    const void *checkpoint, size_t size);
+size_t conversion_checkpoint_size(Conversion *c);
+int conversion_save_checkpoint(Conversion *c, void *checkpoint);
 int conversion_close(Conversion *c);
 
 #ifdef __cplusplus
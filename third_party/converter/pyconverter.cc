@@ -84,8 +84,15 @@ class Converter
     }
 
     void
-    load_ttyrec(const std::string filename, size_t gameid, size_t part)
+    load_ttyrec(const std::string filename, size_t gameid, size_t part,
+                py::object checkpoint, bool seekable)
     {
+        int codec = conversion_codec_from_filename(filename.c_str());
+        if (codec < 0) {
+            throw std::invalid_argument(
+                "zstd ttyrecs not supported by this build: '" + filename
+                + "'");
+        }
         if (ttyrec_ == nullptr)
             ttyrec_ = fopen(filename.c_str(), "r");
         else
@@ -95,7 +102,17 @@ class Converter
             throw py::error_already_set();
         }
 
-        int status = conversion_load_ttyrec(conversion_, ttyrec_);
+        int status;
+        if (!checkpoint.is_none()) {
+            std::string data = py::bytes(checkpoint);
+            status = conversion_load_ttyrec_seekable(
+                conversion_, ttyrec_, codec, data.data(), data.size());
+        } else if (seekable) {
+            status = conversion_load_ttyrec_seekable(conversion_, ttyrec_,
+                                                     codec, nullptr, 0);
+        } else {
+            status = conversion_load_ttyrec(conversion_, ttyrec_, codec);
+        }
         if (status != 0) {
             throw std::runtime_error("File failed to load: '" + filename
                                      + "'");
@@ -145,6 +162,37 @@ class Converter
         return conversion_->remaining;
     }
 
+    size_t
+    skip(size_t frames)
+    {
+        int status = 0;
+        {
+            py::gil_scoped_release release;
+            status = conversion_skip_frames(conversion_, frames);
+        }
+        if (status == -1) {
+            throw std::runtime_error("Error in file.");
+        }
+        return frames - conversion_->remaining;
+    }
+
+    py::bytes
+    checkpoint()
+    {
+        std::string data(conversion_checkpoint_size(conversion_), '\0');
+        if (conversion_save_checkpoint(conversion_, &data[0]) != CONV_OK) {
+            throw std::runtime_error(
+                "Ttyrec not loaded seekable: '" + filename_ + "'");
+        }
+        return py::bytes(data);
+    }
+
+    int64_t
+    frame()
+    {
+        return conversion_->frame;
+    }
+
     bool
     is_loaded()
     {
@@ -194,10 +242,13 @@ PYBIND11_MODULE(_pyconverter, m)
              py::arg("rows"), py::arg("cols"), py::arg("ttyrec_version"), py::arg("term_rows") = 0,
              py::arg("term_cols") = 0)
         .def("load_ttyrec", &Converter::load_ttyrec, py::arg("filename"),
-             py::arg("gameid") = 0, py::arg("part") = 0)
+             py::arg("gameid") = 0, py::arg("part") = 0,
+             py::arg("checkpoint") = py::none(), py::arg("seekable") = false)
         .def("convert", &Converter::convert, py::arg("chars"),
              py::arg("colors"), py::arg("cursors"), py::arg("timestamps"),
              py::arg("inputs"), py::arg("scores"))
+        .def("skip", &Converter::skip, py::arg("frames"))
+        .def("checkpoint", &Converter::checkpoint)
         .def("is_loaded", &Converter::is_loaded)
         .def_readonly("rows", &Converter::rows_)
         .def_readonly("cols", &Converter::cols_)
@@ -206,5 +257,6 @@ PYBIND11_MODULE(_pyconverter, m)
         .def_readonly("ttyrec_version", &Converter::ttyrec_version_)
         .def_property_readonly("filename", &Converter::filename)
         .def_property_readonly("part", &Converter::part)
+        .def_property_readonly("frame", &Converter::frame)
         .def_property_readonly("gameid", &Converter::gameid);
 }
\ No newline at end of file
@@ -31,7 +31,7 @@ int main(void) {
   unsigned char inputs[LEN];
 
 
-  if (conversion_load_ttyrec(c, fdopen(STDIN_FILENO, "r")) != 0)
+  if (conversion_load_ttyrec(c, fdopen(STDIN_FILENO, "r"), CONV_CODEC_BZ2) != 0)
     return EXIT_FAILURE;
 
   conversion_set_buffers(c, &chars[0], sizeof(chars), 
@@ -53,7 +53,7 @@
 
 struct TMT{
     TMTPOINT curs, oldcurs;
-    TMTATTRS attrs, oldattrs;
+    TMTATTRS attrs, oldattrs, defattrs;
 
     bool dirty, acs, ignored;
     TMTSCREEN screen;
@@ -73,7 +73,7 @@ struct TMT{
     enum {S_NUL, S_ESC, S_ARG, S_DEC} state;
 };
 
-static TMTATTRS defattrs = {.fg = TMT_COLOR_DEFAULT, .bg = TMT_COLOR_DEFAULT, .dec = 0};
+static const TMTATTRS initattrs = {.fg = TMT_COLOR_DEFAULT, .bg = TMT_COLOR_DEFAULT, .dec = 0};
 static void writecharatcurs(TMT *vt, wchar_t w);
 
 static wchar_t
@@ -104,7 +104,7 @@ clearline(TMT *vt, TMTLINE *l, size_t s, size_t e)
 {
     vt->dirty = l->dirty = true;
     for (size_t i = s; i < e && i < vt->screen.ncol; i++){
-        l->chars[i].a = defattrs;
+        l->chars[i].a = vt->defattrs;
         l->chars[i].c = L' ';
     }
 }
@@ -204,7 +204,7 @@ HANDLER(el)
 HANDLER(sgr)
     #define FGBG(c) *(P0(i) < 40? &vt->attrs.fg : &vt->attrs.bg) = c
     for (size_t i = 0; i < vt->npar; i++) switch (P0(i)){
-        case  0: vt->attrs                    = defattrs;   break;
+        case  0: vt->attrs                    = vt->defattrs;   break;
         case  1: case 22: vt->attrs.bold      = P0(0) < 20; break;
         case  2: case 23: vt->attrs.dim       = P0(0) < 20; break;
         case  4: case 24: vt->attrs.underline = P0(0) < 20; break;
@@ -314,8 +314,8 @@ handlechar(TMT *vt, char i)
     DO(S_ARG, "u",          vt->curs = vt->oldcurs; vt->attrs = vt->oldattrs)
     DO(S_ARG, "@",          ich(vt))
     ON(S_DEC, "\x1b",       vt->state = S_ESC)
-    DO(S_DEC, "0",          vt->attrs.dec = true; defattrs.dec = true)
-    DO(S_DEC, "B",          vt->attrs.dec = false; defattrs.dec = false)
+    DO(S_DEC, "0",          vt->attrs.dec = true; vt->defattrs.dec = true)
+    DO(S_DEC, "B",          vt->attrs.dec = false; vt->defattrs.dec = false)
     if (vt->state == S_ESC || vt->state == S_ARG) {
         /* We have unrecognised terminal commands (eg from VT420+) that have 
          * fallen through. In this case, we abort the commands instead of 
@@ -366,6 +366,7 @@ tmt_open(size_t nline, size_t ncol, TMTCALLBACK cb, void *p,
     vt->acschars = acs? acs : L"><^v#+:o##+++++~---_++++|<>*!fo";
     vt->cb = cb;
     vt->p = p;
+    vt->defattrs = initattrs;
 
     if (!tmt_resize(vt, nline, ncol)) return tmt_close(vt), NULL;
     return vt;
@@ -504,9 +505,101 @@ tmt_reset(TMT *vt)
 {
     vt->curs.r = vt->curs.c = vt->oldcurs.r = vt->oldcurs.c = vt->acs = (bool)0;
     resetparser(vt);
-    vt->attrs = vt->oldattrs = defattrs;
+    vt->attrs = vt->oldattrs = vt->defattrs;
     memset(&vt->ms, 0, sizeof(vt->ms));
     clearlines(vt, 0, vt->screen.nline);
     CB(vt, TMT_MSG_CURSOR, "t");
     notify(vt, true, true);
 }
+
+/* Everything but the pointers of a TMT, for tmt_save_state. */
+typedef struct TMTSTATE TMTSTATE;
+struct TMTSTATE{
+    size_t nline, ncol;
+    TMTPOINT curs, oldcurs;
+    TMTATTRS attrs, oldattrs, defattrs;
+    bool dirty, acs, ignored;
+    mbstate_t ms;
+    size_t nmb;
+    char mb[BUF_MAX + 1];
+    size_t pars[PAR_MAX];
+    size_t npar;
+    size_t arg;
+    int state;
+};
+
+static size_t
+linesize(const TMT *vt)
+{
+    return sizeof(TMTLINE) + vt->screen.ncol * sizeof(TMTCHAR);
+}
+
+size_t
+tmt_state_size(const TMT *vt)
+{
+    /* The lines of the screen, then the tabs. */
+    return sizeof(TMTSTATE) + (vt->screen.nline + 1) * linesize(vt);
+}
+
+void
+tmt_save_state(const TMT *vt, void *buf)
+{
+    TMTSTATE st;
+    memset(&st, 0, sizeof(st));
+    st.nline = vt->screen.nline;
+    st.ncol = vt->screen.ncol;
+    st.curs = vt->curs;
+    st.oldcurs = vt->oldcurs;
+    st.attrs = vt->attrs;
+    st.oldattrs = vt->oldattrs;
+    st.defattrs = vt->defattrs;
+    st.dirty = vt->dirty;
+    st.acs = vt->acs;
+    st.ignored = vt->ignored;
+    st.ms = vt->ms;
+    st.nmb = vt->nmb;
+    memcpy(st.mb, vt->mb, sizeof(st.mb));
+    memcpy(st.pars, vt->pars, sizeof(st.pars));
+    st.npar = vt->npar;
+    st.arg = vt->arg;
+    st.state = vt->state;
+
+    char *p = buf;
+    memcpy(p, &st, sizeof(st));
+    p += sizeof(st);
+    for (size_t i = 0; i < vt->screen.nline; i++, p += linesize(vt))
+        memcpy(p, vt->screen.lines[i], linesize(vt));
+    memcpy(p, vt->tabs, linesize(vt));
+}
+
+bool
+tmt_load_state(TMT *vt, const void *buf)
+{
+    TMTSTATE st;
+    const char *p = buf;
+    memcpy(&st, p, sizeof(st));
+    p += sizeof(st);
+    if (st.nline != vt->screen.nline || st.ncol != vt->screen.ncol)
+        return false;
+
+    vt->curs = st.curs;
+    vt->oldcurs = st.oldcurs;
+    vt->attrs = st.attrs;
+    vt->oldattrs = st.oldattrs;
+    vt->defattrs = st.defattrs;
+    vt->dirty = st.dirty;
+    vt->acs = st.acs;
+    vt->ignored = st.ignored;
+    vt->ms = st.ms;
+    vt->nmb = st.nmb;
+    memcpy(vt->mb, st.mb, sizeof(st.mb));
+    memcpy(vt->pars, st.pars, sizeof(st.pars));
+    vt->npar = st.npar;
+    vt->arg = st.arg;
+    vt->state = st.state;
+
+    for (size_t i = 0; i < vt->screen.nline; i++, p += linesize(vt))
+        memcpy(vt->screen.lines[i], p, linesize(vt));
+    memcpy(vt->tabs, p, linesize(vt));
+    return true;
+}
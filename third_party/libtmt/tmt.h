@@ -138,4 +138,9 @@ const TMTPOINT *tmt_cursor(const TMT *vt);
 void tmt_clean(TMT *vt);
 void tmt_reset(TMT *vt);
 
+/**** STATE SNAPSHOTS */
+size_t tmt_state_size(const TMT *vt);
+void tmt_save_state(const TMT *vt, void *buf);
+bool tmt_load_state(TMT *vt, const void *buf);
+
 #endif
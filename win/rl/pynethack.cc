@@ -1,10 +1,14 @@
 /* Copyright (c) Facebook, Inc. and its affiliates. */
 #include <atomic>
+#include <chrono>
 #include <cstdio>
+#include <cstdlib>
+#include <cstring>
 #include <memory>
 
 #include <pybind11/numpy.h>
 #include <pybind11/pybind11.h>
+#include <pybind11/stl.h>
 
 // "digit" is declared in both Python's longintrepr.h and NetHack's extern.h.
 #define digit nethack_digit
@@ -98,15 +102,214 @@ checked_conversion(py::handle h, const std::vector<ssize_t> &shape)
     return static_cast<T *>(buf.ptr);
 }
 
+// Marks a game as busy. The GIL is released while games run, so this
+// raises instead of letting several threads step one game at once.
+class ScopedUse
+{
+  public:
+    explicit ScopedUse(std::atomic<bool> &in_use) : in_use_(in_use)
+    {
+        if (in_use_.exchange(true))
+            throw std::runtime_error(
+                "NetHack instance used by several threads at once");
+    }
+
+    ~ScopedUse()
+    {
+        in_use_ = false;
+    }
+
+  private:
+    std::atomic<bool> &in_use_;
+};
+
+// Adds the time until destruction to stats, if not null.
+class ScopedTimer
+{
+  public:
+    ScopedTimer(nle_stats *stats, int phase) : stats_(stats), phase_(phase)
+    {
+        if (stats_)
+            start_ = std::chrono::steady_clock::now();
+    }
+
+    ~ScopedTimer()
+    {
+        if (!stats_)
+            return;
+        ++stats_->calls[phase_];
+        stats_->nanoseconds[phase_] +=
+            std::chrono::duration_cast<std::chrono::nanoseconds>(
+                std::chrono::steady_clock::now() - start_)
+                .count();
+    }
+
+  private:
+    nle_stats *stats_;
+    int phase_;
+    std::chrono::steady_clock::time_point start_;
+};
+
+// Prompts that step() answers right away, so that one call to step() is
+// one decision of the agent. See also NLE._perform_known_steps.
+struct SkipPolicy {
+    bool every_step = false;   // Skip prompts after every step.
+    bool on_game_over = false; // Skip after steps that end the game.
+    bool decline_yn = true;         // Else, y/n questions are left open.
+    std::vector<std::string> yn_exceptions; // Left open if in the message.
+    bool reset_to_moveloop = false; // Step past the game's initial phase.
+};
+
+// The following functions run without the GIL.
+
+void
+step_game(nledl_ctx *&nle, nle_obs &obs, int action)
+{
+    obs.action = action;
+    nle = nle_step(nle, &obs);
+}
+
+// The action_mask observation is for these keys.
+void
+check_actions(const std::vector<int> &actions)
+{
+    for (int action : actions) {
+        if (action < 0 || action > 255)
+            throw std::invalid_argument("Actions must be between 0 and 255");
+    }
+}
+
+// Shape of the egocentric_* observations.
+std::vector<ssize_t>
+egocentric_shape(int radius, int pad_glyph)
+{
+    if (radius < 0)
+        throw std::invalid_argument("Negative egocentric_radius");
+    if (pad_glyph < 0 || pad_glyph >= MAX_GLYPH)
+        throw std::invalid_argument("Invalid egocentric_pad_glyph");
+    return { 2 * radius + 1, 2 * radius + 1 };
+}
+
+// The window port accumulates changes in glyphs_changed, clear it before
+// each step of the caller.
+void
+begin_step(nle_obs &obs)
+{
+    if (obs.glyphs_changed)
+        std::memset(obs.glyphs_changed, 0, ROWNO * (COLNO - 1));
+}
+
+bool
+message_contains(const nle_obs &obs, const std::vector<std::string> &needles)
+{
+    const char *message = reinterpret_cast<const char *>(obs.message);
+    std::string haystack(message, strnlen(message, NLE_MESSAGE_SIZE));
+    for (const std::string &needle : needles) {
+        if (haystack.find(needle) != std::string::npos)
+            return true;
+    }
+    return false;
+}
+
+void
+skip_prompts(nledl_ctx *&nle, nle_obs &obs, const SkipPolicy &policy)
+{
+    if (!policy.every_step
+        && !(policy.on_game_over && obs.program_state[0])) // gameover
+        return;
+
+    while (!obs.done) {
+        if (obs.internal[3]) { // xwaitforspace
+            step_game(nle, obs, ' ');
+            continue;
+        }
+        if (obs.internal[2]) { // in_getlin
+            step_game(nle, obs, '\033');
+            continue;
+        }
+        if (obs.internal[1] && policy.decline_yn // in_yn_function
+            && !message_contains(obs, policy.yn_exceptions))
+            step_game(nle, obs, '\033');
+        break;
+    }
+}
+
+void
+reset_to_moveloop(nledl_ctx *&nle, nle_obs &obs)
+{
+    for (int i = 0; i < 1000 && !obs.done; ++i) {
+        if (obs.program_state[3]) // in_moveloop
+            break;
+        step_game(nle, obs, ' ');
+    }
+}
+
+// The compression of a ttyrec, by its file extension. The converter does
+// the same when reading it.
+int
+ttyrec_codec(const std::string &ttyrec)
+{
+    auto endswith = [&ttyrec](const std::string &suffix) {
+        return ttyrec.size() >= suffix.size()
+               && !ttyrec.compare(ttyrec.size() - suffix.size(),
+                                  suffix.size(), suffix);
+    };
+    if (endswith(".bz2"))
+        return NLE_TTYREC_BZ2;
+    if (endswith(".gz"))
+        return NLE_TTYREC_GZIP;
+    if (endswith(".zst")) {
+#ifdef NLE_ZSTD_TTYRECS
+        return NLE_TTYREC_ZSTD;
+#else
+        throw std::invalid_argument(
+            "zstd ttyrecs not supported by this build: '" + ttyrec + "'");
+#endif
+    }
+    return NLE_TTYREC_RAW;
+}
+
+// A game state from Nethack::clone_state.
+class NethackState
+{
+  public:
+    NethackState(const void *owner, uint64_t episode, void *state)
+        : owner_(owner), episode_(episode), state_(state)
+    {
+    }
+
+    ~NethackState()
+    {
+        std::free(state_);
+    }
+
+    NethackState(const NethackState &) = delete;
+    NethackState &operator=(const NethackState &) = delete;
+
+  private:
+    friend class Nethack;
+
+    const void *owner_;
+    uint64_t episode_;
+    void *state_;
+
+    // The observation at the time of saving.
+    int done_;
+    char in_normal_game_;
+    int how_done_;
+    std::vector<std::string> buffers_;
+};
+
 class Nethack
 {
   public:
     Nethack(std::string dlpath, std::string ttyrec, std::string hackdir,
             std::string nethackoptions, bool spawn_monsters,
-            std::string scoreprefix)
+            std::string scoreprefix, bool fast_reset)
         : Nethack(std::move(dlpath), std::move(hackdir),
-                  std::move(nethackoptions), spawn_monsters)
+                  std::move(nethackoptions), spawn_monsters, fast_reset)
     {
+        settings_.ttyrec_codec = ttyrec_codec(ttyrec);
         ttyrec_ = std::fopen(ttyrec.c_str(), "a");
         if (!ttyrec_) {
             PyErr_SetFromErrnoWithFilename(PyExc_OSError, ttyrec.c_str());
@@ -129,9 +332,12 @@ class Nethack
     }
 
     Nethack(std::string dlpath, std::string hackdir,
-            std::string nethackoptions, bool spawn_monsters)
-        : dlpath_(std::move(dlpath)), obs_{}, settings_{}
+            std::string nethackoptions, bool spawn_monsters,
+            bool fast_reset)
+        : dlpath_(std::move(dlpath)), obs_{}, settings_{},
+          fast_reset_(fast_reset)
     {
+        set_fallback_buffers();
         if (hackdir.size() > sizeof(settings_.hackdir) - 1) {
             throw std::length_error("hackdir too long");
         }
@@ -155,14 +361,179 @@ class Nethack
     }
 
     void
-    step(int action)
+    step(int action, bool skip_prompts)
     {
+        ScopedUse use(in_use_);
+        ScopedTimer timer(settings_.stats, NLE_STATS_CALL);
         if (!nle_)
             throw std::runtime_error("step called without reset()");
         if (obs_.done)
             throw std::runtime_error("Called step on finished NetHack");
-        obs_.action = action;
-        nle_ = nle_step(nle_, &obs_);
+
+        py::gil_scoped_release gil;
+        begin_step(obs_);
+        step_game(nle_, obs_, action);
+        if (skip_prompts)
+            ::skip_prompts(nle_, obs_, policy_);
+    }
+
+    // Steps through actions until one of the stop conditions holds.
+    // Only the fields needed for those (and the tty, to keep the terminal
+    // emulator current) are updated in between; the full observation is
+    // filled once at the end. Returns the number of actions taken.
+    size_t
+    step_many(const std::vector<int> &actions, bool skip_prompts,
+              bool stop_on_message, bool stop_on_hp_drop,
+              bool stop_on_level_change)
+    {
+        ScopedUse use(in_use_);
+        ScopedTimer timer(settings_.stats, NLE_STATS_CALL);
+        if (!nle_)
+            throw std::runtime_error("step_many called without reset()");
+        if (obs_.done)
+            throw std::runtime_error("Called step_many on finished NetHack");
+        if ((stop_on_hp_drop || stop_on_level_change) && !obs_.blstats)
+            throw std::invalid_argument(
+                "Stopping on HP or level changes requires blstats");
+
+        py::gil_scoped_release gil;
+        begin_step(obs_);
+
+        // Same buffers as obs_, so ttyrecs record the same score.
+        nle_obs light = obs_;
+        light.glyphs = nullptr;
+        light.chars = nullptr;
+        light.colors = nullptr;
+        light.specials = nullptr;
+        light.inv_glyphs = nullptr;
+        light.inv_letters = nullptr;
+        light.inv_oclasses = nullptr;
+        light.inv_strs = nullptr;
+        light.screen_descriptions = nullptr;
+        light.egocentric_glyphs = nullptr;
+        light.egocentric_chars = nullptr;
+        light.egocentric_colors = nullptr;
+        light.level_maps = nullptr;
+        light.level_map_levels = nullptr;
+        light.action_mask = nullptr;
+
+        size_t n = 0;
+        bool stop = actions.empty();
+        while (!stop) {
+            // The last action fills everything anyway.
+            bool last = n + 1 == actions.size();
+            nle_obs &obs = last ? obs_ : light;
+
+            long hp = 0, dnum = 0, dlevel = 0;
+            if (obs_.blstats) {
+                hp = obs_.blstats[NLE_BL_HP];
+                dnum = obs_.blstats[NLE_BL_DNUM];
+                dlevel = obs_.blstats[NLE_BL_DLEVEL];
+            }
+            bool was_normal = obs_.in_normal_game;
+
+            step_game(nle_, obs, actions[n++]);
+            if (skip_prompts)
+                ::skip_prompts(nle_, obs, policy_);
+
+            bool normal = was_normal && obs.in_normal_game;
+            stop = last || obs.done
+                   || (stop_on_message && obs.message[0])
+                   || (stop_on_hp_drop && normal
+                       && obs.blstats[NLE_BL_HP] < hp)
+                   || (stop_on_level_change && normal
+                       && (obs.blstats[NLE_BL_DNUM] != dnum
+                           || obs.blstats[NLE_BL_DLEVEL] != dlevel));
+            if (!last) {
+                obs_.in_normal_game = light.in_normal_game;
+                obs_.how_done = light.how_done;
+            }
+        }
+        if (n < actions.size())
+            nle_fill_obs(nle_, &obs_);
+        return n;
+    }
+
+    // Like the screen_descriptions observation, but only for the cells
+    // where mask is true. The others are zero.
+    py::array_t<uint8_t>
+    describe_cells(py::array_t<bool, py::array::c_style> mask)
+    {
+        if (mask.ndim() != 2 || mask.shape(0) != ROWNO
+            || mask.shape(1) != COLNO - 1)
+            throw std::invalid_argument("Mask must have the glyphs' shape");
+
+        py::array_t<uint8_t> result(
+            { ROWNO, COLNO - 1, NLE_SCREEN_DESCRIPTION_LENGTH });
+        std::memset(result.mutable_data(), 0, result.nbytes());
+
+        std::vector<int> cells;
+        const bool *m = mask.data();
+        for (int i = 0; i < ROWNO * (COLNO - 1); ++i) {
+            if (m[i])
+                cells.push_back(i);
+        }
+        if (cells.empty())
+            return result;
+
+        std::vector<unsigned char> out(cells.size()
+                                       * NLE_SCREEN_DESCRIPTION_LENGTH);
+        lookup_descriptions(cells, out.data());
+
+        uint8_t *r = result.mutable_data();
+        for (size_t i = 0; i < cells.size(); ++i)
+            std::memcpy(r + cells[i] * NLE_SCREEN_DESCRIPTION_LENGTH,
+                        &out[i * NLE_SCREEN_DESCRIPTION_LENGTH],
+                        NLE_SCREEN_DESCRIPTION_LENGTH);
+        return result;
+    }
+
+    py::bytes
+    describe(int x, int y)
+    {
+        if (x < 0 || x >= COLNO - 1 || y < 0 || y >= ROWNO)
+            throw std::out_of_range("Coordinates outside of the map");
+
+        char out[NLE_SCREEN_DESCRIPTION_LENGTH] = {};
+        lookup_descriptions({ y * (COLNO - 1) + x }, (unsigned char *) out);
+        return py::bytes(out, strnlen(out, sizeof(out)));
+    }
+
+    // The glyphs of a level as of when it was last shown, or None if it
+    // wasn't shown in this game.
+    py::object
+    level_map(int dnum, int dlevel)
+    {
+        if (dnum < 0 || dnum >= MAXDUNGEON || dlevel < 1 || dlevel > MAXLEVEL)
+            throw std::out_of_range("Level outside of the dungeon");
+
+        py::array_t<int16_t> result({ ROWNO, COLNO - 1 });
+        int16_t *out = result.mutable_data();
+        bool shown;
+        {
+            ScopedUse use(in_use_);
+            if (!nle_)
+                throw std::runtime_error("level_map called without reset()");
+
+            py::gil_scoped_release gil;
+            shown = nle_level_map(nle_, dnum, dlevel, out);
+        }
+        if (!shown)
+            return py::none();
+        return std::move(result);
+    }
+
+    void
+    set_skip_policy(bool every_step, bool on_game_over, bool decline_yn,
+                    std::vector<std::string> yn_exceptions,
+                    bool reset_to_moveloop)
+    {
+        ScopedUse use(in_use_);
+        policy_.every_step = every_step;
+        policy_.on_game_over = on_game_over;
+        policy_.decline_yn = decline_yn;
+        policy_.yn_exceptions = std::move(yn_exceptions);
+        policy_.reset_to_moveloop = reset_to_moveloop;
     }
 
     bool
@@ -171,20 +542,121 @@ class Nethack
         return obs_.done;
     }
 
+    void
+    enable_stats()
+    {
+        if (nle_)
+            throw std::runtime_error("enable_stats called after reset()");
+        settings_.stats = &stats_;
+    }
+
+    void
+    enable_headless()
+    {
+        if (nle_)
+            throw std::runtime_error("enable_headless called after reset()");
+        settings_.headless = 1;
+    }
+
+    // Phase name -> (calls, nanoseconds).
+    py::dict
+    get_stats()
+    {
+        ScopedUse use(in_use_);
+        static const char *names[NLE_STATS_SIZE] = {
+            "start", "step", "fill_obs", "tty", "ttyrec", "call"
+        };
+        py::dict result;
+        for (int i = 0; i < NLE_STATS_SIZE; ++i)
+            result[names[i]] =
+                py::make_tuple(stats_.calls[i], stats_.nanoseconds[i]);
+        return result;
+    }
+
+    void
+    reset_stats()
+    {
+        ScopedUse use(in_use_);
+        stats_ = {};
+    }
+
+    std::unique_ptr<NethackState>
+    clone_state()
+    {
+        ScopedUse use(in_use_);
+        if (!nle_)
+            throw std::runtime_error("clone_state called without reset()");
+
+        void *state;
+        {
+            py::gil_scoped_release gil;
+            state = nle_save_state(nle_);
+        }
+        if (!state)
+            throw std::runtime_error(
+                "Game states not supported on this platform");
+
+        auto result =
+            std::make_unique<NethackState>(this, episode_, state);
+        result->done_ = obs_.done;
+        result->in_normal_game_ = obs_.in_normal_game;
+        result->how_done_ = obs_.how_done;
+        for (const py::object &obj : py_buffers_) {
+            if (obj.is_none()) {
+                result->buffers_.emplace_back();
+                continue;
+            }
+            py::buffer_info buf = py::array(obj).request();
+            result->buffers_.emplace_back(static_cast<const char *>(buf.ptr),
+                                          buf.size * buf.itemsize);
+        }
+        return result;
+    }
+
+    void
+    restore_state(const NethackState &state)
+    {
+        ScopedUse use(in_use_);
+        if (state.owner_ != this || state.episode_ != episode_ || !nle_)
+            throw std::invalid_argument(
+                "State not from this Nethack's current episode");
+
+        {
+            py::gil_scoped_release gil;
+            nle_restore_state(nle_, state.state_);
+        }
+
+        obs_.done = state.done_;
+        obs_.in_normal_game = state.in_normal_game_;
+        obs_.how_done = state.how_done_;
+        for (size_t i = 0; i < py_buffers_.size(); ++i) {
+            if (py_buffers_[i].is_none())
+                continue;
+            py::buffer_info buf = py::array(py_buffers_[i]).request(true);
+            const std::string &data = state.buffers_[i];
+            std::memcpy(buf.ptr, data.data(), data.size());
+        }
+    }
+
     void
     reset()
     {
+        ScopedUse use(in_use_);
+        ScopedTimer timer(settings_.stats, NLE_STATS_CALL);
         reset(nullptr);
     }
 
     void
     reset(std::string ttyrec)
     {
+        ScopedUse use(in_use_);
+        int codec = ttyrec_codec(ttyrec);
         FILE *f = std::fopen(ttyrec.c_str(), "a");
         if (!f) {
             PyErr_SetFromErrnoWithFilename(PyExc_OSError, ttyrec.c_str());
             throw py::error_already_set();
         }
+        settings_.ttyrec_codec = codec;
 
         std::size_t found = ttyrec.rfind("/");
         if (found != std::string::npos && (found + 1) < ttyrec.length())
@@ -194,6 +666,7 @@ class Nethack
         // Reset environment, then close original FILE. Cannot use freopen
         // as the game may still need to write to the original file but
         // reset() wants to get the new one already.
+        ScopedTimer timer(settings_.stats, NLE_STATS_CALL);
         reset(f);
         if (ttyrec_) {
             fclose(ttyrec_);
@@ -208,7 +681,13 @@ class Nethack
                 py::object inv_glyphs, py::object inv_letters,
                 py::object inv_oclasses, py::object inv_strs,
                 py::object screen_descriptions, py::object tty_chars,
-                py::object tty_colors, py::object tty_cursor, py::object misc)
+                py::object tty_colors, py::object tty_cursor, py::object misc,
+                py::object glyphs_changed, py::object explored_cells,
+                py::object egocentric_glyphs, py::object egocentric_chars,
+                py::object egocentric_colors, py::object level_maps,
+                py::object level_map_levels, py::object action_mask,
+                int egocentric_radius, int egocentric_pad_glyph,
+                std::vector<int> actions)
     {
         if (nle_)
             throw std::runtime_error("set_buffers called after reset()");
@@ -242,6 +721,31 @@ class Nethack
             tty_colors, { NLE_TERM_LI, NLE_TERM_CO });
         obs_.tty_cursor = checked_conversion<uint8_t>(tty_cursor, { 2 });
         obs_.misc = checked_conversion<int32_t>(misc, { NLE_MISC_SIZE });
+        obs_.glyphs_changed =
+            checked_conversion<uint8_t>(glyphs_changed, dungeon);
+        obs_.explored_cells = checked_conversion<int32_t>(
+            explored_cells, { MAXDUNGEON, MAXLEVEL });
+        std::vector<ssize_t> egocentric =
+            egocentric_shape(egocentric_radius, egocentric_pad_glyph);
+        obs_.egocentric_glyphs =
+            checked_conversion<int16_t>(egocentric_glyphs, egocentric);
+        obs_.egocentric_chars =
+            checked_conversion<uint8_t>(egocentric_chars, egocentric);
+        obs_.egocentric_colors =
+            checked_conversion<uint8_t>(egocentric_colors, egocentric);
+        obs_.egocentric_radius = egocentric_radius;
+        obs_.egocentric_pad_glyph = egocentric_pad_glyph;
+        obs_.level_maps = checked_conversion<int16_t>(
+            level_maps, { NLE_LEVEL_MAPS, ROWNO, COLNO - 1 });
+        obs_.level_map_levels = checked_conversion<int32_t>(
+            level_map_levels, { NLE_LEVEL_MAPS, 2 });
+        check_actions(actions);
+        actions_ = std::move(actions);
+        obs_.action_mask = checked_conversion<uint8_t>(
+            action_mask, { (ssize_t) actions_.size() });
+        obs_.actions = actions_.data();
+        obs_.num_actions = actions_.size();
+        set_fallback_buffers();
 
         py_buffers_ = { std::move(glyphs),
                         std::move(chars),
@@ -259,12 +763,21 @@ class Nethack
                         std::move(tty_chars),
                         std::move(tty_colors),
                         std::move(tty_cursor),
-                        std::move(misc) };
+                        std::move(misc),
+                        std::move(glyphs_changed),
+                        std::move(explored_cells),
+                        std::move(egocentric_glyphs),
+                        std::move(egocentric_chars),
+                        std::move(egocentric_colors),
+                        std::move(level_maps),
+                        std::move(level_map_levels),
+                        std::move(action_mask) };
     }
 
     void
     close()
     {
+        ScopedUse use(in_use_);
         if (nle_) {
             nle_end(nle_);
             nle_ = nullptr;
@@ -288,6 +801,7 @@ class Nethack
     set_seeds(unsigned long core, unsigned long disp, bool reseed)
     {
 #ifdef NLE_ALLOW_SEEDING
+        ScopedUse use(in_use_);
         if (!nle_)
             throw std::runtime_error("set_seed called without reset()");
         nle_set_seed(nle_, core, disp, reseed);
@@ -300,6 +814,7 @@ class Nethack
     get_seeds()
     {
 #ifdef NLE_ALLOW_SEEDING
+        ScopedUse use(in_use_);
         if (!nle_)
             throw std::runtime_error("get_seed called without reset()");
         std::tuple<unsigned long, unsigned long, bool> result;
@@ -340,6 +855,7 @@ class Nethack
     reset(FILE *ttyrec)
     {
         py::gil_scoped_release gil;
+        begin_step(obs_);
 
         if (!ttyrec)
             strncpy(settings_.ttyrecname, "", sizeof(settings_.ttyrecname));
@@ -347,41 +863,406 @@ class Nethack
         if (!nle_) {
             nle_ =
                 nle_start(dlpath_.c_str(), &obs_, ttyrec ? ttyrec : ttyrec_,
-                          use_seed_init ? &seed_init_ : nullptr, &settings_);
+                          use_seed_init ? &seed_init_ : nullptr, &settings_,
+                          fast_reset_);
         } else
             nle_reset(nle_, &obs_, ttyrec,
                       use_seed_init ? &seed_init_ : nullptr, &settings_);
         use_seed_init = false;
+        ++episode_;
 
+        if (policy_.reset_to_moveloop)
+            reset_to_moveloop(nle_, obs_);
         if (obs_.done)
             throw std::runtime_error("NetHack done right after reset");
     }
 
+    // Leaves out alone if the map isn't shown.
+    void
+    lookup_descriptions(const std::vector<int> &cells, unsigned char *out)
+    {
+        ScopedUse use(in_use_);
+        if (!nle_)
+            throw std::runtime_error("describe called without reset()");
+
+        py::gil_scoped_release gil;
+        nle_describe(nle_, cells.size(), cells.data(), out);
+    }
+
+    // The skip policy needs these observations even if not requested.
+    void
+    set_fallback_buffers()
+    {
+        if (!obs_.message)
+            obs_.message = message_;
+        if (!obs_.program_state)
+            obs_.program_state = program_state_;
+        if (!obs_.internal)
+            obs_.internal = internal_;
+    }
+
     std::string dlpath_;
     nle_obs obs_;
     std::vector<py::object> py_buffers_;
+    std::vector<int> actions_; /* The keys of obs_.action_mask. */
     nle_seeds_init_t seed_init_;
     bool use_seed_init = false;
     nledl_ctx *nle_ = nullptr;
     std::FILE *ttyrec_ = nullptr;
     nle_settings settings_;
+    bool fast_reset_;
+    uint64_t episode_ = 0;
+    std::atomic<bool> in_use_{ false };
+    SkipPolicy policy_;
+    nle_stats stats_{};
+
+    unsigned char message_[NLE_MESSAGE_SIZE]{};
+    int program_state_[NLE_PROGRAM_STATE_SIZE]{};
+    int internal_[NLE_INTERNAL_SIZE]{};
+};
+
+// N games stepped with one call, writing into stacked [N, ...] arrays.
+class BatchNethack
+{
+  public:
+    BatchNethack(std::vector<std::string> dlpaths,
+                 std::vector<std::string> hackdirs,
+                 std::string nethackoptions, bool spawn_monsters,
+                 bool fast_reset)
+        : games_(dlpaths.size()), fast_reset_(fast_reset)
+    {
+        if (games_.empty())
+            throw std::invalid_argument("BatchNethack needs at least one game");
+        if (hackdirs.size() != games_.size())
+            throw std::invalid_argument(
+                "Need as many hackdirs as dlpaths");
+        if (nethackoptions.size() > sizeof(nle_settings::options)) {
+            throw std::length_error("nethackoptions too long");
+        }
+
+        for (size_t i = 0; i < games_.size(); ++i) {
+            Game &game = games_[i];
+            if (hackdirs[i].size() > sizeof(game.settings.hackdir) - 1) {
+                throw std::length_error("hackdir too long");
+            }
+            game.dlpath = std::move(dlpaths[i]);
+            strncpy(game.settings.hackdir, hackdirs[i].c_str(),
+                    sizeof(game.settings.hackdir));
+            strncpy(game.settings.options, nethackoptions.c_str(),
+                    sizeof(game.settings.options));
+            game.settings.spawn_monsters = spawn_monsters;
+            game.set_fallback_buffers();
+        }
+        policy_.reset_to_moveloop = true;
+    }
+
+    ~BatchNethack()
+    {
+        close();
+    }
+
+    BatchNethack(const BatchNethack &) = delete;
+    BatchNethack &operator=(const BatchNethack &) = delete;
+
+    size_t
+    size()
+    {
+        return games_.size();
+    }
+
+    std::tuple<py::array_t<bool>, py::array_t<float> >
+    step(py::array_t<int, py::array::c_style | py::array::forcecast> actions)
+    {
+        ScopedUse use(in_use_);
+        if (!started_)
+            throw std::runtime_error("step called without reset()");
+        if (actions.ndim() != 1 || actions.shape(0) != (ssize_t) games_.size())
+            throw std::invalid_argument("Need one action per game");
+
+        py::array_t<bool> done(games_.size());
+        py::array_t<float> reward(games_.size());
+        const int *action = actions.data();
+        bool *d = done.mutable_data();
+        float *r = reward.mutable_data();
+        {
+            py::gil_scoped_release gil;
+            for (size_t i = 0; i < games_.size(); ++i) {
+                Game &game = games_[i];
+                begin_step(game.obs);
+                step_game(game.nle, game.obs, action[i]);
+                skip_prompts(game.nle, game.obs, policy_);
+
+                // Difference in score, like NLE's default reward.
+                r[i] = 0.0;
+                if (game.obs.in_normal_game) {
+                    long score = game.obs.blstats[NLE_BL_SCORE];
+                    r[i] = score - game.score;
+                    game.score = score;
+                }
+                d[i] = game.obs.done;
+                if (game.obs.done)
+                    reset(game);
+            }
+        }
+        return std::make_tuple(std::move(done), std::move(reward));
+    }
+
+    void
+    reset()
+    {
+        ScopedUse use(in_use_);
+        py::gil_scoped_release gil;
+        for (Game &game : games_)
+            reset(game);
+        started_ = true;
+    }
+
+    void
+    set_skip_policy(bool every_step, bool on_game_over, bool decline_yn,
+                    std::vector<std::string> yn_exceptions,
+                    bool reset_to_moveloop)
+    {
+        ScopedUse use(in_use_);
+        policy_.every_step = every_step;
+        policy_.on_game_over = on_game_over;
+        policy_.decline_yn = decline_yn;
+        policy_.yn_exceptions = std::move(yn_exceptions);
+        policy_.reset_to_moveloop = reset_to_moveloop;
+    }
+
+    void
+    reset(size_t index)
+    {
+        ScopedUse use(in_use_);
+        if (!started_)
+            throw std::runtime_error("reset(index) called without reset()");
+        if (index >= games_.size())
+            throw std::out_of_range("Game index out of range");
+        py::gil_scoped_release gil;
+        reset(games_[index]);
+    }
+
+    void
+    set_buffers(py::object glyphs, py::object chars, py::object colors,
+                py::object specials, py::object blstats, py::object message,
+                py::object program_state, py::object internal,
+                py::object inv_glyphs, py::object inv_letters,
+                py::object inv_oclasses, py::object inv_strs,
+                py::object screen_descriptions, py::object tty_chars,
+                py::object tty_colors, py::object tty_cursor, py::object misc,
+                py::object glyphs_changed, py::object explored_cells,
+                py::object egocentric_glyphs, py::object egocentric_chars,
+                py::object egocentric_colors, py::object level_maps,
+                py::object level_map_levels, py::object action_mask,
+                int egocentric_radius, int egocentric_pad_glyph,
+                std::vector<int> actions)
+    {
+        if (started_)
+            throw std::runtime_error("set_buffers called after reset()");
+
+        std::vector<ssize_t> dungeon{ ROWNO, COLNO - 1 };
+        set_buffer(glyphs, dungeon, &nle_obs::glyphs);
+        set_buffer(chars, dungeon, &nle_obs::chars);
+        set_buffer(colors, dungeon, &nle_obs::colors);
+        set_buffer(specials, dungeon, &nle_obs::specials);
+        set_buffer(blstats, { NLE_BLSTATS_SIZE }, &nle_obs::blstats);
+        set_buffer(message, { NLE_MESSAGE_SIZE }, &nle_obs::message);
+        set_buffer(program_state, { NLE_PROGRAM_STATE_SIZE },
+                   &nle_obs::program_state);
+        set_buffer(internal, { NLE_INTERNAL_SIZE }, &nle_obs::internal);
+        set_buffer(inv_glyphs, { NLE_INVENTORY_SIZE }, &nle_obs::inv_glyphs);
+        set_buffer(inv_letters, { NLE_INVENTORY_SIZE },
+                   &nle_obs::inv_letters);
+        set_buffer(inv_oclasses, { NLE_INVENTORY_SIZE },
+                   &nle_obs::inv_oclasses);
+        set_buffer(inv_strs, { NLE_INVENTORY_SIZE, NLE_INVENTORY_STR_LENGTH },
+                   &nle_obs::inv_strs);
+        set_buffer(screen_descriptions,
+                   { ROWNO, COLNO - 1, NLE_SCREEN_DESCRIPTION_LENGTH },
+                   &nle_obs::screen_descriptions);
+        set_buffer(tty_chars, { NLE_TERM_LI, NLE_TERM_CO },
+                   &nle_obs::tty_chars);
+        set_buffer(tty_colors, { NLE_TERM_LI, NLE_TERM_CO },
+                   &nle_obs::tty_colors);
+        set_buffer(tty_cursor, { 2 }, &nle_obs::tty_cursor);
+        set_buffer(misc, { NLE_MISC_SIZE }, &nle_obs::misc);
+        set_buffer(glyphs_changed, dungeon, &nle_obs::glyphs_changed);
+        set_buffer(explored_cells, { MAXDUNGEON, MAXLEVEL },
+                   &nle_obs::explored_cells);
+        std::vector<ssize_t> egocentric =
+            egocentric_shape(egocentric_radius, egocentric_pad_glyph);
+        set_buffer(egocentric_glyphs, egocentric,
+                   &nle_obs::egocentric_glyphs);
+        set_buffer(egocentric_chars, egocentric, &nle_obs::egocentric_chars);
+        set_buffer(egocentric_colors, egocentric,
+                   &nle_obs::egocentric_colors);
+        set_buffer(level_maps, { NLE_LEVEL_MAPS, ROWNO, COLNO - 1 },
+                   &nle_obs::level_maps);
+        set_buffer(level_map_levels, { NLE_LEVEL_MAPS, 2 },
+                   &nle_obs::level_map_levels);
+        check_actions(actions);
+        actions_ = std::move(actions);
+        set_buffer(action_mask, { (ssize_t) actions_.size() },
+                   &nle_obs::action_mask);
+        for (Game &game : games_) {
+            game.obs.egocentric_radius = egocentric_radius;
+            game.obs.egocentric_pad_glyph = egocentric_pad_glyph;
+            game.obs.actions = actions_.data();
+            game.obs.num_actions = actions_.size();
+        }
+
+        for (Game &game : games_)
+            game.set_fallback_buffers();
+
+        py_buffers_ = { std::move(glyphs),
+                        std::move(chars),
+                        std::move(colors),
+                        std::move(specials),
+                        std::move(blstats),
+                        std::move(message),
+                        std::move(program_state),
+                        std::move(internal),
+                        std::move(inv_glyphs),
+                        std::move(inv_letters),
+                        std::move(inv_oclasses),
+                        std::move(inv_strs),
+                        std::move(screen_descriptions),
+                        std::move(tty_chars),
+                        std::move(tty_colors),
+                        std::move(tty_cursor),
+                        std::move(misc),
+                        std::move(glyphs_changed),
+                        std::move(explored_cells),
+                        std::move(egocentric_glyphs),
+                        std::move(egocentric_chars),
+                        std::move(egocentric_colors),
+                        std::move(level_maps),
+                        std::move(level_map_levels),
+                        std::move(action_mask) };
+    }
+
+    void
+    close()
+    {
+        ScopedUse use(in_use_);
+        for (Game &game : games_) {
+            if (game.nle) {
+                nle_end(game.nle);
+                game.nle = nullptr;
+            }
+        }
+        started_ = false;
+    }
+
+  private:
+    struct Game {
+        std::string dlpath;
+        nledl_ctx *nle = nullptr;
+        nle_obs obs{};
+        nle_settings settings{};
+        long score = 0;
+
+        // Rewards and the skip policy need these even if not requested.
+        long blstats[NLE_BLSTATS_SIZE]{};
+        unsigned char message[NLE_MESSAGE_SIZE]{};
+        int program_state[NLE_PROGRAM_STATE_SIZE]{};
+        int internal[NLE_INTERNAL_SIZE]{};
+
+        void
+        set_fallback_buffers()
+        {
+            if (!obs.blstats)
+                obs.blstats = blstats;
+            if (!obs.message)
+                obs.message = message;
+            if (!obs.program_state)
+                obs.program_state = program_state;
+            if (!obs.internal)
+                obs.internal = internal;
+        }
+    };
+
+    // Points each game's observation into its slice of a stacked array.
+    template <typename T>
+    void
+    set_buffer(py::handle h, std::vector<ssize_t> shape, T *nle_obs::*field)
+    {
+        ssize_t stride = 1;
+        for (ssize_t dim : shape)
+            stride *= dim;
+        shape.insert(shape.begin(), games_.size());
+
+        T *data = checked_conversion<T>(h, shape);
+        for (size_t i = 0; i < games_.size(); ++i)
+            games_[i].obs.*field = data ? data + i * stride : nullptr;
+    }
+
+    // Starts a new game. Must be called without the GIL.
+    void
+    reset(Game &game)
+    {
+        begin_step(game.obs);
+        if (!game.nle)
+            game.nle = nle_start(game.dlpath.c_str(), &game.obs, nullptr,
+                                 nullptr, &game.settings, fast_reset_);
+        else
+            nle_reset(game.nle, &game.obs, nullptr, nullptr, &game.settings);
+
+        if (policy_.reset_to_moveloop)
+            reset_to_moveloop(game.nle, game.obs);
+        if (game.obs.done)
+            throw std::runtime_error("NetHack done right after reset");
+        game.score = game.obs.blstats[NLE_BL_SCORE];
+    }
+
+    std::vector<Game> games_;
+    std::vector<py::object> py_buffers_;
+    std::vector<int> actions_; /* The keys of the action_mask buffers. */
+    bool fast_reset_;
+    bool started_ = false;
+    std::atomic<bool> in_use_{ false };
+    SkipPolicy policy_;
 };
 
 PYBIND11_MODULE(_pynethack, m)
 {
     m.doc() = "The NetHack Learning Environment";
 
+    py::class_<NethackState>(m, "NethackState");
+
     py::class_<Nethack>(m, "Nethack")
         .def(py::init<std::string, std::string, std::string, std::string,
-                      bool, std::string>(),
+                      bool, std::string, bool>(),
              py::arg("dlpath"), py::arg("ttyrec"), py::arg("hackdir"),
              py::arg("nethackoptions"), py::arg("spawn_monsters") = true,
-             py::arg("scoreprefix") = "")
-        .def(py::init<std::string, std::string, std::string, bool>(),
+             py::arg("scoreprefix") = "", py::arg("fast_reset") = false)
+        .def(py::init<std::string, std::string, std::string, bool, bool>(),
              py::arg("dlpath"), py::arg("hackdir"), py::arg("nethackoptions"),
-             py::arg("spawn_monsters") = true)
-        .def("step", &Nethack::step, py::arg("action"))
+             py::arg("spawn_monsters") = true,
+             py::arg("fast_reset") = false)
+        .def("step", &Nethack::step, py::arg("action"),
+             py::arg("skip_prompts") = false)
+        .def("enable_stats", &Nethack::enable_stats)
+        .def("enable_headless", &Nethack::enable_headless)
+        .def("get_stats", &Nethack::get_stats)
+        .def("reset_stats", &Nethack::reset_stats)
+        .def("describe", &Nethack::describe, py::arg("x"), py::arg("y"))
+        .def("describe_cells", &Nethack::describe_cells, py::arg("mask"))
+        .def("level_map", &Nethack::level_map, py::arg("dnum"),
+             py::arg("dlevel"))
+        .def("step_many", &Nethack::step_many, py::arg("actions"),
+             py::arg("skip_prompts") = false,
+             py::arg("stop_on_message") = false,
+             py::arg("stop_on_hp_drop") = false,
+             py::arg("stop_on_level_change") = false)
+        .def("set_skip_policy", &Nethack::set_skip_policy,
+             py::arg("every_step") = false, py::arg("on_game_over") = false,
+             py::arg("decline_yn") = true,
+             py::arg("yn_exceptions") = std::vector<std::string>(),
+             py::arg("reset_to_moveloop") = false)
         .def("done", &Nethack::done)
+        .def("clone_state", &Nethack::clone_state)
+        .def("restore_state", &Nethack::restore_state, py::arg("state"))
         .def("reset", py::overload_cast<>(&Nethack::reset))
         .def("reset", py::overload_cast<std::string>(&Nethack::reset))
         .def("set_buffers", &Nethack::set_buffers,
@@ -397,7 +1278,18 @@ PYBIND11_MODULE(_pynethack, m)
              py::arg("screen_descriptions") = py::none(),
              py::arg("tty_chars") = py::none(),
              py::arg("tty_colors") = py::none(),
-             py::arg("tty_cursor") = py::none(), py::arg("misc") = py::none())
+             py::arg("tty_cursor") = py::none(), py::arg("misc") = py::none(),
+             py::arg("glyphs_changed") = py::none(),
+             py::arg("explored_cells") = py::none(),
+             py::arg("egocentric_glyphs") = py::none(),
+             py::arg("egocentric_chars") = py::none(),
+             py::arg("egocentric_colors") = py::none(),
+             py::arg("level_maps") = py::none(),
+             py::arg("level_map_levels") = py::none(),
+             py::arg("action_mask") = py::none(),
+             py::arg("egocentric_radius") = NLE_EGOCENTRIC_RADIUS,
+             py::arg("egocentric_pad_glyph") = GLYPH_CMAP_OFF,
+             py::arg("actions") = std::vector<int>())
         .def("close", &Nethack::close)
         .def("set_initial_seeds", &Nethack::set_initial_seeds)
         .def("set_seeds", &Nethack::set_seeds)
@@ -406,6 +1298,49 @@ PYBIND11_MODULE(_pynethack, m)
         .def("how_done", &Nethack::how_done)
         .def("set_wizkit", &Nethack::set_wizkit);
 
+    py::class_<BatchNethack>(m, "BatchNethack")
+        .def(py::init<std::vector<std::string>, std::vector<std::string>,
+                      std::string, bool, bool>(),
+             py::arg("dlpaths"), py::arg("hackdirs"),
+             py::arg("nethackoptions"), py::arg("spawn_monsters") = true,
+             py::arg("fast_reset") = false)
+        .def("__len__", &BatchNethack::size)
+        .def("step", &BatchNethack::step, py::arg("actions"))
+        .def("set_skip_policy", &BatchNethack::set_skip_policy,
+             py::arg("every_step") = false, py::arg("on_game_over") = false,
+             py::arg("decline_yn") = true,
+             py::arg("yn_exceptions") = std::vector<std::string>(),
+             py::arg("reset_to_moveloop") = true)
+        .def("reset", py::overload_cast<>(&BatchNethack::reset))
+        .def("reset", py::overload_cast<size_t>(&BatchNethack::reset),
+             py::arg("index"))
+        .def("set_buffers", &BatchNethack::set_buffers,
+             py::arg("glyphs") = py::none(), py::arg("chars") = py::none(),
+             py::arg("colors") = py::none(), py::arg("specials") = py::none(),
+             py::arg("blstats") = py::none(), py::arg("message") = py::none(),
+             py::arg("program_state") = py::none(),
+             py::arg("internal") = py::none(),
+             py::arg("inv_glyphs") = py::none(),
+             py::arg("inv_letters") = py::none(),
+             py::arg("inv_oclasses") = py::none(),
+             py::arg("inv_strs") = py::none(),
+             py::arg("screen_descriptions") = py::none(),
+             py::arg("tty_chars") = py::none(),
+             py::arg("tty_colors") = py::none(),
+             py::arg("tty_cursor") = py::none(), py::arg("misc") = py::none(),
+             py::arg("glyphs_changed") = py::none(),
+             py::arg("explored_cells") = py::none(),
+             py::arg("egocentric_glyphs") = py::none(),
+             py::arg("egocentric_chars") = py::none(),
+             py::arg("egocentric_colors") = py::none(),
+             py::arg("level_maps") = py::none(),
+             py::arg("level_map_levels") = py::none(),
+             py::arg("action_mask") = py::none(),
+             py::arg("egocentric_radius") = NLE_EGOCENTRIC_RADIUS,
+             py::arg("egocentric_pad_glyph") = GLYPH_CMAP_OFF,
+             py::arg("actions") = std::vector<int>())
+        .def("close", &BatchNethack::close);
+
     py::module mn = m.def_submodule(
         "nethack", "Collection of NetHack constants and functions");
 
@@ -419,6 +1354,8 @@ PYBIND11_MODULE(_pynethack, m)
     mn.attr("NLE_INVENTORY_STR_LENGTH") = py::int_(NLE_INVENTORY_STR_LENGTH);
     mn.attr("NLE_SCREEN_DESCRIPTION_LENGTH") =
         py::int_(NLE_SCREEN_DESCRIPTION_LENGTH);
+    mn.attr("NLE_EGOCENTRIC_RADIUS") = py::int_(NLE_EGOCENTRIC_RADIUS);
+    mn.attr("NLE_LEVEL_MAPS") = py::int_(NLE_LEVEL_MAPS);
 
     mn.attr("NLE_BL_X") = py::int_(NLE_BL_X);
     mn.attr("NLE_BL_Y") = py::int_(NLE_BL_Y);
@@ -454,10 +1391,18 @@ PYBIND11_MODULE(_pynethack, m)
 #else
         false;
 #endif
+    mn.attr("NLE_ZSTD_TTYRECS") =
+#ifdef NLE_ZSTD_TTYRECS
+        true;
+#else
+        false;
+#endif
 
     /* NetHack constants. */
     mn.attr("ROWNO") = py::int_(ROWNO);
     mn.attr("COLNO") = py::int_(COLNO);
+    mn.attr("MAXDUNGEON") = py::int_(MAXDUNGEON);
+    mn.attr("MAXLEVEL") = py::int_(MAXLEVEL);
     mn.attr("NLE_TERM_LI") = py::int_(NLE_TERM_LI);
     mn.attr("NLE_TERM_CO") = py::int_(NLE_TERM_CO);
 
@@ -1,8 +1,9 @@
 /* Copyright (c) Facebook, Inc. and its affiliates. */
+#include <algorithm>
 #include <array>
+#include <bitset>
 #include <cassert>
 #include <cstring>
-#include <deque>
 #include <iostream>
 #include <map>
 #include <memory>
@@ -16,6 +17,7 @@ extern "C" {
 }
 
 extern "C" {
+#include "func_tab.h"
 #include "wintty.h"
 }
 
@@ -40,6 +42,7 @@ extern "C" {
  * is required to continue.
  */
 extern bool xwaitingforspace;
+extern const char *xwaitingforspace_chars;
 
 /* some hack.h macros. Can be undefined here. */
 #undef Invisible
@@ -55,6 +58,9 @@ extern unsigned long nle_seeds[];
 extern "C" {
 extern void *nle_yield(boolean);
 extern nle_obs *nle_get_obs();
+extern unsigned long long nle_stats_start();
+extern void nle_stats_end(int, unsigned long long);
+extern int nle_headless();
 }
 
 /* Initial value of glyph_ buffer. Cf. display.c. */
@@ -62,9 +68,17 @@ const int nul_glyph = cmap_to_glyph(S_stone);
 
 namespace nethack_rl
 {
-std::deque<std::string> win_proc_calls;
+// Plain data only: Globals in this library must not own heap memory, as
+// nle_reset in nledl.c may restore them from a snapshot.
+struct ProcCalls {
+    std::array<const char *, 32> calls;
+    size_t size;
+} win_proc_calls;
 bool in_yn_function = false;
 bool in_getlin = false;
+const char *yn_choices = nullptr; /* Of the current yn_function. */
+char yn_default = 0;
+winid select_menu_win = WIN_ERR; /* Of the current select_menu. */
 
 // Glyphs provide instructions for windows to render the game (see display.h).
 // At the start of the game, descriptions and properties of the object classes
@@ -89,19 +103,20 @@ shuffled_glyph(int glyph)
 class ScopedStack
 {
   public:
-    ScopedStack(std::deque<std::string> &deque, std::string &&s)
-        : deque_(deque)
+    ScopedStack(ProcCalls &stack, const char *s) : stack_(stack)
     {
-        deque_.push_back(s);
+        if (stack_.size < stack_.calls.size())
+            stack_.calls[stack_.size] = s;
+        ++stack_.size;
     }
 
     ~ScopedStack()
     {
-        deque_.pop_back();
+        --stack_.size;
     }
 
   private:
-    std::deque<std::string> &deque_;
+    ProcCalls &stack_;
 };
 
 class NetHackRL
@@ -161,6 +176,11 @@ class NetHackRL
                                  int percent, int color,
                                  unsigned long *colormasks);
 
+    static void rl_free_instance();
+    static void rl_fill_obs(nle_obs *);
+    static bool rl_describe(int n, const int *cells, unsigned char *out);
+    static bool rl_level_map(int dnum, int dlevel, int16_t *out);
+
   private:
     struct rl_menu_item {
         int glyph;           /* character glyph */
@@ -203,13 +223,70 @@ class NetHackRL
 
     std::array<char, (COLNO - 1) * ROWNO * NLE_SCREEN_DESCRIPTION_LENGTH>
         screen_descriptions_;
+    /* Cells printed since their description was last computed. Looking
+       up descriptions is slow, so it's done only once they are asked for
+       (by fill_obs or nle_describe). */
+    std::bitset<(COLNO - 1) * ROWNO> descriptions_stale_;
+
+    /* Buffers fill_obs copies only in parts that changed since it last
+       copied them to the same place. Inventory buffers use row 0 only. */
+    enum dirty_buffer {
+        DIRTY_GLYPHS,
+        DIRTY_CHARS,
+        DIRTY_COLORS,
+        DIRTY_SPECIALS,
+        DIRTY_SCREEN_DESCRIPTIONS,
+        NUM_DIRTY_MAP,
+        DIRTY_INV_GLYPHS = NUM_DIRTY_MAP,
+        DIRTY_INV_STRS,
+        DIRTY_INV_LETTERS,
+        DIRTY_INV_OCLASSES,
+        NUM_DIRTY
+    };
+    struct dirty_rows {
+        const void *dst = nullptr;
+        std::bitset<ROWNO> rows;
+    };
+    std::array<dirty_rows, NUM_DIRTY> dirty_;
+    /* Cells whose glyph changed since the last glyphs_changed observation. */
+    std::bitset<(COLNO - 1) * ROWNO> glyphs_changed_;
+    /* Cells of the map that aren't unexplored stone, and the same count
+       for each level as of when it was last shown, see store_glyph. */
+    int explored_ = 0;
+    std::array<int32_t, MAXDUNGEON * MAXLEVEL> explored_cells_{};
+
+    /* The glyphs of each level as of when it was last shown, in the order
+       the levels were first shown. dirty has the rows that changed since
+       fill_obs last copied them to level_maps_dst_. */
+    struct level_map {
+        int dnum;
+        int dlevel;
+        std::array<int16_t, (COLNO - 1) * ROWNO> glyphs;
+        std::bitset<ROWNO> dirty;
+    };
+    std::vector<level_map> level_maps_;
+    /* Index into level_maps_ by dnum and dlevel - 1, or -1. */
+    std::array<int, MAXDUNGEON * MAXLEVEL> level_map_index_;
+    /* Index of the level the map shows, -1 until it's drawn after being
+       cleared. */
+    int shown_level_ = -1;
+    const int16_t *level_maps_dst_ = nullptr;
+
+    void mark_dirty(int first, int last, size_t row);
+    std::bitset<ROWNO> take_dirty_rows(dirty_buffer buffer, const void *dst);
 
     void store_glyph(XCHAR_P x, XCHAR_P y, int glyph);
+    int show_level();
+    void fill_level_maps(nle_obs *);
     void store_mapped_glyph(int ch, int color, int special, XCHAR_P x,
                             XCHAR_P y);
-    void store_screen_description(XCHAR_P x, XCHAR_P y, int glyph);
+    void describe_cell(size_t offset, char *description);
+    const char *screen_description(size_t offset);
+    void update_screen_descriptions();
 
     void fill_obs(nle_obs *);
+    void fill_egocentric(nle_obs *, bool);
+    void fill_action_mask(nle_obs *);
     int getch_method();
 
     std::array<std::string, MAXBLSTATS> status_;
@@ -241,13 +318,15 @@ class NetHackRL
 std::unique_ptr<NetHackRL> NetHackRL::instance =
     std::unique_ptr<NetHackRL>(nullptr);
 
-NetHackRL::NetHackRL(int &argc, char **argv) : glyphs_(), blstats_{}
+NetHackRL::NetHackRL(int &argc, char **argv)
+    : glyphs_(), screen_descriptions_(), blstats_{}
 {
     // create base window
     // (done in tty_init_nhwindows before this NetHackRL object got created).
     assert(BASE_WINDOW == 0);
     windows_.emplace_back(new rl_window({ NHW_BASE }));
     glyphs_.fill(nul_glyph);
+    level_map_index_.fill(-1);
 }
 
 void
@@ -256,6 +335,226 @@ NetHackRL::player_selection_method()
     windows_[BASE_WINDOW]->strings.clear();
 }
 
+template <typename T, size_t N>
+static void
+copy_rows(T *dst, const std::array<T, N> &src, const std::bitset<ROWNO> &rows)
+{
+    const size_t row = N / ROWNO;
+    if (rows.all()) {
+        std::memcpy(dst, src.data(), sizeof(T) * N);
+        return;
+    }
+    for (size_t j = 0; j < ROWNO; ++j) {
+        if (rows[j])
+            std::memcpy(dst + j * row, &src[j * row], sizeof(T) * row);
+    }
+}
+
+/* Whether the map etc. are shown, see fill_obs. */
+static bool
+in_normal_game()
+{
+    // Game not yet started (!something_worth_saving && !in_moveloop -- we
+    // need both as something_worth_saving also becomes false in
+    // really_done(), but we still want to see the "Do you want..."
+    // questions) or windows have already been destroyed.
+    return (program_state.something_worth_saving || program_state.in_moveloop)
+           && iflags.window_inited;
+}
+
+/* Copies the square of src around x, y to dst, which has the square's
+   size. Cells outside of the map are pad. */
+template <typename T, size_t N>
+static void
+crop(T *dst, const std::array<T, N> &src, int x, int y, int radius, T pad)
+{
+    const int width = COLNO - 1;
+    const int size = 2 * radius + 1;
+    /* Columns of dst within the map. */
+    const int first = max(0, radius - x);
+    const int last = min(size, width - x + radius);
+
+    for (int j = 0; j < size; ++j, dst += size) {
+        int row = y - radius + j;
+        if (row < 0 || row >= ROWNO) {
+            std::fill_n(dst, size, pad);
+            continue;
+        }
+        const T *line = &src[row * width + x - radius + first];
+        std::fill(dst, dst + first, pad);
+        std::copy(line, line + last - first, dst + first);
+        std::fill(dst + last, dst + size, pad);
+    }
+}
+
+/* Whether key does anything in the current select_menu, of the keys its
+   xwaitforspace accepts, see process_menu_window in wintty.c: Menus that
+   pick nothing only page and close, and those that pick one item ignore
+   the commands that select several. */
+static bool
+valid_menu_key(char c)
+{
+    const struct WinDesc *cw = wins[select_menu_win];
+    if (c == '\033' || c == '\n' || c == '\r' || cw->how == PICK_ANY)
+        return true;
+    for (const tty_menu_item *item = cw->mlist; item; item = item->next) {
+        if (item->selector == c)
+            return cw->how == PICK_ONE;
+    }
+    switch (map_menu_cmd(c)) {
+    case ' ':
+    case MENU_FIRST_PAGE:
+    case MENU_LAST_PAGE:
+    case MENU_NEXT_PAGE:
+    case MENU_PREVIOUS_PAGE:
+        return true;
+    case MENU_SELECT_ALL:
+    case MENU_INVERT_ALL:
+    case MENU_SELECT_PAGE:
+    case MENU_INVERT_PAGE:
+        return false;
+    default:
+        return cw->how == PICK_ONE;
+    }
+}
+
+/* Whether key is accepted at the current prompt, see tty_yn_function in
+   topl.c, xwaitforspace in getline.c, process_menu_window in wintty.c,
+   and parse and rhack in cmd.c. For other prompts, all keys are. */
+static bool
+valid_key(int key)
+{
+    const char c = key;
+    if (xwaitingforspace) {
+        /* --More--, or a page of a menu or text window. */
+        const int dismiss = ttyDisplay ? ttyDisplay->dismiss_more : '\n';
+        if (c != '\n' && c != '\r'
+            && !(iflags.cbreak
+                 && (c == '\033' || c == dismiss
+                     || (xwaitingforspace_chars
+                         && std::strchr(xwaitingforspace_chars, c)))))
+            return false;
+        return select_menu_win == WIN_ERR || valid_menu_key(c);
+    }
+    if (in_getlin)
+        return true;
+    if (in_yn_function) {
+        if (!yn_choices || std::strchr(quitchars, c))
+            return true;
+        bool preserve_case = false;
+        for (const char *p = yn_choices; *p; ++p)
+            preserve_case = preserve_case || ('A' <= *p && *p <= 'Z');
+        const char q = preserve_case ? c : lowc(c);
+        return (q && std::strchr(yn_choices, q))
+               || (digit(c) && std::strchr(yn_choices, '#'));
+    }
+    if (!iflags.in_parse || !program_state.in_moveloop)
+        return true;
+
+    /* A command, or the start of a count, movement or prefixed command. */
+    const struct ext_func_tab *command = Cmd.commands[key & 0xff];
+    if (command)
+        return flags.debug || !(command->flags & WIZMODECMD);
+    if (!Cmd.num_pad && digit(c))
+        return true;
+    for (int k : { NHKF_DOAGAIN, NHKF_REQMENU, NHKF_RUN, NHKF_RUSH,
+                   NHKF_FIGHT, NHKF_NOPICKUP, NHKF_RUN_NOPICKUP }) {
+        if (c == Cmd.spkeys[k])
+            return true;
+    }
+    if (Cmd.num_pad) {
+        for (int k : { NHKF_RUN2, NHKF_FIGHT2, NHKF_DOINV, NHKF_COUNT }) {
+            if (c == Cmd.spkeys[k])
+                return true;
+        }
+    }
+    if (flags.travelcmd && c == Cmd.spkeys[NHKF_TRAVEL])
+        return true;
+    /* Walking, running and rushing, see movecmd and unmeta and unctrl in
+       cmd.c. */
+    const char run = Cmd.num_pad ? (char) (c & 0x7f) : lowc(c);
+    const char rush = (c <= 0x1a) ? (char) (0x60 | c) : c;
+    for (char d : { c, run, rush }) {
+        const char *dir = d ? std::strchr(Cmd.dirchars, d) : nullptr;
+        if (dir && !zdir[dir - Cmd.dirchars])
+            return true;
+    }
+    return false;
+}
+
+/* Whether each of obs->actions may do anything. */
+void
+NetHackRL::fill_action_mask(nle_obs *obs)
+{
+    for (int i = 0; i < obs->num_actions; ++i)
+        obs->action_mask[i] = valid_key(obs->actions[i]);
+}
+
+/* Copies the level maps that changed since the last call to the
+   level_maps observation. */
+void
+NetHackRL::fill_level_maps(nle_obs *obs)
+{
+    const size_t size = (COLNO - 1) * ROWNO;
+    const size_t n = min(level_maps_.size(), (size_t) NLE_LEVEL_MAPS);
+
+    if (obs->level_maps) {
+        if (level_maps_dst_ != obs->level_maps) {
+            // Something else is, or was written there.
+            for (size_t i = 0; i < n; ++i)
+                level_maps_[i].dirty.set();
+            std::fill(obs->level_maps + n * size,
+                      obs->level_maps + NLE_LEVEL_MAPS * size, nul_glyph);
+            level_maps_dst_ = obs->level_maps;
+        }
+        for (size_t i = 0; i < n; ++i) {
+            level_map &map = level_maps_[i];
+            if (map.dirty.any())
+                copy_rows(obs->level_maps + i * size, map.glyphs, map.dirty);
+            map.dirty.reset();
+        }
+    }
+    if (obs->level_map_levels) {
+        std::memset(obs->level_map_levels, 0,
+                    sizeof(int) * 2 * NLE_LEVEL_MAPS);
+        for (size_t i = 0; i < n; ++i) {
+            obs->level_map_levels[2 * i] = level_maps_[i].dnum;
+            obs->level_map_levels[2 * i + 1] = level_maps_[i].dlevel;
+        }
+    }
+}
+
+/* The egocentric_* observations, centered on the hero's position as in
+   blstats. Outside of normal games, they're all padding. */
+void
+NetHackRL::fill_egocentric(nle_obs *obs, bool normal)
+{
+    const int radius = obs->egocentric_radius;
+    const size_t cells = (2 * radius + 1) * (2 * radius + 1);
+    const int x = blstats_[NLE_BL_X], y = blstats_[NLE_BL_Y];
+
+    if (obs->egocentric_glyphs) {
+        if (normal)
+            crop<int16_t>(obs->egocentric_glyphs, glyphs_, x, y, radius,
+                          obs->egocentric_pad_glyph);
+        else
+            std::fill_n(obs->egocentric_glyphs, cells,
+                        obs->egocentric_pad_glyph);
+    }
+    if (obs->egocentric_chars) {
+        if (normal)
+            crop<uint8_t>(obs->egocentric_chars, chars_, x, y, radius, ' ');
+        else
+            std::memset(obs->egocentric_chars, ' ', cells);
+    }
+    if (obs->egocentric_colors) {
+        if (normal)
+            crop<uint8_t>(obs->egocentric_colors, colors_, x, y, radius, 0);
+        else
+            std::memset(obs->egocentric_colors, 0, cells);
+    }
+}
+
 void
 NetHackRL::fill_obs(nle_obs *obs)
 {
@@ -291,15 +590,23 @@ NetHackRL::fill_obs(nle_obs *obs)
         obs->misc[1] = in_getlin;
         obs->misc[2] = xwaitingforspace;
     }
+    if (obs->explored_cells) {
+        // Also kept outside of normal games, these are per level anyway.
+        std::memcpy(obs->explored_cells, explored_cells_.data(),
+                    sizeof(int32_t) * explored_cells_.size());
+    }
+    fill_level_maps(obs);
+    if (obs->action_mask)
+        fill_action_mask(obs);
 
-    if ((!program_state.something_worth_saving && !program_state.in_moveloop)
-        || !iflags.window_inited) {
-        // Game not yet started (!something_worth_saving && !in_moveloop -- we
-        // need both as something_worth_saving also becomes false in
-        // really_done(), but we still want to see the "Do you want..."
-        // questions) or windows have already been destroyed. Return zero
-        // observations.
+    if (!in_normal_game()) {
+        // Return zero observations.
         obs->in_normal_game = false;
+        for (int i = 0; i < NUM_DIRTY_MAP; ++i)
+            dirty_[i].dst = nullptr;
+        glyphs_changed_.set();
+        if (obs->glyphs_changed)
+            std::memset(obs->glyphs_changed, 1, glyphs_changed_.size());
         if (obs->glyphs)
             std::fill_n(obs->glyphs, glyphs_.size(), nul_glyph);
         if (obs->chars)
@@ -315,22 +622,35 @@ NetHackRL::fill_obs(nle_obs *obs)
         if (obs->screen_descriptions)
             std::memset(obs->screen_descriptions, 0,
                         screen_descriptions_.size());
+        fill_egocentric(obs, false);
         return;
     }
     obs->in_normal_game = true;
 
     if (obs->glyphs) {
-        std::memcpy(obs->glyphs, glyphs_.data(),
-                    sizeof(int16_t) * glyphs_.size());
+        copy_rows(obs->glyphs, glyphs_,
+                  take_dirty_rows(DIRTY_GLYPHS, obs->glyphs));
     }
     if (obs->chars) {
-        std::memcpy(obs->chars, chars_.data(), chars_.size());
+        copy_rows(obs->chars, chars_,
+                  take_dirty_rows(DIRTY_CHARS, obs->chars));
     }
     if (obs->colors) {
-        std::memcpy(obs->colors, colors_.data(), colors_.size());
+        copy_rows(obs->colors, colors_,
+                  take_dirty_rows(DIRTY_COLORS, obs->colors));
     }
     if (obs->specials) {
-        std::memcpy(obs->specials, specials_.data(), specials_.size());
+        copy_rows(obs->specials, specials_,
+                  take_dirty_rows(DIRTY_SPECIALS, obs->specials));
+    }
+    if (obs->glyphs_changed && glyphs_changed_.any()) {
+        // Accumulates until cleared by the caller, e.g. for each step
+        // of the agent, which may answer several prompts.
+        for (size_t i = 0; i < glyphs_changed_.size(); ++i) {
+            if (glyphs_changed_[i])
+                obs->glyphs_changed[i] = 1;
+        }
+        glyphs_changed_.reset();
     }
     if (obs->message) {
         // TODO: This doesn't show anything in situations where there's too
@@ -353,22 +673,23 @@ NetHackRL::fill_obs(nle_obs *obs)
             std::memset(obs->message, 0, NLE_MESSAGE_SIZE);
         }
     }
-    if (obs->blstats) {
-        if (!u.dz) {
-            /* Tricky hack: On "You descend the stairs.--More--" we are
-               technically on the next floor, but we don't see it yet.
-               But x, y needs to be updated at every step (not just when
-               blstats changes for other reasons). But if we update it
-               on the descend message, it will be the new position.
-               u.dz stays nonzero for the env step after, too, but there
-               blstats will be updated. */
-            blstats_[NLE_BL_X] = u.ux - 1; /* x coordinate, 1 <= ux <= cols */
-            blstats_[NLE_BL_Y] = u.uy;     /* y coordinate, 0 <= uy < rows */
-            blstats_[NLE_BL_TIME] = moves;
-        }
-        std::memcpy(obs->blstats, &blstats_[0], sizeof(blstats_));
+    if (!u.dz) {
+        /* Tricky hack: On "You descend the stairs.--More--" we are
+           technically on the next floor, but we don't see it yet.
+           But x, y needs to be updated at every step (not just when
+           blstats changes for other reasons). But if we update it
+           on the descend message, it will be the new position.
+           u.dz stays nonzero for the env step after, too, but there
+           blstats will be updated. */
+        blstats_[NLE_BL_X] = u.ux - 1; /* x coordinate, 1 <= ux <= cols */
+        blstats_[NLE_BL_Y] = u.uy;     /* y coordinate, 0 <= uy < rows */
+        blstats_[NLE_BL_TIME] = moves;
     }
-    if (obs->inv_glyphs) {
+    if (obs->blstats)
+        std::memcpy(obs->blstats, &blstats_[0], sizeof(blstats_));
+    fill_egocentric(obs, true);
+    if (obs->inv_glyphs
+        && take_dirty_rows(DIRTY_INV_GLYPHS, obs->inv_glyphs).any()) {
         /* This iterates over the inventory_ vector list once per inv
            observation instead of only once. I guess that's fine. */
         int i = 0;
@@ -379,7 +700,8 @@ NetHackRL::fill_obs(nle_obs *obs)
             obs->inv_glyphs[i] = NO_GLYPH;
         }
     }
-    if (obs->inv_strs) {
+    if (obs->inv_strs
+        && take_dirty_rows(DIRTY_INV_STRS, obs->inv_strs).any()) {
         int i = 0;
         for (const rl_inventory_item &item : inventory_) {
             int j = 0;
@@ -395,7 +717,8 @@ NetHackRL::fill_obs(nle_obs *obs)
             obs->inv_strs[i] = 0;
         }
     }
-    if (obs->inv_letters) {
+    if (obs->inv_letters
+        && take_dirty_rows(DIRTY_INV_LETTERS, obs->inv_letters).any()) {
         int i = 0;
         for (const rl_inventory_item &item : inventory_) {
             obs->inv_letters[i++] = item.letter;
@@ -404,7 +727,8 @@ NetHackRL::fill_obs(nle_obs *obs)
             obs->inv_letters[i] = 0;
         }
     }
-    if (obs->inv_oclasses) {
+    if (obs->inv_oclasses
+        && take_dirty_rows(DIRTY_INV_OCLASSES, obs->inv_oclasses).any()) {
         int i = 0;
         for (const rl_inventory_item &item : inventory_) {
             obs->inv_oclasses[i++] = item.object_class;
@@ -414,15 +738,41 @@ NetHackRL::fill_obs(nle_obs *obs)
         }
     }
     if (obs->screen_descriptions) {
-        memcpy(obs->screen_descriptions, &screen_descriptions_,
-               screen_descriptions_.size());
+        update_screen_descriptions();
+        copy_rows((char *) obs->screen_descriptions, screen_descriptions_,
+                  take_dirty_rows(DIRTY_SCREEN_DESCRIPTIONS,
+                                  obs->screen_descriptions));
     }
 }
 
+void
+NetHackRL::mark_dirty(int first, int last, size_t row)
+{
+    for (int i = first; i < last; ++i)
+        dirty_[i].rows.set(row);
+}
+
+/* Returns the rows to copy to dst, which are then considered clean. */
+std::bitset<ROWNO>
+NetHackRL::take_dirty_rows(dirty_buffer buffer, const void *dst)
+{
+    dirty_rows &dirty = dirty_[buffer];
+    std::bitset<ROWNO> rows = dirty.rows;
+    if (dirty.dst != dst) {
+        // Something else is, or was written there.
+        rows.set();
+        dirty.dst = dst;
+    }
+    dirty.rows.reset();
+    return rows;
+}
+
 int
 NetHackRL::getch_method()
 {
+    unsigned long long start = nle_stats_start();
     fill_obs(nle_get_obs());
+    nle_stats_end(NLE_STATS_FILL_OBS, start);
     int i = ((nle_obs *) nle_yield(TRUE))->action;
 
     /* NOT calling tty_nhgetch() but instead getting the input from
@@ -452,6 +802,7 @@ NetHackRL::update_inventory_method()
 
     struct obj *otmp;
     inventory_.clear();
+    mark_dirty(NUM_DIRTY_MAP, NUM_DIRTY, 0);
 
     for (otmp = invent; otmp; otmp = otmp->nobj) {
         inventory_.emplace_back(rl_inventory_item{
@@ -470,7 +821,48 @@ NetHackRL::store_glyph(XCHAR_P x, XCHAR_P y, int glyph)
     size_t offset = j * (COLNO - 1) + i;
 
     // TODO: Glyphs might be taken from gbuf[y][x].glyph.
-    glyphs_[offset] = shuffled_glyph(glyph);
+    int16_t shuffled = shuffled_glyph(glyph);
+    if (glyphs_[offset] != shuffled) {
+        explored_ += (shuffled != nul_glyph) - (glyphs_[offset] != nul_glyph);
+        glyphs_[offset] = shuffled;
+        glyphs_changed_.set(offset);
+        // The map shows the current level, except briefly while changing
+        // levels, which gets corrected as the new level is drawn.
+        if (u.uz.dnum < MAXDUNGEON && u.uz.dlevel > 0
+            && u.uz.dlevel <= MAXLEVEL)
+            explored_cells_[u.uz.dnum * MAXLEVEL + u.uz.dlevel - 1] =
+                explored_;
+        if (shown_level_ < 0)
+            shown_level_ = show_level();
+        if (shown_level_ >= 0) {
+            level_map &map = level_maps_[shown_level_];
+            map.glyphs[offset] = shuffled;
+            map.dirty.set(j);
+        }
+    }
+    descriptions_stale_.set(offset);
+    mark_dirty(0, NUM_DIRTY_MAP, j);
+}
+
+/* Called as the map starts showing a level, i.e. the first glyph is drawn
+   after clearing it. Starts over the level's map from what's shown.
+   Returns its index in level_maps_, or -1 if u.uz isn't a proper level. */
+int
+NetHackRL::show_level()
+{
+    if (u.uz.dnum >= MAXDUNGEON || u.uz.dlevel <= 0 || u.uz.dlevel > MAXLEVEL)
+        return -1;
+    int &index = level_map_index_[u.uz.dnum * MAXLEVEL + u.uz.dlevel - 1];
+    if (index < 0) {
+        index = level_maps_.size();
+        level_maps_.emplace_back();
+        level_maps_.back().dnum = u.uz.dnum;
+        level_maps_.back().dlevel = u.uz.dlevel;
+    }
+    level_map &map = level_maps_[index];
+    map.glyphs = glyphs_;
+    map.dirty.set();
+    return index;
 }
 
 void
@@ -487,31 +879,47 @@ NetHackRL::store_mapped_glyph(int ch, int color, int special, XCHAR_P x,
     specials_[offset] = special;
 }
 
+/* Writes NLE_SCREEN_DESCRIPTION_LENGTH bytes. */
 void
-NetHackRL::store_screen_description(XCHAR_P x, XCHAR_P y, int glyph)
+NetHackRL::describe_cell(size_t offset, char *description)
 {
-    // 1 <= x < cols, 0 <= y < rows (!)
-    size_t i = (x - 1) % (COLNO - 1);
-    size_t j = y % ROWNO;
-    size_t offset = j * (COLNO - 1) + i;
-    size_t start = offset * NLE_SCREEN_DESCRIPTION_LENGTH;
-
     // see code in src/do_name.c:538 auto_describe
     coord cc;
     int sym = 0;
     char tmpbuf[BUFSZ];
     const char *firstmatch = "unknown";
 
-    cc.x = x;
-    cc.y = y;
+    cc.x = offset % (COLNO - 1) + 1;
+    cc.y = offset / (COLNO - 1);
 
     if (do_screen_description(cc, TRUE, sym, tmpbuf, &firstmatch,
                               (struct permonst **) 0)) {
-        strncpy((char *) &screen_descriptions_ + start, firstmatch,
-                NLE_SCREEN_DESCRIPTION_LENGTH);
+        strncpy(description, firstmatch, NLE_SCREEN_DESCRIPTION_LENGTH);
     } else {
-        strncpy((char *) &screen_descriptions_ + start, "",
-                NLE_SCREEN_DESCRIPTION_LENGTH);
+        strncpy(description, "", NLE_SCREEN_DESCRIPTION_LENGTH);
+    }
+}
+
+const char *
+NetHackRL::screen_description(size_t offset)
+{
+    char *description =
+        &screen_descriptions_[offset * NLE_SCREEN_DESCRIPTION_LENGTH];
+    if (descriptions_stale_[offset]) {
+        describe_cell(offset, description);
+        descriptions_stale_.reset(offset);
+    }
+    return description;
+}
+
+void
+NetHackRL::update_screen_descriptions()
+{
+    if (descriptions_stale_.none())
+        return;
+    for (size_t offset = 0; offset < descriptions_stale_.size(); ++offset) {
+        if (descriptions_stale_[offset])
+            screen_description(offset);
     }
 }
 
@@ -643,13 +1051,20 @@ NetHackRL::clear_nhwindow_method(winid wid)
     rl_win->strings.clear();
 
     if (wid == WIN_MAP) {
+        for (size_t i = 0; i < glyphs_.size(); ++i) {
+            if (glyphs_[i] != nul_glyph)
+                glyphs_changed_.set(i);
+        }
+        for (size_t j = 0; j < ROWNO; ++j)
+            mark_dirty(0, NUM_DIRTY_MAP, j);
         glyphs_.fill(nul_glyph);
+        explored_ = 0;
+        shown_level_ = -1;
         chars_.fill(' ');
         colors_.fill(0);
         specials_.fill(0);
-        if (nle_get_obs()->screen_descriptions) {
-            screen_descriptions_.fill(0);
-        }
+        screen_descriptions_.fill(0);
+        descriptions_stale_.reset();
     }
 
     DEBUG_API("rl_clear_nhwindow(wid=" << wid << ")" << std::endl);
@@ -807,6 +1222,8 @@ NetHackRL::rl_curs(winid wid, int x, int y)
                              << std::endl);
     ScopedStack s(win_proc_calls, "curs");
     DEBUG_API("rl_curs for window id " << wid << std::endl);
+    if (wid == WIN_MAP && nle_headless())
+        return;
     tty_curs(wid, x, y);
 }
 
@@ -858,7 +1275,10 @@ NetHackRL::rl_select_menu(winid wid, int how, MENU_ITEM_P **menu_list)
 {
     DEBUG_API("rl_select_menu");
     ScopedStack s(win_proc_calls, "select_menu");
+    winid outer_menu_win = select_menu_win;
+    select_menu_win = wid;
     int response = tty_select_menu(wid, how, menu_list);
+    select_menu_win = outer_menu_win;
     DEBUG_API(" : " << response << std::endl);
     return response;
 }
@@ -891,7 +1311,8 @@ void
 NetHackRL::rl_cliparound(int x, int y)
 {
 #ifdef CLIPPING
-    tty_cliparound(x, y);
+    if (!nle_headless())
+        tty_cliparound(x, y);
 #endif
 }
 
@@ -937,15 +1358,13 @@ NetHackRL::rl_print_glyph(winid wid, XCHAR_P x, XCHAR_P y, int glyph,
             color = iflags.wc2_darkgray ? 8 : CLR_BLUE;
         }
         instance->store_mapped_glyph(ch, color, special, x, y);
-        if (nle_get_obs()->screen_descriptions) {
-            instance->store_screen_description(x, y, glyph);
-        }
     } else {
         DEBUG_API("Window id is " << wid << ". This shouldn't happen."
                                   << std::endl);
     }
 
-    tty_print_glyph(wid, x, y, glyph, bkglyph);
+    if (!nle_headless())
+        tty_print_glyph(wid, x, y, glyph, bkglyph);
 }
 void
 NetHackRL::rl_raw_print(const char *str)
@@ -1017,8 +1436,11 @@ NetHackRL::rl_yn_function(const char *question_, const char *choices,
     DEBUG_API("rl_yn_function" << std::endl);
     ScopedStack s(win_proc_calls, "yn_function");
     in_yn_function = true;
+    yn_choices = choices;
+    yn_default = def;
     char result = tty_yn_function(question_, choices, def);
     in_yn_function = false;
+    yn_choices = nullptr;
     return result;
 }
 
@@ -1077,6 +1499,39 @@ NetHackRL::rl_end_screen()
         instance.reset(nullptr);
 }
 
+void
+NetHackRL::rl_fill_obs(nle_obs *obs)
+{
+    if (instance)
+        instance->fill_obs(obs);
+}
+
+bool
+NetHackRL::rl_describe(int n, const int *cells, unsigned char *out)
+{
+    if (!instance || !in_normal_game())
+        return false;
+    for (int i = 0; i < n; ++i)
+        std::memcpy(out + i * NLE_SCREEN_DESCRIPTION_LENGTH,
+                    instance->screen_description(cells[i]),
+                    NLE_SCREEN_DESCRIPTION_LENGTH);
+    return true;
+}
+
+bool
+NetHackRL::rl_level_map(int dnum, int dlevel, int16_t *out)
+{
+    if (!instance || dnum < 0 || dnum >= MAXDUNGEON || dlevel <= 0
+        || dlevel > MAXLEVEL)
+        return false;
+    int index = instance->level_map_index_[dnum * MAXLEVEL + dlevel - 1];
+    if (index < 0)
+        return false;
+    std::memcpy(out, instance->level_maps_[index].glyphs.data(),
+                sizeof(int16_t) * (COLNO - 1) * ROWNO);
+    return true;
+}
+
 void
 NetHackRL::rl_outrip(winid wid, int how, time_t when)
 {
@@ -1116,10 +1571,17 @@ NetHackRL::rl_status_update(int fldidx, genericptr_t ptr, int chg,
     instance->status_update_method(fldidx, ptr, chg, percent, color,
                                    colormasks);
 #ifdef STATUS_HILITES
-    tty_status_update(fldidx, ptr, chg, percent, color, colormasks);
+    if (!nle_headless())
+        tty_status_update(fldidx, ptr, chg, percent, color, colormasks);
 #endif
 }
 
+void
+NetHackRL::rl_free_instance()
+{
+    instance.reset(nullptr);
+}
+
 static void
 rl_update_positionbar(char *chrs)
 {
@@ -1131,6 +1593,34 @@ rl_update_positionbar(char *chrs)
 
 } // namespace nethack_rl
 
+/* Called by nle_finish when a game ends before exit_nhwindows. */
+extern "C" void
+rl_free_instance()
+{
+    nethack_rl::NetHackRL::rl_free_instance();
+}
+
+/* Called by nle_fill_obs. */
+extern "C" void
+rl_fill_obs(nle_obs *obs)
+{
+    nethack_rl::NetHackRL::rl_fill_obs(obs);
+}
+
+/* Called by nle_describe. */
+extern "C" int
+rl_describe(int n, const int *cells, unsigned char *out)
+{
+    return nethack_rl::NetHackRL::rl_describe(n, cells, out);
+}
+
+/* Called by nle_level_map. */
+extern "C" int
+rl_level_map(int dnum, int dlevel, short *out)
+{
+    return nethack_rl::NetHackRL::rl_level_map(dnum, dlevel, out);
+}
+
 struct window_procs rl_procs = {
     "rl",
     (WC_COLOR | WC_HILITE_PET | WC_INVERSE | WC_EIGHT_BIT_IN
@@ -211,9 +211,11 @@ getlin_hook_proc hook;
 }
 
 /*
- * Hack for RL window proc: register if we are in xwaitforspace context.
+ * Hack for RL window proc: register if we are in xwaitforspace context,
+ * and which chars it allows besides return.
  */
 boolean xwaitingforspace;
+const char *xwaitingforspace_chars;
 
 void
 xwaitforspace(s)
@@ -222,6 +224,7 @@ register const char *s; /* chars allowed besides return */
     register int c, x = ttyDisplay ? (int) ttyDisplay->dismiss_more : '\n';
 
     xwaitingforspace = TRUE;
+    xwaitingforspace_chars = s;
     morc = 0;
     while (
 #ifdef HANGUPHANDLING
@@ -246,6 +249,7 @@ register const char *s; /* chars allowed besides return */
         }
     }
     xwaitingforspace = FALSE;
+    xwaitingforspace_chars = (const char *) 0;
 }
 
 /*
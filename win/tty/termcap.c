@@ -31,6 +31,13 @@ static void NDECL(init_hilite);
 static void NDECL(kill_hilite);
 #endif /* defined(TEXTCOLOR) && defined(TERMLIB) */
 
+/* NLE: Reports what control sequences do to the screen, see nletty.c. */
+#ifdef RL_GRAPHICS
+#define NLE_TTY(x) x
+#else
+#define NLE_TTY(x)
+#endif
+
 /* (see tcap.h) -- nh_CM, nh_ND, nh_CD, nh_HI,nh_HE, nh_US,nh_UE, ul_hack */
 struct tc_lcl_data tc_lcl_data = { 0, 0, 0, 0, 0, 0, 0, FALSE };
 
@@ -448,6 +455,7 @@ void
 tty_start_screen()
 {
     xputs(TI);
+    NLE_TTY(nle_tty_reset());
     xputs(VS);
 #ifdef PC9800
     if (!SYMHANDLING(H_IBM))
@@ -496,6 +504,7 @@ int x, y;
         if (UP) {
             while ((int) ttyDisplay->cury > y) { /* Go up. */
                 xputs(UP);
+                NLE_TTY(nle_tty_up());
                 ttyDisplay->cury--;
             }
         } else if (nh_CM) {
@@ -508,6 +517,7 @@ int x, y;
         if (XD) {
             while ((int) ttyDisplay->cury < y) {
                 xputs(XD);
+                NLE_TTY(nle_tty_down());
                 ttyDisplay->cury++;
             }
         } else if (nh_CM) {
@@ -527,12 +537,14 @@ int x, y;
              /* should instead print what is there already */
             while ((int) ttyDisplay->curx < x) {
                 xputs(nh_ND);
+                NLE_TTY(nle_tty_right());
                 ttyDisplay->curx++;
             }
         }
     } else if ((int) ttyDisplay->curx > x) {
         while ((int) ttyDisplay->curx > x) { /* Go to the left. */
             xputs(BC);
+            NLE_TTY(nle_tty_left());
             ttyDisplay->curx--;
         }
     }
@@ -543,6 +555,7 @@ cmov(x, y)
 register int x, y;
 {
     xputs(tgoto(nh_CM, x, y));
+    NLE_TTY(nle_tty_move(x, y));
     ttyDisplay->cury = y;
     ttyDisplay->curx = x;
 }
@@ -590,6 +603,7 @@ cl_end()
 {
     if (CE) {
         xputs(CE);
+        NLE_TTY(nle_tty_clear_eol());
     } else { /* no-CE fix - free after Harold Rynes */
         register int cx = ttyDisplay->curx + 1;
 
@@ -612,6 +626,7 @@ clear_screen()
      */
     if (CL) {
         xputs(CL);
+        NLE_TTY(nle_tty_clear_screen());
         home();
     }
 }
@@ -625,21 +640,26 @@ home()
         xputs(tgoto(nh_CM, 0, 0));
     else
         tty_curs(BASE_WINDOW, 1, 0); /* using UP ... */
+    NLE_TTY(nle_tty_move(0, 0));
     ttyDisplay->curx = ttyDisplay->cury = 0;
 }
 
 void
 standoutbeg()
 {
-    if (SO)
+    if (SO) {
         xputs(SO);
+        NLE_TTY(nle_tty_bold());
+    }
 }
 
 void
 standoutend()
 {
-    if (SE)
+    if (SE) {
         xputs(SE);
+        NLE_TTY(nle_tty_reset());
+    }
 }
 
 #if 0 /* if you need one of these, uncomment it (here and in extern.h) */
@@ -684,6 +704,7 @@ void
 backsp()
 {
     xputs(BC);
+    NLE_TTY(nle_tty_left());
 }
 
 void
@@ -1273,8 +1294,15 @@ int attr;
     if (attr) {
         const char *astr = s_atr2str(attr);
 
-        if (astr && *astr)
+        if (astr && *astr) {
             xputs(astr);
+#ifdef RL_GRAPHICS
+            if (astr == MR)
+                nle_tty_reverse();
+            else if (astr == nh_HI)
+                nle_tty_bold();
+#endif
+        }
     }
 }
 
@@ -1285,8 +1313,10 @@ int attr;
     if (attr) {
         const char *astr = e_atr2str(attr);
 
-        if (astr && *astr)
+        if (astr && *astr) {
             xputs(astr);
+            NLE_TTY(nle_tty_reset());
+        }
     }
 }
 
@@ -1294,12 +1324,14 @@ void
 term_start_raw_bold()
 {
     xputs(nh_HI);
+    NLE_TTY(nle_tty_bold());
 }
 
 void
 term_end_raw_bold()
 {
     xputs(nh_HE);
+    NLE_TTY(nle_tty_reset());
 }
 
 #ifdef TEXTCOLOR
@@ -1308,14 +1340,19 @@ void
 term_end_color()
 {
     xputs(nh_HE);
+    NLE_TTY(nle_tty_reset());
 }
 
 void
 term_start_color(color)
 int color;
 {
-    if (color < CLR_MAX)
+    if (color < CLR_MAX) {
         xputs(hilites[color]);
+        /* Black is dark gray if init_hilite didn't make it blue. */
+        NLE_TTY(nle_tty_color(color,
+                              hilites[CLR_BLACK] != hilites[CLR_BLUE]));
+    }
 }
 
 #endif /* TEXTCOLOR */